@@ -0,0 +1,186 @@
+"""
+Module for generating a suite of SPL-specific benchmark formulas in parallel.
+
+Usage:
+batch.py [-j jobs] [--backend {formula,int,tseitin}] [--max-clauses N] [--simplify] [--tolerance T] [-q]
+         [--cache dir [--cache-size MB]] [--format {dimacs,binary}] [--compress {gz,xz}] [--stream]
+         [--write-queue chunks] [--seed base_seed]
+         [--vars start[:stop[:step]]] [--clauses start[:stop[:step]]] [--specs file] out_dir
+
+Each instance is given by a (min_vars, min_clauses, seed) spec. The specs are
+either read from a file (one "min_vars min_clauses [seed]" per line) or given by
+the ranges of min_vars and min_clauses (the shorter range is extended by its last value).
+Instances without an explicit seed get the seed base_seed + index of the instance,
+therefore a suite is always generated the same way regardless of the number of jobs.
+
+The instances are generated by a pool of worker processes (see main.run) and written
+to out_dir/v<min_vars>_c<min_clauses>_s<seed>.cnf (.cnfb for the binary format, 
+followed by .gz/.xz if compressed); the diagnostic output of each
+instance goes to the corresponding .log file (empty with -q) and its metrics 
+(see metrics.RunMetrics) to the corresponding .json file. The aggregate throughput is printed
+on the sys.stderr output.
+
+@author: Keznikl
+"""
+
+from multiprocessing import Pool, cpu_count
+from metrics import RunMetrics
+from cache import InstanceCache, fileExtension
+from dimacs import checkCompression
+import main
+import os
+import sys
+import datetime
+import argparse
+
+
+def parse_range(s):
+    """Parse 'start[:stop[:step]]' into a list of integers (stop is exclusive, as in xrange)."""
+    parts = [int(p) for p in s.split(":")]
+    if len(parts) == 1:
+        return parts
+    if len(parts) == 2:
+        return range(parts[0], parts[1])
+    return range(parts[0], parts[1], parts[2])
+
+def read_specs(f, base_seed = 0):
+    """Read the (min_vars, min_clauses, seed) specs from the lines of the given file."""
+    specs = []
+    for line in f:
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        min_vars, min_clauses = int(fields[0]), int(fields[1])
+        if len(fields) >= 3:
+            seed = int(fields[2])
+        else:
+            seed = base_seed + len(specs)
+        specs.append((min_vars, min_clauses, seed))
+    return specs
+
+def range_specs(vars_range, clauses_range, base_seed = 0):
+    """Combine the ranges of min_vars and min_clauses into the list of specs."""
+    n = max(len(vars_range), len(clauses_range))
+    specs = []
+    for i in xrange(n):
+        min_vars = vars_range[min(i, len(vars_range) - 1)]
+        min_clauses = clauses_range[min(i, len(clauses_range) - 1)]
+        specs.append((min_vars, min_clauses, base_seed + i))
+    return specs
+
+def instance_name(spec):
+    return "v%d_c%d_s%d" % spec
+
+def generate_instance(task):
+    """Generate a single instance in a worker process.
+
+    task    -- the tuple (spec, out_dir, options, cache_dir, cache_size), 
+               options are the keyword arguments of main.run
+    returns -- the tuple (spec, number of variables, number of clauses, seconds)
+
+    """
+    spec, out_dir, options, cache_dir, cache_size = task
+    min_vars, min_clauses, seed = spec
+    path = os.path.join(out_dir, instance_name(spec))
+    start = datetime.datetime.now()
+    log = open(path + ".log", "w")
+    stderr = sys.stderr
+    sys.stderr = log
+    metrics = RunMetrics()
+    cache = None
+    if cache_dir:
+        cache = InstanceCache(cache_dir, cache_size)
+    try:
+        extension = fileExtension(options.get("format", "dimacs"), options.get("compression"))
+        num_vars, num_clauses = main.run(min_vars, min_clauses, seed, output=path + extension, metrics=metrics,
+                                         cache=cache, **options)
+    finally:
+        sys.stderr = stderr
+        log.close()
+    with open(path + ".json", "w") as f:
+        f.write(metrics.toJSON())
+    elapsed = datetime.datetime.now() - start
+    return (spec, num_vars, num_clauses, elapsed.total_seconds())
+
+def run_batch(specs, out_dir, jobs = None, cache_dir = None, cache_size = None, **options):
+    """Generate the instances given by the specs using a pool of jobs worker processes.
+
+    cache_dir  -- the directory of the cache.InstanceCache shared by the workers (no caching if None)
+    cache_size -- the maximal size of the cache in bytes (unlimited if None)
+    options    -- the keyword arguments of main.run (backend, max_clauses, simplify_clauses, 
+                  quiet, tolerance, format, compression, stream, write_queue)
+    returns    -- the list of results of generate_instance in the order of completion
+
+    """
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    tasks = [(spec, out_dir, options, cache_dir, cache_size) for spec in specs]
+    pool = Pool(jobs or cpu_count())
+    results = []
+    start = datetime.datetime.now()
+    try:
+        for result in pool.imap_unordered(generate_instance, tasks):
+            spec, num_vars, num_clauses, seconds = result
+            print >> sys.stderr, "%s: %d vars, %d clauses (%.2fs)" % (instance_name(spec), num_vars, num_clauses, seconds)
+            results.append(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    seconds = (datetime.datetime.now() - start).total_seconds()
+
+    total_clauses = sum(r[2] for r in results)
+    print >> sys.stderr, """
+=====================================
+DONE.
+instances:    %d
+clauses:      %d
+time:         %.2fs
+instances/s:  %.2f
+clauses/s:    %.0f
+=====================================
+""" % (len(results), total_clauses, seconds, len(results) / max(seconds, 1e-6), total_clauses / max(seconds, 1e-6))
+    return results
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Generates a suite of SPL-specific benchmark formulas in parallel.")
+    argparser.add_argument("out_dir", help="directory for the generated .cnf files")
+    argparser.add_argument("-j", "--jobs", type=int, help="number of worker processes (default: number of cores)")
+    argparser.add_argument("--backend", choices=["formula", "int", "tseitin"], default="formula",
+                           help="CNF conversion, see main.py")
+    argparser.add_argument("--max-clauses", type=int, help="threshold of the fallback to Tseitin's encoding, see main.py")
+    argparser.add_argument("--simplify", action="store_true", help="remove tautologies and subsumed clauses, see main.py")
+    argparser.add_argument("--tolerance", type=float, help="hit the sizes of the resulting CNF, see main.py")
+    argparser.add_argument("-q", "--quiet", action="store_true", help="no diagnostic output of the instances")
+    argparser.add_argument("--cache", metavar="DIR", help="cache the instances in the given directory, see main.py")
+    argparser.add_argument("--cache-size", type=int, metavar="MB", help="maximal size of the cache (unlimited by default)")
+    argparser.add_argument("--format", choices=["dimacs", "binary"], default="dimacs", help="output format, see main.py")
+    argparser.add_argument("--compress", choices=["gz", "xz"], help="compress the output files")
+    argparser.add_argument("--stream", action="store_true", help="write the instances in bounded memory, see main.py")
+    argparser.add_argument("--write-queue", type=int, metavar="CHUNKS",
+                           help="write the instances by a background thread, see main.py")
+    argparser.add_argument("--seed", type=int, default=0, help="base seed of instances without an explicit seed")
+    argparser.add_argument("--vars", type=parse_range, default=[main.min_vars], help="range of min_vars")
+    argparser.add_argument("--clauses", type=parse_range, default=[main.min_clauses], help="range of min_clauses")
+    argparser.add_argument("--specs", type=argparse.FileType("r"), help="file with 'min_vars min_clauses [seed]' lines")
+    args = argparser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        argparser.error("the number of jobs has to be at least 1")
+    if args.stream and (args.format != "dimacs" or args.simplify):
+        argparser.error("--stream supports only the DIMACS format without --simplify")
+    try:
+        checkCompression(args.compress)
+    except Exception as e:
+        argparser.error(str(e))
+
+    if args.specs:
+        specs = read_specs(args.specs, args.seed)
+    else:
+        specs = range_specs(args.vars, args.clauses, args.seed)
+    run_batch(specs, args.out_dir, args.jobs, args.cache, args.cache_size and args.cache_size << 20,
+              backend=args.backend, max_clauses=args.max_clauses, simplify_clauses=args.simplify, quiet=args.quiet,
+              tolerance=args.tolerance, format=args.format, compression=args.compress,
+              stream=args.stream, write_queue=args.write_queue)
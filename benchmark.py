@@ -0,0 +1,198 @@
+"""
+Module for benchmarking the stages of the formula generation pipeline.
+
+Usage:
+benchmark.py [--vars list] [--clauses list] [--variants list] [--stages list] [--repeat n] [--seed seed]
+             [--save file] [--baseline file] [--tolerance fraction]
+
+The lists are comma separated. Every stage is run for every combination of
+min_vars, min_clauses and max_perf_param_variants (see main.py) on the same skeletons:
+    - generate -- generating the skeletons (main.generate_skeletons)
+    - toCNF    -- the conversion by De-Morgan laws (Formula.toCNF)
+    - tseitin  -- the Tseitin's algorithm (tseitin.toCNF)
+    - int      -- the direct conversion to integer clauses (main.skeletons_to_clauses)
+    - dimacs   -- formatting the CNF by De-Morgan laws (dimacs.DimacsFormatVisitor)
+
+Each measurement runs in a fresh worker process. The wall time is the best of
+the repetitions; the peak memory is the increase of the peak RSS of the worker
+during the first repetition (resource.getrusage), the input of the stage is
+prepared before. The clauses of each stage are the clauses it produces (for
+generate, the clauses of the CNF of the skeletons, counted after the measurement). The results (with clauses/s) are printed on the sys.stderr output
+and can be saved as a JSON baseline; the results exceeding a stored baseline by
+more than the tolerance are reported as regressions (exit status 1).
+
+@author: Keznikl
+"""
+
+from multiprocessing import Pool
+from random import Random
+from formula import Conjunction
+from dimacs import DimacsFormatVisitor, DimacsWriter
+import main
+import tseitin
+import resource
+import json
+import timeit
+import os
+import sys
+import argparse
+
+
+STAGES = ["generate", "toCNF", "tseitin", "int", "dimacs"]
+
+# differences below these thresholds are considered noise
+MIN_SECONDS = 0.01
+MIN_PEAK_KB = 1024
+
+
+def parse_list(s):
+    return [int(p) for p in s.split(",")]
+
+def prepare_stage(stage, min_vars, min_clauses, max_variants, seed):
+    """Return the pair (function running the stage, function counting the clauses of its result).
+
+    The input of the stage is created upfront and the clauses are counted after 
+    the measurement, so that neither is measured.
+
+    """
+    generate = lambda: main.generate_skeletons(min_vars, min_clauses, Random(seed), max_variants)
+    if stage == "generate":
+        # the clauses of the CNF of the skeletons (not the number of the skeletons)
+        return (generate, lambda skeletons: len(main.skeletons_to_clauses(skeletons, "int")[0]))
+    skeletons = generate()
+    if stage == "toCNF":
+        return (lambda: len(Conjunction(skeletons).toCNF().subf), None)
+    if stage == "tseitin":
+        return (lambda: len(tseitin.toCNF(Conjunction(skeletons)).subf), None)
+    if stage == "int":
+        return (lambda: len(main.skeletons_to_clauses(skeletons, "int")[0]), None)
+    if stage == "dimacs":
+        cnf = Conjunction(skeletons).toCNF()
+        def write():
+            out = open(os.devnull, "w")
+            visitor = DimacsFormatVisitor()
+            writer = DimacsWriter(out)
+            visitor.writeClauses(cnf.subf, writer)
+            # the last buffered chunk is formatted and written by close
+            writer.close()
+            out.close()
+            return visitor.numClauses()
+        return (write, None)
+    raise Exception("Unknown stage " + stage)
+
+def measure(task):
+    """Measure a single stage in a worker process.
+
+    task    -- the tuple (stage, min_vars, min_clauses, max_variants, seed, repeat)
+    returns -- the dictionary with the parameters and the results of the measurement
+
+    """
+    stage, min_vars, min_clauses, max_variants, seed, repeat = task
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, "w")
+    try:
+        run, count = prepare_stage(stage, min_vars, min_clauses, max_variants, seed)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        times = []
+        for i in xrange(repeat):
+            start = timeit.default_timer()
+            result = run()
+            times.append(timeit.default_timer() - start)
+            if i == 0:
+                peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak
+        clauses = count(result) if count else result
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    seconds = min(times)
+    return {"stage": stage, "min_vars": min_vars, "min_clauses": min_clauses, "max_variants": max_variants,
+            "seconds": seconds, "peak_kb": peak, "clauses": clauses,
+            "clauses_per_sec": clauses / max(seconds, 1e-6)}
+
+def result_key(result):
+    return (result["stage"], result["min_vars"], result["min_clauses"], result["max_variants"])
+
+def run_benchmark(vars_list, clauses_list, variants_list, stages = STAGES, repeat = 3, seed = 0):
+    """Measure the stages over the grid of parameters.
+
+    returns -- the list of results of measure (ordered by the parameters, then by the stage)
+
+    """
+    tasks = [(stage, v, c, m, seed, repeat) for v in vars_list for c in clauses_list for m in variants_list
+             for stage in stages]
+    # a fresh process for each measurement, so that the peak memory is not shared
+    pool = Pool(1, maxtasksperchild=1)
+    results = []
+    try:
+        for result in pool.imap(measure, tasks):
+            print >> sys.stderr, format_result(result)
+            results.append(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+def format_result(result):
+    return "%-8s vars %6d clauses %4d variants %2d: %8.3fs %8d KB %8d clauses %10.0f clauses/s" % (
+        result["stage"], result["min_vars"], result["min_clauses"], result["max_variants"],
+        result["seconds"], result["peak_kb"], result["clauses"], result["clauses_per_sec"])
+
+def compare(results, baseline, tolerance = 0.2):
+    """Compare the results with the baseline results.
+
+    returns -- the list of (result, baseline result, description) of the regressions
+
+    """
+    base = dict((result_key(r), r) for r in baseline)
+    regressions = []
+    for r in results:
+        b = base.get(result_key(r))
+        if b is None:
+            continue
+        if r["seconds"] > b["seconds"] * (1 + tolerance) and r["seconds"] - b["seconds"] > MIN_SECONDS:
+            regressions.append((r, b, "time %.3fs -> %.3fs" % (b["seconds"], r["seconds"])))
+        if r["peak_kb"] > b["peak_kb"] * (1 + tolerance) and r["peak_kb"] - b["peak_kb"] > MIN_PEAK_KB:
+            regressions.append((r, b, "peak memory %d KB -> %d KB" % (b["peak_kb"], r["peak_kb"])))
+        if r["clauses"] != b["clauses"]:
+            regressions.append((r, b, "clauses %d -> %d" % (b["clauses"], r["clauses"])))
+    return regressions
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Benchmarks the stages of the formula generation.")
+    argparser.add_argument("--vars", type=parse_list, default=[100, 300], help="list of min_vars")
+    argparser.add_argument("--clauses", type=parse_list, default=[10], help="list of min_clauses")
+    argparser.add_argument("--variants", type=parse_list, default=[3, main.max_perf_param_variants],
+                           help="list of max_perf_param_variants")
+    argparser.add_argument("--stages", type=lambda s: s.split(","), default=STAGES,
+                           help="list of the stages (default: %s)" % ",".join(STAGES))
+    argparser.add_argument("--repeat", type=int, default=3, help="number of repetitions of each measurement")
+    argparser.add_argument("--seed", type=int, default=0, help="random seed of the skeletons")
+    argparser.add_argument("--save", help="save the results as a JSON baseline to the given file")
+    argparser.add_argument("--baseline", help="report the regressions against the given JSON baseline")
+    argparser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown (default: 0.2)")
+    args = argparser.parse_args()
+
+    for stage in args.stages:
+        if stage not in STAGES:
+            argparser.error("unknown stage " + stage)
+
+    results = run_benchmark(args.vars, args.clauses, args.variants, args.stages, args.repeat, args.seed)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for r, b, description in regressions:
+            print >> sys.stderr, "REGRESSION %s vars %d clauses %d variants %d: %s" % (
+                r["stage"], r["min_vars"], r["min_clauses"], r["max_variants"], description)
+        if regressions:
+            sys.exit(1)
+        print >> sys.stderr, "no regressions against " + args.baseline
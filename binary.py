@@ -0,0 +1,105 @@
+"""
+Module implementing a packed binary format of CNF formulas.
+
+The file consists of a header followed by two arrays of little-endian 32-bit
+integers, the same layout as clauses.ClauseSet:
+
+    header   -- magic "CNFB", version, number of variables, number of clauses
+                (32-bit unsigned integers) and number of literals (64-bit unsigned integer)
+    offsets  -- (number of clauses + 1) start offsets of the clauses in literals
+    literals -- the literals of all clauses, one clause after another (as in DIMACS, without 0)
+
+The arrays are aligned to 4 bytes, therefore the file can be memory-mapped and
+the clauses read in place (see BinaryCNF).
+
+@author: Keznikl
+"""
+
+from array import array
+from clauses import ClauseSet
+import struct
+import mmap
+import sys
+
+MAGIC = "CNFB"
+VERSION = 1
+HEADER = struct.Struct("<4sIIIQ")
+
+def _littleEndian(a):
+    """Return the array of 32-bit integers in the little-endian byte order."""
+    if sys.byteorder == "big":
+        a = array('i', a)
+        a.byteswap()
+    return a
+
+def writeBinary(clauseSet, num_vars, out):
+    """Write the clauses (clauses.ClauseSet) in the binary format to the file-like object out."""
+    assert clauseSet.literals.itemsize == 4, "32-bit literals expected"
+    out.write(HEADER.pack(MAGIC, VERSION, num_vars, len(clauseSet), len(clauseSet.literals)))
+    # the arrays are written directly, without converting them
+    out.write(_littleEndian(clauseSet.offsets).tostring())
+    out.write(_littleEndian(clauseSet.literals).tostring())
+
+def readHeader(f):
+    """Read the header from the file-like object f, return the tuple (num_vars, num_clauses, num_literals)."""
+    data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise IOError("Truncated binary CNF header")
+    magic, version, num_vars, num_clauses, num_literals = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise IOError("Not a binary CNF file")
+    if version != VERSION:
+        raise IOError("Unsupported version %d of the binary CNF format" % version)
+    return (num_vars, num_clauses, num_literals)
+
+
+class BinaryCNF:
+    """Read-only view of a binary CNF file, memory-mapped and decoded lazily.
+
+    Fields:
+    num_vars     -- number of variables
+    num_clauses  -- number of clauses
+    num_literals -- total number of literals
+
+    """
+
+    def __init__(self, path):
+        f = open(path, "rb")
+        try:
+            self.num_vars, self.num_clauses, self.num_literals = readHeader(f)
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        self.offsets_start = HEADER.size
+        self.literals_start = self.offsets_start + 4 * (self.num_clauses + 1)
+        if len(self.data) < self.literals_start + 4 * self.num_literals:
+            raise IOError("Truncated binary CNF file " + path)
+
+    def offset(self, i):
+        return struct.unpack_from("<i", self.data, self.offsets_start + 4 * i)[0]
+
+    def clause(self, i):
+        """Return the literals of the clause i as a tuple."""
+        start, end = struct.unpack_from("<2i", self.data, self.offsets_start + 4 * i)
+        return struct.unpack_from("<%di" % (end - start), self.data, self.literals_start + 4 * start)
+
+    def __len__(self):
+        return self.num_clauses
+
+    def __iter__(self):
+        for i in xrange(self.num_clauses):
+            yield self.clause(i)
+
+    def toClauseSet(self):
+        """Copy the clauses to a clauses.ClauseSet (a single copy of each array)."""
+        clauseSet = ClauseSet()
+        clauseSet.offsets = array('i')
+        clauseSet.offsets.fromstring(self.data[self.offsets_start:self.literals_start])
+        clauseSet.literals.fromstring(self.data[self.literals_start:self.literals_start + 4 * self.num_literals])
+        if sys.byteorder == "big":
+            clauseSet.offsets.byteswap()
+            clauseSet.literals.byteswap()
+        return clauseSet
+
+    def close(self):
+        self.data.close()
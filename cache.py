@@ -0,0 +1,180 @@
+"""
+Module implementing an on-disk cache of the generated instances.
+
+The instances (output files) are stored under the hash of the parameters of the
+generation (including the seed) and of the version of the generator, i.e. of the
+source code of its modules, so that a change of the generator never returns stale
+instances. The least recently used instances are evicted when the cache exceeds
+its size limits.
+
+@author: Keznikl
+"""
+
+from dimacs import compressedInput, COMPRESSIONS
+from binary import readHeader
+import hashlib
+import json
+import shutil
+import os
+
+
+# modules whose source code determines the generated instances
+SOURCE_MODULES = ["formula", "clauses", "generators", "tseitin", "dimacs", "binary", "main"]
+
+_source_version = None
+
+def fileExtension(format = "dimacs", compression = None):
+    """Return the extension of an output file in the format ("dimacs" or "binary") and compression."""
+    extension = ".cnfb" if format == "binary" else ".cnf"
+    if compression:
+        extension += "." + compression
+    return extension
+
+# extensions of the cached files, other files in the directory of the cache are ignored
+EXTENSIONS = tuple(fileExtension(format, compression) for format in ["dimacs", "binary"]
+                   for compression in [None] + sorted(COMPRESSIONS.values()))
+
+def sourceVersion():
+    """Return the hash of the source code of the generator (computed once)."""
+    global _source_version
+    if _source_version is None:
+        h = hashlib.sha1()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in SOURCE_MODULES:
+            with open(os.path.join(directory, name + ".py"), "rb") as f:
+                h.update(f.read())
+        _source_version = h.hexdigest()
+    return _source_version
+
+def readCounts(path, format = "dimacs", compression = None):
+    """Return the pair (number of variables, number of clauses) from the header of a cached file.
+
+    format      -- "dimacs" or "binary" (see main.write_formula)
+    compression -- "gz", "xz" or None
+
+    """
+    with open(path, "rb") as raw:
+        f = compressedInput(raw, compression)
+        if format == "binary":
+            num_vars, num_clauses, num_literals = readHeader(f)
+            return (num_vars, num_clauses)
+        for line in f:
+            if line.startswith("p "):
+                fields = line.split()
+                return (int(fields[2]), int(fields[3]))
+    raise IOError("no DIMACS header in " + path)
+
+
+class InstanceCache:
+    """Cache of the generated output files in a directory, with LRU eviction.
+
+    Each instance is stored as <directory>/<key>, where the key ends with the extension
+    of the file (see fileExtension), the modification time of the file
+    is updated on each hit and the least recently used files are removed when the cache
+    exceeds max_bytes or max_entries. The files are stored by an atomic rename,
+    hence the cache may be shared by several processes.
+
+    Fields:
+    directory   -- the directory of the cache
+    max_bytes   -- the maximal total size of the cached files (unlimited if None)
+    max_entries -- the maximal number of the cached files (unlimited if None)
+    hits        -- number of lookups which found the instance
+    misses      -- number of lookups which did not find the instance
+
+    """
+
+    def __init__(self, directory, max_bytes = None, max_entries = None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created by another process in the meantime
+                if not os.path.isdir(directory):
+                    raise
+
+    def key(self, **params):
+        """Return the key of the instance generated with the given parameters (and the current source version).
+
+        The key is the name of the cached file, with the extension given by the parameters 
+        format and compression (see main.run).
+
+        """
+        extension = fileExtension(params.get("format", "dimacs"), params.get("compression"))
+        params = dict(params)
+        params["version"] = sourceVersion()
+        return hashlib.sha1(json.dumps(params, sort_keys=True)).hexdigest() + extension
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key):
+        """Return the path of the cached instance (marked as recently used), None if not cached."""
+        path = self.path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def tempPath(self, key):
+        """Return a path for writing a new instance, to be stored by store."""
+        return os.path.join(self.directory, "%s.%d.tmp" % (key, os.getpid()))
+
+    def store(self, key, temp_path):
+        """Move the file written to temp_path into the cache, evict old instances if needed; return its path."""
+        path = self.path(key)
+        os.rename(temp_path, path)
+        self.evict()
+        return path
+
+    def entries(self):
+        """Return the list of (modification time, size, path) of the cached files, the oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(EXTENSIONS):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove the least recently used instances exceeding the limits, return the number of removed ones."""
+        if self.max_bytes is None and self.max_entries is None:
+            return 0
+        entries = self.entries()
+        total = sum(size for (mtime, size, path) in entries)
+        removed = 0
+        # the most recent instance (the one just stored) is always kept
+        for mtime, size, path in entries[:-1]:
+            if ((self.max_bytes is None or total <= self.max_bytes) and
+                (self.max_entries is None or len(entries) - removed <= self.max_entries)):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # removed by another process
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def copyTo(self, path, out):
+        """Stream the cached file to the file-like object out."""
+        with open(path, "rb") as f:
+            shutil.copyfileobj(f, out, 1 << 20)
+
+    def clear(self):
+        for mtime, size, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,259 @@
+"""
+Module for running a solver campaign: generated instances solved by a pool of solver processes.
+
+Usage:
+campaign.py [-j jobs] [--solver command]... [--timeout seconds] [--backend {formula,int,tseitin}]
+            [--max-clauses N] [--simplify] [--tolerance T] [--seed base_seed]
+            [--vars start[:stop[:step]]] [--clauses start[:stop[:step]]] [--specs file]
+            [--output table.csv|table.json]
+
+The instances are given by (min_vars, min_clauses, seed) specs as in batch.py. Each
+instance is generated in memory (see main.generate_formula) and streamed in the DIMACS
+format to the standard input of each solver command (no temporary files); at most jobs
+solvers run at the same time, each is killed after the timeout. By default, the bundled
+DPLL stand-in (dpll.py) is used.
+
+The solvers are expected to print the result in the format of the SAT competitions
+("s SATISFIABLE" with the model in "v" lines, or "s UNSATISFIABLE"), otherwise the exit
+status 10/20 is used. A model printed by the solver is checked against the instance.
+
+Each run is a row of the result table, written as CSV (the default, on the standard output)
+or JSON according to the extension of the output file:
+    instance, min_vars, min_clauses, seed, vars, clauses, literals -- the instance
+    generate_seconds -- the time of generating the instance
+    solver, status (SAT, UNSAT, TIMEOUT, ERROR or UNKNOWN), exit_code, solve_seconds
+                     -- the run of the solver (the wall time of its process)
+    verified         -- True/False if the solver printed a model (whether it satisfies the instance),
+                        None otherwise
+
+@author: Keznikl
+"""
+
+from multiprocessing.pool import ThreadPool
+from batch import parse_range, read_specs, range_specs, instance_name
+from clauses import simplify
+import main
+import subprocess
+import threading
+import cStringIO
+import shlex
+import json
+import csv
+import timeit
+import os
+import sys
+import argparse
+
+
+COLUMNS = ["instance", "min_vars", "min_clauses", "seed", "vars", "clauses", "literals", "generate_seconds",
+           "solver", "status", "exit_code", "solve_seconds", "verified"]
+
+# the bundled solver
+DPLL = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "dpll.py")]
+
+
+def generate_instance(spec, options):
+    """Generate the instance given by the spec in memory.
+
+    options -- the keyword arguments of main.generate_formula (backend, max_clauses, tolerance)
+               and simplify_clauses
+    returns -- the pair (DIMACS data, dictionary of the instance columns of the table)
+
+    """
+    options = dict(options)
+    simplify_clauses = options.pop("simplify_clauses", False)
+    min_vars, min_clauses, seed = spec
+    start = timeit.default_timer()
+    clauses, symbols = main.generate_formula(min_vars, min_clauses, seed, **options)
+    if simplify_clauses:
+        clauses, stats = simplify(clauses)
+    out = cStringIO.StringIO()
+    main.write_dimacs(clauses, symbols, out)
+    instance = {"instance": instance_name(spec), "min_vars": min_vars, "min_clauses": min_clauses, "seed": seed,
+                "vars": symbols.numVars(), "clauses": len(clauses), "literals": clauses.numLiterals(),
+                "generate_seconds": timeit.default_timer() - start}
+    return (out.getvalue(), instance)
+
+def run_solver(command, data, timeout = None):
+    """Run the solver command with data on its standard input.
+
+    returns -- the tuple (status, exit code, seconds, standard output); the status is "TIMEOUT"
+               if the solver was killed after timeout seconds, otherwise see parse_status
+
+    """
+    devnull = open(os.devnull, "w")
+    start = timeit.default_timer()
+    # the pipes of the other solvers (started by other threads) must not be inherited,
+    # otherwise their standard input would not be closed
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=devnull,
+                               close_fds=(os.name == "posix"))
+    timed_out = []
+    def kill():
+        timed_out.append(True)
+        try:
+            process.kill()
+        except OSError:
+            # already finished
+            pass
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, kill)
+        timer.start()
+    try:
+        try:
+            output = process.communicate(data)[0]
+        except IOError:
+            # the solver did not read the whole instance (e.g. it was killed)
+            output = process.stdout.read()
+            process.wait()
+    finally:
+        if timer is not None:
+            timer.cancel()
+        devnull.close()
+    seconds = timeit.default_timer() - start
+    if timed_out:
+        return ("TIMEOUT", process.returncode, seconds, output)
+    return (parse_status(output, process.returncode), process.returncode, seconds, output)
+
+def parse_status(output, exit_code):
+    """Return the result of the solver: "SAT", "UNSAT", "ERROR" (a crash) or "UNKNOWN"."""
+    for line in output.splitlines():
+        if line.startswith("s "):
+            answer = line[2:].strip()
+            if answer == "SATISFIABLE":
+                return "SAT"
+            if answer == "UNSATISFIABLE":
+                return "UNSAT"
+            return "UNKNOWN"
+    if exit_code == 10:
+        return "SAT"
+    if exit_code == 20:
+        return "UNSAT"
+    if exit_code != 0:
+        return "ERROR"
+    return "UNKNOWN"
+
+def parse_model(output):
+    """Return the set of true literals of the model in the "v" lines of the output (None if there are none)."""
+    model = None
+    for line in output.splitlines():
+        if line.startswith("v "):
+            if model is None:
+                model = set()
+            model.update(int(l) for l in line[2:].split() if l != "0")
+    return model
+
+def verify_model(data, model):
+    """True iff the model (set of true literals) satisfies the clauses of the DIMACS data."""
+    clause = False
+    for line in data.splitlines():
+        if not line or line[0] in "cp%":
+            continue
+        for l in map(int, line.split()):
+            if l == 0:
+                if not clause:
+                    return False
+                clause = False
+            elif l in model:
+                clause = True
+    return True
+
+def solve_instance(task):
+    """Generate an instance and run all solvers on it (in a pool thread).
+
+    task    -- the tuple (spec, solvers, options, timeout), solvers is the list of commands
+               (each a list of arguments), options see generate_instance
+    returns -- the list of the rows of the table, one per solver
+
+    """
+    spec, solvers, options, timeout = task
+    data, instance = generate_instance(spec, options)
+    rows = []
+    for command in solvers:
+        status, exit_code, seconds, output = run_solver(command, data, timeout)
+        verified = None
+        model = parse_model(output) if status == "SAT" else None
+        if model is not None:
+            verified = verify_model(data, model)
+        row = dict(instance)
+        row.update({"solver": " ".join(command), "status": status, "exit_code": exit_code,
+                    "solve_seconds": seconds, "verified": verified})
+        rows.append(row)
+    return rows
+
+def run_campaign(specs, solvers = None, jobs = None, timeout = None, **options):
+    """Solve the instances given by the specs by the solvers, at most jobs solvers running at once.
+
+    The instances are generated by the pool threads as well (the generation holds the GIL, 
+    but the threads waiting for the solver processes do not), each instance is kept in memory 
+    only while it is being solved.
+
+    solvers -- the list of the solver commands (each a list of arguments; the bundled DPLL if None)
+    timeout -- the time limit of each solver run in seconds (unlimited if None)
+    options -- the options of the instances, see generate_instance
+    returns -- the list of rows of the table in the order of completion
+
+    """
+    if solvers is None:
+        solvers = [DPLL]
+    tasks = [(spec, solvers, options, timeout) for spec in specs]
+    pool = ThreadPool(jobs or 1)
+    rows = []
+    try:
+        for result in pool.imap_unordered(solve_instance, tasks):
+            for row in result:
+                print >> sys.stderr, "%s %s: %s in %.2fs (%d vars, %d clauses)" % (
+                    row["instance"], row["solver"], row["status"], row["solve_seconds"], row["vars"], row["clauses"])
+                rows.append(row)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return rows
+
+def write_table(rows, out, format = "csv"):
+    """Write the rows as a CSV or JSON ("json") table to the file-like object out."""
+    if format == "json":
+        json.dump(rows, out, indent=1, sort_keys=True)
+        out.write("\n")
+    else:
+        writer = csv.DictWriter(out, COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    argparser = argparse.ArgumentParser(description="Solves generated SPL-specific benchmark formulas by SAT solvers.")
+    argparser.add_argument("-j", "--jobs", type=int, default=1, help="number of solvers running at once (default: 1)")
+    argparser.add_argument("--solver", action="append", type=shlex.split, metavar="COMMAND",
+                           help="solver command reading DIMACS on its standard input (may be repeated; "
+                                "default: the bundled dpll.py)")
+    argparser.add_argument("--timeout", type=float, help="time limit of each solver run in seconds")
+    argparser.add_argument("--backend", choices=["formula", "int", "tseitin"], default="formula",
+                           help="CNF conversion, see main.py")
+    argparser.add_argument("--max-clauses", type=int, help="threshold of the fallback to Tseitin's encoding, see main.py")
+    argparser.add_argument("--simplify", action="store_true", help="remove tautologies and subsumed clauses, see main.py")
+    argparser.add_argument("--tolerance", type=float, help="hit the sizes of the resulting CNF, see main.py")
+    argparser.add_argument("--seed", type=int, default=0, help="base seed of instances without an explicit seed")
+    argparser.add_argument("--vars", type=parse_range, default=[main.min_vars], help="range of min_vars")
+    argparser.add_argument("--clauses", type=parse_range, default=[main.min_clauses], help="range of min_clauses")
+    argparser.add_argument("--specs", type=argparse.FileType("r"), help="file with 'min_vars min_clauses [seed]' lines")
+    argparser.add_argument("-o", "--output", help="write the table to the given .csv or .json file "
+                                                  "(CSV on the standard output by default)")
+    args = argparser.parse_args()
+    if args.jobs < 1:
+        argparser.error("the number of jobs has to be at least 1")
+
+    if args.specs:
+        specs = read_specs(args.specs, args.seed)
+    else:
+        specs = range_specs(args.vars, args.clauses, args.seed)
+    rows = run_campaign(specs, args.solver, args.jobs, args.timeout, backend=args.backend, max_clauses=args.max_clauses,
+                        tolerance=args.tolerance, simplify_clauses=args.simplify)
+    if args.output:
+        with open(args.output, "wb") as f:
+            write_table(rows, f, "json" if args.output.endswith(".json") else "csv")
+    else:
+        write_table(rows, sys.stdout)
@@ -0,0 +1,507 @@
+"""
+Module for representing CNF formulas as flat arrays of integer literals
+and for compiling propositional formulas directly into them.
+
+Variables are numbered from 1 (as in the DIMACS format), a negative literal
+stands for the negation of the variable.
+
+@author: Keznikl
+"""
+
+from array import array
+from collections import OrderedDict
+from formula import *
+
+class SymbolTable:
+    """Assigns integer ids to variable names in the order of their first occurrence.
+
+    Fields:
+    ids   -- dictionary mapping the variable names to their ids
+    names -- list of the variable names, the name of the variable i is at names[i - 1]
+
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def getId(self, name):
+        """Return the id of the given variable name, assign a new one if necessary."""
+        vid = self.ids.get(name)
+        if vid is None:
+            self.names.append(name)
+            vid = len(self.names)
+            self.ids[name] = vid
+        return vid
+
+    def getName(self, vid):
+        return self.names[vid - 1]
+
+    def freshName(self, prefix, number = 0, reserved = ()):
+        """Return the pair (name, number) of the first name prefix + number (from the given number on) 
+        which has no id yet and is not reserved (e.g. a variable of a formula not numbered yet).
+        """
+        while True:
+            name = "%s%d" % (prefix, number)
+            if name not in self.ids and name not in reserved:
+                return (name, number)
+            number += 1
+
+    def numVars(self):
+        return len(self.names)
+
+
+class ClauseSet:
+    """CNF formula stored in two flat integer arrays (similar to the CSR layout of sparse matrices).
+
+    Fields:
+    literals -- literals of all clauses, one clause after another
+    offsets  -- start of each clause in literals (plus the end of the last clause),
+                i.e. clause i is literals[offsets[i]:offsets[i + 1]]
+
+    """
+
+    def __init__(self):
+        self.literals = array('i')
+        self.offsets = array('i', [0])
+
+    def add(self, clause):
+        """Append a clause given as a sequence of integer literals."""
+        self.literals.extend(clause)
+        self.offsets.append(len(self.literals))
+
+    def extend(self, clauses):
+        for c in clauses:
+            self.add(c)
+
+    def extendShifted(self, other, offset):
+        """Append the clauses of another ClauseSet with variable ids increased by offset."""
+        base = len(self.literals)
+        self.literals.extend([l + offset if l > 0 else l - offset for l in other.literals])
+        self.offsets.extend([o + base for o in other.offsets[1:]])
+
+    def clause(self, i):
+        return self.literals[self.offsets[i]:self.offsets[i + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        literals = self.literals
+        offsets = self.offsets
+        for i in xrange(len(offsets) - 1):
+            yield literals[offsets[i]:offsets[i + 1]]
+
+    def numClauses(self):
+        return len(self)
+
+    def numLiterals(self):
+        return len(self.literals)
+
+
+class ClauseTemplate:
+    """A formula converted to integer clauses once, to be instantiated with renamed variables.
+
+    The variables of the template are numbered from 1, an instance is created by
+    offsetting the variable ids (instead of cloning, renaming and converting the formula again).
+
+    Fields:
+    symbols           -- the SymbolTable of the template
+    clauses           -- the ClauseSet of the template
+    num_subformulas   -- number of top-level sub-formulas of the template formula (if it is a conjunction)
+    num_formula_vars  -- number of variables of the template formula, i.e. without the auxiliary 
+                         variables of an equisatisfiable encoding (all variables if None)
+
+    """
+
+    def __init__(self, symbols, clauses, num_subformulas = 1, num_formula_vars = None):
+        self.symbols = symbols
+        self.clauses = clauses
+        self.num_subformulas = num_subformulas
+        self.num_formula_vars = num_formula_vars
+
+    def numVars(self):
+        return self.symbols.numVars()
+
+    def numFormulaVars(self):
+        if self.num_formula_vars is None:
+            return self.numVars()
+        return self.num_formula_vars
+
+    def numClauses(self):
+        return len(self.clauses)
+
+    def instantiate(self, prefix, symbols, clauseSet):
+        """Append a copy of the template with variable names prefixed by prefix to clauseSet.
+
+        The prefix has to be unique, so that the instance gets fresh (consecutive) variable ids in symbols.
+
+        """
+        offset = symbols.numVars()
+        for name in self.symbols.names:
+            symbols.getId(prefix + name)
+        assert symbols.numVars() == offset + self.numVars(), "the prefix %s is not unique" % prefix
+        clauseSet.extendShifted(self.clauses, offset)
+
+
+def toTemplate(formula):
+    """Convert the formula to a ClauseTemplate (see toClauseSet)."""
+    symbols = SymbolTable()
+    clauses = toClauseSet(formula, symbols)
+    return ClauseTemplate(symbols, clauses, len(formula.subf) if isinstance(formula, Conjunction) else 1)
+
+
+class TemplateCache:
+    """Cache of the ClauseTemplate instances indexed by a key identifying the template formula.
+
+    With max_templates, the least recently used template is evicted when the cache is full,
+    so that the memory of the cache is bounded (e.g. when streaming, see main.iter_variants).
+
+    Fields:
+    templates     -- ordered dictionary mapping the keys to the templates (the least recently used first)
+    max_templates -- the maximal number of templates (unlimited if None)
+    hits          -- number of get calls answered from the cache
+    misses        -- number of get calls which compiled a new template
+    evictions     -- number of evicted templates
+
+    """
+
+    def __init__(self, max_templates = None):
+        self.templates = OrderedDict()
+        self.max_templates = max_templates
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """Return the template for key; on miss, build() is called to obtain the ClauseTemplate."""
+        template = self.templates.pop(key, None)
+        if template is None:
+            self.misses += 1
+            template = build()
+            if self.max_templates is not None and len(self.templates) >= self.max_templates:
+                self.templates.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.hits += 1
+        self.templates[key] = template
+        return template
+
+    def clear(self):
+        self.templates = OrderedDict()
+
+
+def toClauseSet(formula, symbols, clauseSet=None, max_clauses=None, report=None):
+    """Convert the formula to CNF using De-Morgan laws and append its clauses to clauseSet.
+
+    Unlike Formula.toCNF, no CNF parse tree is built; the variables are numbered
+    using the given symbol table during the conversion. Duplicate clauses
+    (of the formula) are filtered.
+
+    formula     -- the formula to be converted
+    symbols     -- the SymbolTable shared by all formulas of the instance
+    clauseSet   -- the ClauseSet to be extended (a new one is created if None)
+    max_clauses -- if given, the subformulas whose CNF would have more clauses 
+                   are encoded by Tseitin's encoding instead (see SizeGuard)
+    report      -- list extended by the (subformula, estimated clauses) pairs of such subformulas
+
+    returns     -- the clauseSet
+
+    """
+    if clauseSet is None:
+        clauseSet = ClauseSet()
+    guard = None
+    if max_clauses is not None:
+        guard = SizeGuard(formula, max_clauses, symbols, clauseSet, report)
+    seen = set()
+    duplicates = 0
+    for c in _clauses(formula, True, symbols, guard, {}, sharedSubformulas(formula)):
+        c = tuple(sorted(c, key=abs))
+        if c not in seen:
+            seen.add(c)
+            clauseSet.add(c)
+        else:
+            duplicates += 1
+    statistics.duplicates_filtered += duplicates
+    return clauseSet
+
+class SizeGuard:
+    """Guards the conversion to CNF against the exponential blowup of distributing disjunctions.
+
+    The sizes of the CNF of all subformulas are estimated upfront (formula.cnfSizes).
+    A subformula whose CNF would have more than max_clauses clauses (and which would 
+    be distributed, i.e. it is not a conjunction of smaller parts) is replaced by an 
+    auxiliary variable defined by the polarity-aware Tseitin's encoding 
+    (tseitin.toClauseSet); the result is then only equisatisfiable.
+
+    Fields:
+    max_clauses -- the threshold on the number of clauses of a subformula
+    sizes       -- the estimated sizes, see formula.cnfSizes
+    symbols     -- the SymbolTable of the conversion
+    clauseSet   -- the ClauseSet receiving the clauses of the Tseitin's encoding
+    report      -- list of the (subformula, estimated clauses) pairs of the encoded subformulas
+    prefix      -- the prefix of the names of the auxiliary variables (a fresh name is chosen,
+                   see SymbolTable.freshName)
+    reserved    -- the names of the variables of the formula (which may not be numbered yet)
+
+    """
+
+    def __init__(self, formula, max_clauses, symbols, clauseSet, report = None, prefix = "_g"):
+        self.max_clauses = max_clauses
+        self.sizes = cnfSizes(formula)
+        self.symbols = symbols
+        self.clauseSet = clauseSet
+        self.report = report if report is not None else []
+        self.prefix = prefix
+        self.reserved = set(f.name for f in preorder(formula) if isinstance(f, Variable))
+        self.counter = 0
+
+    def exceeds(self, f, positive):
+        """True iff the CNF of f (or !f if not positive) is too large and f should be encoded."""
+        if isinstance(f, Conjunction) and positive or isinstance(f, Disjunction) and not positive:
+            # conjunction of the parts, it is enough to guard the parts
+            return False
+        if isinstance(f, Implication) and not positive:
+            return False
+        return self.sizes[id(f)][0 if positive else 1][0] > self.max_clauses
+
+    def encode(self, f, positive):
+        """Encode f by Tseitin's encoding and return the CNF of f (or !f) referring to the new variable."""
+        # imported here, tseitin depends on this module
+        import tseitin
+        name, number = self.symbols.freshName(self.prefix, self.counter, self.reserved)
+        self.counter = number + 1
+        self.report.append((f, self.sizes[id(f)][0 if positive else 1][0]))
+        v = Variable(name)
+        if positive:
+            # v => f suffices, as v is asserted in place of f
+            definition = Implication(v, f)
+        else:
+            definition = Implication(f, v)
+        tseitin.toClauseSet(definition, self.symbols, self.clauseSet, name + "_")
+        vid = self.symbols.getId(name)
+        return [(vid,)] if positive else [(-vid,)]
+
+
+class SimplificationStats:
+    """Statistics of the simplification of a ClauseSet (see simplify).
+
+    Fields:
+    clauses            -- number of clauses before the simplification
+    literals           -- number of literals before the simplification
+    tautologies        -- number of removed clauses containing both x and !x
+    duplicate_literals -- number of removed repeated literals within a clause
+    duplicate_clauses  -- number of removed clauses equal to a previous clause
+    subsumed           -- number of removed clauses containing all the literals of another clause
+
+    """
+
+    def __init__(self):
+        self.clauses = 0
+        self.literals = 0
+        self.tautologies = 0
+        self.duplicate_literals = 0
+        self.duplicate_clauses = 0
+        self.subsumed = 0
+
+    def removed(self):
+        return self.tautologies + self.duplicate_clauses + self.subsumed
+
+    def __str__(self):
+        return ("simplification: %d tautologies, %d duplicate literals, %d duplicate clauses, %d subsumed clauses removed"
+                % (self.tautologies, self.duplicate_literals, self.duplicate_clauses, self.subsumed))
+
+
+def simplify(clauseSet, stats=None):
+    """Remove tautologies, duplicate literals, duplicate and subsumed clauses; the result is equivalent.
+
+    Subsumed clauses are found by forward subsumption: the clauses are processed from 
+    the shortest ones and each kept clause is indexed in the occurrence list of one of 
+    its literals (the least occurring one), so that for a clause C only the kept clauses 
+    indexed by the literals of C are candidates. The candidates are filtered by 
+    64-bit clause signatures before the subset test.
+
+    clauseSet -- the ClauseSet to be simplified (not modified)
+    stats     -- the SimplificationStats to be filled in (a new one if None)
+
+    returns   -- the pair (simplified ClauseSet, stats); the order of the kept clauses is preserved
+
+    """
+    if stats is None:
+        stats = SimplificationStats()
+    stats.clauses = len(clauseSet)
+    stats.literals = clauseSet.numLiterals()
+
+    # tautologies, duplicate literals and clauses
+    clauses = []
+    literals = []
+    seen = set()
+    for c in clauseSet:
+        lits = set(c)
+        if len(lits) < len(c):
+            stats.duplicate_literals += len(c) - len(lits)
+            c = [l for (i, l) in enumerate(c) if l not in c[:i]]
+        if any(-l in lits for l in lits):
+            stats.tautologies += 1
+            continue
+        key = frozenset(lits)
+        if key in seen:
+            stats.duplicate_clauses += 1
+            continue
+        seen.add(key)
+        clauses.append(key)
+        literals.append(c)
+    del seen
+
+    # number of occurrences of each literal, used to select the indexing literal
+    counts = {}
+    for c in clauses:
+        for l in c:
+            counts[l] = counts.get(l, 0) + 1
+
+    # forward subsumption from the shortest clauses
+    order = sorted(xrange(len(clauses)), key=lambda i: len(clauses[i]))
+    occurrences = {}
+    keep = [True] * len(clauses)
+    for i in order:
+        c = clauses[i]
+        sig = _signature(c)
+        subsumed = False
+        for l in c:
+            for (d, dsig) in occurrences.get(l, ()):
+                if dsig & ~sig == 0 and d <= c:
+                    subsumed = True
+                    break
+            if subsumed:
+                break
+        if subsumed:
+            keep[i] = False
+            stats.subsumed += 1
+            continue
+        if c:
+            occurrences.setdefault(min(c, key=counts.get), []).append((c, sig))
+
+    result = ClauseSet()
+    for i, c in enumerate(literals):
+        if keep[i]:
+            result.add(c)
+    return (result, stats)
+
+def _signature(clause):
+    """Bit mask of the literals of the clause modulo 64 (if c is a subset of d, sig(c) is a subset of sig(d))."""
+    sig = 0
+    for l in clause:
+        sig |= 1 << ((2 * l if l > 0 else -2 * l + 1) & 63)
+    return sig
+
+
+def fromCNF(clauses, symbols, clauseSet=None):
+    """Append the clauses given as CNF parse trees (e.g. Formula.toCNF().subf) to clauseSet.
+
+    The variables are numbered in the order of their first occurrence,
+    the same way as in dimacs.DimacsFormatVisitor.
+
+    """
+    if clauseSet is None:
+        clauseSet = ClauseSet()
+    for cl in clauses:
+        if isinstance(cl, Disjunction):
+            clauseSet.add([_literal(l, symbols) for l in cl.subf])
+        else:
+            clauseSet.add([_literal(cl, symbols)])
+    return clauseSet
+
+def _literal(f, symbols):
+    assert isinstance(f, Negation) or isinstance(f, Variable), 'literal cannot be a ' + f.__class__.__name__
+    if isinstance(f, Negation):
+        return -_literal(f.subf, symbols)
+    return symbols.getId(f.name)
+
+def _clauses(f, positive, symbols, guard = None, memo = None, shared = None):
+    """Return the list of clauses (tuples of literals) of f (or !f if not positive) in CNF.
+
+    The subformulas are converted using an explicit stack of frames (formula, polarity, 
+    number of dependencies or None if not expanded yet) instead of recursion, in the same 
+    order as by a depth-first recursion.
+
+    memo   -- dictionary of the already converted subformulas indexed by (id, positive), so that 
+              the shared subformulas (e.g. both sides of an equivalence) are converted only once 
+              for each polarity; the returned lists must not be modified
+    shared -- the ids of the subformulas to be memoized (formula.sharedSubformulas), the CNF 
+              of the other ones is needed only once (all are memoized if None)
+
+    """
+    results = []
+    stack = [(f, positive, None)]
+    while stack:
+        f, positive, n = stack.pop()
+        if n is not None:
+            converted = results[len(results) - n:]
+            del results[len(results) - n:]
+            result = _combine(f, positive, converted)
+            if memo is not None and (shared is None or id(f) in shared):
+                memo[(id(f), positive)] = result
+            results.append(result)
+            continue
+        while isinstance(f, Negation):
+            f = f.subf
+            positive = not positive
+        if isinstance(f, Variable):
+            vid = symbols.getId(f.name)
+            results.append([(vid,)] if positive else [(-vid,)])
+            continue
+        if memo is not None:
+            result = memo.get((id(f), positive))
+            if result is not None:
+                statistics.cnf_reused += 1
+                results.append(result)
+                continue
+        if guard is not None and guard.exceeds(f, positive):
+            result = guard.encode(f, positive)
+            if memo is not None and (shared is None or id(f) in shared):
+                memo[(id(f), positive)] = result
+            results.append(result)
+            continue
+        deps = _dependencies(f, positive)
+        stack.append((f, positive, len(deps)))
+        stack.extend([(e, p, None) for (e, p) in reversed(deps)])
+    return results[0]
+
+def _dependencies(f, positive):
+    """Return the (subformula, polarity) pairs whose CNF is needed for the CNF of f (or !f), see _combine."""
+    if isinstance(f, (Conjunction, Disjunction)):
+        return [(e, positive) for e in f.subf]
+    if isinstance(f, Implication):
+        # (p => c) == (!p | c), !(p => c) == (p & !c)
+        return [(f.premise, not positive), (f.conclusion, positive)]
+    if isinstance(f, Equivalence):
+        return [(f.left, True), (f.right, True), (f.left, False), (f.right, False)]
+    raise Exception("Cannot compile a " + f.__class__.__name__)
+
+def _combine(f, positive, converted):
+    """Combine the CNF of the dependencies of f (see _dependencies) into the CNF of f (or !f)."""
+    if isinstance(f, Conjunction):
+        return _conjoin(converted) if positive else _distribute(converted)
+    if isinstance(f, Disjunction):
+        return _distribute(converted) if positive else _conjoin(converted)
+    if isinstance(f, Implication):
+        return _distribute(converted) if positive else _conjoin(converted)
+    # (l <=> r) == (!l | r) & (l | !r), !(l <=> r) == (l | r) & (!l | !r)
+    left, right, negLeft, negRight = converted
+    if positive:
+        return _conjoin([_distribute([negLeft, right]), _distribute([left, negRight])])
+    return _conjoin([_distribute([left, right]), _distribute([negLeft, negRight])])
+
+def _conjoin(cnfs):
+    """Conjunction of CNF formulas given as lists of clauses."""
+    clauses = []
+    for c in cnfs:
+        clauses.extend(c)
+    return clauses
+
+def _distribute(cnfs):
+    """Disjunction of CNF formulas given as lists of clauses (distributes over the conjunctions)."""
+    clauses = [()]
+    for c in cnfs:
+        clauses = [c1 + c2 for c1 in clauses for c2 in c]
+    return clauses
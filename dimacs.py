@@ -1,35 +1,363 @@
 """
-Module for converting parse tree of a CNF formula into DIMACS format.
+Module for converting parse tree of a CNF formula into DIMACS format 
+and for reading DIMACS files back (see DimacsReader).
 
 @author: Keznikl
 """
 from formula import *
+from clauses import SymbolTable, ClauseSet
+from Queue import Queue, Full
+import threading
+import timeit
+import gzip
+import mmap
+import os
 import sys
 
+# xz compression is optional (the lzma module is not available in all Python versions)
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+HEADER_COMMENT = "c code verification example\n"
+
+# compressions of the output files, by the extension of the file
+COMPRESSIONS = {".gz": "gz", ".xz": "xz"}
+
+def compressionOf(path):
+    """Return the compression of the file given by its extension (None if not compressed)."""
+    for extension, compression in COMPRESSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+def checkCompression(compression):
+    """Raise an exception if the compression ("gz", "xz" or None) is unknown or not available.
+
+    Used to validate the compression before the output file is opened.
+
+    """
+    if compression is None or compression == "gz":
+        return
+    if compression == "xz":
+        if lzma is None:
+            raise Exception("xz compression requires the lzma module (backports.lzma in Python 2)")
+        return
+    raise Exception("Unknown compression " + compression)
+
+def compressedOutput(out, compression):
+    """Wrap the file-like object out so that the written data are compressed on the fly.
+
+    compression -- "gz", "xz" or None (out is returned as it is)
+    returns     -- the wrapping file-like object; closing it does not close out
+
+    """
+    checkCompression(compression)
+    if compression is None:
+        return out
+    if compression == "gz":
+        return gzip.GzipFile(filename="", mode="wb", fileobj=out)
+    return lzma.LZMAFile(out, "wb")
+
+def compressedInput(f, compression):
+    """Wrap the file-like object f so that the read data are decompressed on the fly (see compressedOutput)."""
+    checkCompression(compression)
+    if compression is None:
+        return f
+    if compression == "gz":
+        return gzip.GzipFile(filename="", mode="rb", fileobj=f)
+    return lzma.LZMAFile(f, "rb")
+
+
+class BackgroundOutput:
+    """File-like object handing the written data through a bounded queue to a writer thread.
+
+    The producer (e.g. DimacsWriter, which writes the formatted clauses in chunks) continues 
+    converting and formatting while the thread performs the writes to out (including the 
+    compression, if out is a compressedOutput); the file is written and compressed with 
+    the GIL released. When the queue is full, the producer waits (stalls) for the thread.
+
+    Only the thread accesses out (seek and sync are queued as well and waited for), 
+    the position is tracked by the producer, hence tell does not wait. The thread 
+    flushes out whenever the queue is empty. An error of the thread is raised 
+    by the next write (or by close).
+
+    Fields:
+    out            -- the wrapped file-like object (not closed by close)
+    max_chunks     -- the capacity of the queue (number of written chunks)
+    chunks         -- number of chunks written
+    bytes          -- number of bytes written
+    max_depth      -- the maximal number of queued chunks seen by write
+    total_depth    -- the sum of the numbers of queued chunks seen by write (see stats)
+    stalls         -- number of writes which waited for a free slot in the queue
+    stall_seconds  -- the total time the producer waited
+    idle_seconds   -- the total time the writer thread waited for data
+
+    """
+
+    # marks the end of the data in the queue
+    _END = object()
+
+    def __init__(self, out, max_chunks = 16):
+        self.out = out
+        self.max_chunks = max_chunks
+        self.queue = Queue(max_chunks)
+        self.chunks = 0
+        self.bytes = 0
+        self.max_depth = 0
+        self.total_depth = 0
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.error = None
+        try:
+            self.position = out.tell()
+        except (IOError, AttributeError):
+            # not seekable
+            self.position = None
+        self.thread = threading.Thread(target=self._run, name="BackgroundOutput")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        queue = self.queue
+        while True:
+            if queue.empty():
+                self._perform(self.out.flush)
+            start = timeit.default_timer()
+            data = queue.get()
+            self.idle_seconds += timeit.default_timer() - start
+            if data is self._END:
+                queue.task_done()
+                return
+            if isinstance(data, str):
+                self._perform(self.out.write, data)
+            else:
+                # an operation queued by seek or sync
+                self._perform(data)
+            queue.task_done()
+
+    def _perform(self, operation, *args):
+        """Perform the operation on out in the thread; after an error, the rest is discarded."""
+        if self.error is not None:
+            return
+        try:
+            operation(*args)
+        except Exception:
+            # raised by the producer
+            self.error = sys.exc_info()
+
+    def _raiseError(self):
+        # the error is kept, the output is incomplete
+        if self.error is not None:
+            raise self.error[0], self.error[1], self.error[2]
+
+    def write(self, data):
+        self._raiseError()
+        depth = self.queue.qsize()
+        self.max_depth = max(self.max_depth, depth)
+        self.total_depth += depth
+        try:
+            self.queue.put_nowait(data)
+        except Full:
+            self.stalls += 1
+            start = timeit.default_timer()
+            self.queue.put(data)
+            self.stall_seconds += timeit.default_timer() - start
+        self.chunks += 1
+        self.bytes += len(data)
+        if self.position is not None:
+            self.position += len(data)
+
+    def flush(self):
+        """Does not wait for the thread, the data are flushed when the queue is empty (see sync)."""
+        self._raiseError()
+
+    def sync(self):
+        """Wait until all the queued data are written and flushed."""
+        self._call(self.out.flush)
+
+    def _call(self, operation):
+        """Perform the operation by the thread (after the queued data) and wait for it."""
+        self.queue.put(operation)
+        self.queue.join()
+        self._raiseError()
+
+    def tell(self):
+        if self.position is None:
+            raise IOError("Illegal seek")
+        return self.position
+
+    def seek(self, offset, whence = os.SEEK_SET):
+        def seek():
+            self.out.seek(offset, whence)
+            self.position = self.out.tell()
+        self._call(seek)
+
+    def close(self):
+        """Write all the queued data and stop the thread (out stays open)."""
+        if self.thread.is_alive():
+            self.queue.put(self._END)
+            self.thread.join()
+        self._raiseError()
+        self.out.flush()
+
+    def stats(self):
+        """Return the dictionary of the queue depth and stall statistics."""
+        return {"max_chunks": self.max_chunks,
+                "chunks": self.chunks,
+                "bytes": self.bytes,
+                "max_queue_depth": self.max_depth,
+                "mean_queue_depth": float(self.total_depth) / max(self.chunks, 1),
+                "stalls": self.stalls,
+                "stall_seconds": self.stall_seconds,
+                "writer_idle_seconds": self.idle_seconds}
+
+
+class DimacsWriter:
+    """Writes a formula in the DIMACS format clause by clause, buffering the output.
+    
+    The header is either written upfront (if the numbers of variables and clauses 
+    are known, see writeHeader) or a fixed-width placeholder is reserved and 
+    rewritten on close; the latter requires a seekable output. The placeholder is 
+    padded by a comment line before the header, so that the header line itself 
+    has no padding.
+    
+    Fields:
+    out          -- the output file-like object
+    buffer_size  -- number of clauses buffered before writing them to out
+    num_vars     -- the highest variable number seen
+    num_clauses  -- number of written clauses
+    
+    """
+    
+    # width reserved for each of the counts in the placeholder header
+    COUNT_WIDTH = 20
+    
+    def __init__(self, out, buffer_size = 4096):
+        self.out = out
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.num_vars = 0
+        self.num_clauses = 0
+        self.header_written = False
+        self.header_reserved = False
+        self.header_offset = 0
+        
+    def writeHeader(self, num_vars, num_clauses):
+        """Write the header with the given (precomputed) counts."""
+        assert not self.header_written and not self.header_reserved, "header already written"
+        self.out.write(HEADER_COMMENT + "p cnf %d %d\n" % (num_vars, num_clauses))
+        self.header_written = True
+    
+    def reserveHeader(self):
+        """Write a placeholder for the header, the counts are filled in on close."""
+        assert not self.header_written and not self.header_reserved, "header already written"
+        self.out.write(HEADER_COMMENT)
+        try:
+            self.header_offset = self.out.tell()
+        except IOError:
+            raise IOError("Cannot reserve the DIMACS header on a non-seekable output, use writeHeader")
+        self.out.write(self._paddedHeader(0, 0))
+        self.header_reserved = True
+    
+    def writeClause(self, literals):
+        """Write a clause given as a sequence of integer literals."""
+        self.writeFormatted(" ".join([str(l) for l in literals] + ["0"]))
+        for l in literals:
+            if l > self.num_vars or -l > self.num_vars:
+                self.num_vars = abs(l)
+    
+    def writeFormatted(self, clause):
+        """Write an already formatted clause (without the trailing new line)."""
+        if not self.header_written and not self.header_reserved:
+            self.reserveHeader()
+        self.buffer.append(clause)
+        self.num_clauses += 1
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+    
+    def flush(self):
+        if self.buffer:
+            self.buffer.append("")
+            self.out.write("\n".join(self.buffer))
+            self.buffer = []
+        self.out.flush()
+    
+    def close(self, num_vars = None):
+        """Flush the buffered clauses and fill in the reserved header (if any).
+        
+        num_vars -- the number of variables for the header (if not given, the highest variable number is used)
+        
+        """
+        if not self.header_written and not self.header_reserved:
+            self.reserveHeader()
+        self.flush()
+        if self.header_reserved:
+            if num_vars is None:
+                num_vars = self.num_vars
+            end = self.out.tell()
+            self.out.seek(self.header_offset)
+            self.out.write(self._paddedHeader(num_vars, self.num_clauses))
+            self.out.seek(end)
+            self.out.flush()
+            self.header_reserved = False
+            self.header_written = True
+    
+    def _paddedHeader(self, num_vars, num_clauses):
+        """Return the header preceded by a comment line padding it to the reserved width."""
+        header = "p cnf %d %d\n" % (num_vars, num_clauses)
+        assert len(header) <= len("p cnf  \n") + 2 * self.COUNT_WIDTH, "counts exceed the reserved width"
+        return "c" + " " * (len("p cnf  \n") + 2 * self.COUNT_WIDTH - len(header)) + "\n" + header
+
+
 class DimacsFormatVisitor():
     """Visitor that traverses the parse tree of CNF formula and creates its DIMACS representation."""
     
-    def __init__(self):
+    def __init__(self, symbols = None):
+        """The variables are numbered in the order they are visited, 
+        unless a clauses.SymbolTable (numbering the variables) is given.
+        """
         self.variables = {}
         self.var_counter = 1
         self.clauses = []
+        self.clauses_written = 0
+        self.symbols = symbols
 
     def reset(self, reset_clauses = False):
         self.variables = {}
         if reset_clauses:
             self.var_counter = 1
             self.clauses = []
+            self.clauses_written = 0
 
     def getDimacsString(self):
         num_variables = self.var_counter - 1
         num_clauses = len(self.clauses)
-        header = "c code verification example\np cnf %d %d\n" % (num_variables, num_clauses)
+        header = HEADER_COMMENT + "p cnf %d %d\n" % (num_variables, num_clauses)
         return header + "\n".join(self.clauses)
 
     def processClauses(self, c):
         print >> sys.stderr, "Processing %d clauses" % len(c)
         self.clauses.extend([self.formatClause(cl) for cl in c])
 
+    def writeClauses(self, c, writer):
+        """Stream the clauses to the DimacsWriter instead of keeping them in memory.
+        
+        The variables are numbered in a first pass, so that the header can be written upfront.
+        
+        """
+        for cl in c:
+            self.formatClause(cl)
+        writer.writeHeader(self.numVars(), len(c))
+        for cl in c:
+            writer.writeFormatted(self.formatClause(cl))
+        self.clauses_written += len(c)
+
     def formatClause(self, clause):
         assert isinstance(clause, Disjunction) or isinstance(clause, Negation) or isinstance(clause, Variable), 'clause cannot be a ' + clause.__class__.__name__
         if isinstance(clause, Disjunction):  
@@ -41,6 +369,10 @@ class DimacsFormatVisitor():
         assert isinstance(var, Negation) or isinstance(var, Variable)
         if isinstance(var, Negation):
             return "-%s" % self.formatVar(var.subf)
+        elif self.symbols is not None:
+            vid = self.symbols.getId(var.name)
+            self.var_counter = max(self.var_counter, vid + 1)
+            return str(vid)
         else:
             vcode = self.variables.get(var.name, None)
             # var.name not in self.variables
@@ -51,7 +383,180 @@ class DimacsFormatVisitor():
             return vcode
 
     def numClauses(self):
-        return len(self.clauses)
+        return len(self.clauses) + self.clauses_written
     
     def numVars(self):
         return self.var_counter - 1
+
+
+class DimacsReader:
+    """Reads a DIMACS file (possibly compressed, see compressionOf) lazily, chunk by chunk.
+    
+    An uncompressed file is memory-mapped. Each chunk (of whole lines) is parsed into 
+    integers at once and split into clauses at the terminating zeros, so that the memory 
+    used is bounded by the chunk size unless all clauses are collected (readClauseSet, 
+    readFormula). Comment lines are skipped, a line starting with "%" ends the clauses.
+    
+    Fields:
+    path        -- the path of the file
+    compression -- "gz", "xz" or None
+    chunk_size  -- the approximate number of bytes parsed at once
+    num_vars    -- the number of variables given by the header (None if there is no header)
+    num_clauses -- the number of clauses given by the header (None if there is no header)
+    comments    -- the comment lines before the header (without the leading "c")
+    
+    """
+    
+    def __init__(self, path, compression = None, chunk_size = 1 << 20):
+        if compression is None:
+            compression = compressionOf(path)
+        self.path = path
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.num_vars = None
+        self.num_clauses = None
+        self.comments = []
+        f, close = self._open()
+        try:
+            self._readHeader(f)
+        finally:
+            close()
+    
+    def _open(self):
+        """Open the file, return the pair (file-like object, function closing it)."""
+        raw = open(self.path, "rb")
+        if self.compression is None:
+            if os.fstat(raw.fileno()).st_size == 0:
+                return (raw, raw.close)
+            data = mmap.mmap(raw.fileno(), 0, access=mmap.ACCESS_READ)
+            raw.close()
+            return (data, data.close)
+        f = compressedInput(raw, self.compression)
+        def close():
+            f.close()
+            raw.close()
+        return (f, close)
+    
+    def _readHeader(self, f):
+        """Read the comments and the header, return the first line of the clauses (or "")."""
+        while True:
+            line = f.readline()
+            stripped = line.strip()
+            if not line:
+                return ""
+            if not stripped:
+                continue
+            if stripped.startswith("c"):
+                if self.num_vars is None:
+                    self.comments.append(stripped[1:].strip())
+                continue
+            if stripped.startswith("p"):
+                fields = stripped.split()
+                if len(fields) != 4 or fields[1] != "cnf":
+                    raise IOError("Invalid DIMACS header: " + stripped)
+                self.num_vars = int(fields[2])
+                self.num_clauses = int(fields[3])
+                continue
+            return line
+    
+    def _chunks(self):
+        """Yield the integers of the clauses, one list per chunk of lines."""
+        f, close = self._open()
+        try:
+            chunk = self._readHeader(f)
+            while chunk:
+                chunk += f.read(self.chunk_size)
+                # complete the last line
+                chunk += f.readline()
+                end = False
+                if "c" in chunk or "%" in chunk:
+                    lines = []
+                    for line in chunk.split("\n"):
+                        stripped = line.lstrip()
+                        if stripped.startswith("%"):
+                            end = True
+                            break
+                        if not stripped.startswith("c"):
+                            lines.append(line)
+                    chunk = "\n".join(lines)
+                yield map(int, chunk.split())
+                if end:
+                    break
+                chunk = f.readline()
+        finally:
+            close()
+    
+    def __iter__(self):
+        """Iterate over the clauses, each a list of integer literals."""
+        clause = []
+        for ints in self._chunks():
+            i = 0
+            while True:
+                try:
+                    j = ints.index(0, i)
+                except ValueError:
+                    clause.extend(ints[i:])
+                    break
+                clause.extend(ints[i:j])
+                yield clause
+                clause = []
+                i = j + 1
+        if clause:
+            # the last clause is not terminated by 0
+            yield clause
+    
+    def readClauseSet(self, clauseSet = None):
+        """Read all clauses into a clauses.ClauseSet.
+        
+        returns -- the pair (clauses.ClauseSet, clauses.SymbolTable), the variable i is named str(i)
+        
+        """
+        if clauseSet is None:
+            clauseSet = ClauseSet()
+        literals = clauseSet.literals
+        offsets = clauseSet.offsets
+        num_vars = 0
+        pending = False
+        for ints in self._chunks():
+            if ints:
+                num_vars = max(num_vars, max(ints), -min(ints))
+            i = 0
+            while True:
+                try:
+                    j = ints.index(0, i)
+                except ValueError:
+                    literals.extend(ints[i:])
+                    pending = pending or i < len(ints)
+                    break
+                literals.extend(ints[i:j])
+                offsets.append(len(literals))
+                pending = False
+                i = j + 1
+        if pending:
+            offsets.append(len(literals))
+        symbols = SymbolTable()
+        for v in xrange(1, max(num_vars, self.num_vars or 0) + 1):
+            symbols.getId(str(v))
+        return (clauseSet, symbols)
+    
+    def iterFormulas(self):
+        """Iterate over the clauses as CNF parse trees (disjunctions of the shared literals, see formula.literal)."""
+        for clause in self:
+            literals = [literal(str(abs(l)), l > 0) for l in clause]
+            if len(literals) == 1:
+                yield literals[0]
+            else:
+                yield Disjunction(literals, is_cnf=True)
+    
+    def readFormula(self):
+        """Read all clauses as a CNF parse tree (a conjunction), the variable i is named str(i)."""
+        return Conjunction(list(self.iterFormulas()), is_cnf=True)
+
+
+def readClauseSet(path):
+    """Read the DIMACS file into the pair (clauses.ClauseSet, clauses.SymbolTable), see DimacsReader."""
+    return DimacsReader(path).readClauseSet()
+
+def readFormula(path):
+    """Read the DIMACS file as a CNF parse tree, see DimacsReader."""
+    return DimacsReader(path).readFormula()
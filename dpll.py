@@ -0,0 +1,215 @@
+"""
+Module implementing a tiny DPLL SAT solver, a stand-in for a real solver in the tests
+of the solver campaigns (see campaign.py).
+
+Usage:
+dpll.py [input.cnf]
+
+The formula is read in the DIMACS format from the given file (the standard input if
+not given). The result is printed in the format of the SAT competitions: the line
+"s SATISFIABLE" followed by the model in "v" lines, or "s UNSATISFIABLE"; the exit
+status is 10 or 20, respectively.
+
+The solver uses unit propagation with two watched literals per clause and
+chronological backtracking (without clause learning), the search uses an explicit
+trail instead of recursion. It is good enough for the generated SPL formulas,
+which are easy, not for hard instances.
+
+@author: Keznikl
+"""
+
+import sys
+
+SATISFIABLE = 10
+UNSATISFIABLE = 20
+
+
+def readDimacs(f):
+    """Read the clauses from the DIMACS file-like object f.
+
+    returns -- the pair (number of variables, list of clauses), each clause a list of integer literals
+
+    """
+    num_vars = 0
+    clauses = []
+    clause = []
+    for line in f:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("c"):
+            continue
+        if stripped.startswith("p"):
+            num_vars = int(stripped.split()[2])
+            continue
+        if stripped.startswith("%"):
+            break
+        for l in map(int, stripped.split()):
+            if l == 0:
+                clauses.append(clause)
+                clause = []
+            else:
+                clause.append(l)
+                num_vars = max(num_vars, abs(l))
+    if clause:
+        clauses.append(clause)
+    return (num_vars, clauses)
+
+
+class DPLLSolver:
+    """DPLL solver of a CNF formula given by integer clauses.
+
+    Fields:
+    num_vars     -- number of variables
+    clauses      -- the clauses with at least two literals (the first two are watched)
+    units        -- the literals of the unit clauses
+    value        -- value of each variable (indexed by the variable): 1, -1 or 0 if unassigned
+    watches      -- dictionary mapping each literal to the list of clauses watching it
+    trail        -- the assigned literals in the order of assignment
+    decisions    -- number of decisions made
+    propagations -- number of literals assigned by unit propagation
+    conflicts    -- number of conflicts
+
+    """
+
+    def __init__(self, num_vars, clauses):
+        self.num_vars = num_vars
+        self.value = [0] * (num_vars + 1)
+        self.watches = {}
+        self.clauses = []
+        self.units = []
+        self.empty = False
+        self.trail = []
+        self.decisions = 0
+        self.propagations = 0
+        self.conflicts = 0
+        occurrences = [0] * (num_vars + 1)
+        for c in clauses:
+            c = list(set(c))
+            if any(-l in c for l in c):
+                # tautology
+                continue
+            for l in c:
+                occurrences[abs(l)] += 1
+            if not c:
+                self.empty = True
+            elif len(c) == 1:
+                self.units.append(c[0])
+            else:
+                self.clauses.append(c)
+                self.watches.setdefault(c[0], []).append(c)
+                self.watches.setdefault(c[1], []).append(c)
+        # the most frequent variables are decided first
+        self.order = sorted(range(1, num_vars + 1), key=lambda v: -occurrences[v])
+
+    def litValue(self, l):
+        """Return 1 if the literal is true, -1 if false, 0 if unassigned."""
+        v = self.value[abs(l)]
+        return v if l > 0 else -v
+
+    def assign(self, l):
+        self.value[abs(l)] = 1 if l > 0 else -1
+        self.trail.append(l)
+
+    def propagate(self, head):
+        """Propagate the literals of the trail from the index head; return False on a conflict."""
+        value = self.value
+        trail = self.trail
+        while head < len(trail):
+            false = -trail[head]
+            head += 1
+            watching = self.watches.get(false, [])
+            kept = []
+            i = 0
+            while i < len(watching):
+                c = watching[i]
+                i += 1
+                if c[0] == false:
+                    c[0], c[1] = c[1], c[0]
+                first = c[0]
+                v = value[abs(first)]
+                if (v if first > 0 else -v) == 1:
+                    kept.append(c)
+                    continue
+                # look for a new literal to watch
+                for k in xrange(2, len(c)):
+                    l = c[k]
+                    v = value[abs(l)]
+                    if (v if l > 0 else -v) != -1:
+                        c[1], c[k] = l, false
+                        self.watches.setdefault(l, []).append(c)
+                        break
+                else:
+                    kept.append(c)
+                    v = value[abs(first)]
+                    if (v if first > 0 else -v) == -1:
+                        # conflict, the rest of the watches is kept
+                        kept.extend(watching[i:])
+                        self.watches[false] = kept
+                        return False
+                    self.assign(first)
+                    self.propagations += 1
+            self.watches[false] = kept
+        return True
+
+    def solve(self):
+        """Decide the formula, return the model (list of true literals) or None if unsatisfiable."""
+        if self.empty:
+            return None
+        for l in self.units:
+            if self.litValue(l) == -1:
+                return None
+            if self.litValue(l) == 0:
+                self.assign(l)
+        if not self.propagate(0):
+            return None
+        # decision levels as (trail length before the decision, decided literal, flipped)
+        levels = []
+        next_var = 0
+        while True:
+            while next_var < len(self.order) and self.value[self.order[next_var]] != 0:
+                next_var += 1
+            if next_var == len(self.order):
+                return [v if self.value[v] > 0 else -v for v in xrange(1, self.num_vars + 1)]
+            l = -self.order[next_var]
+            self.decisions += 1
+            levels.append((len(self.trail), l, False))
+            self.assign(l)
+            head = len(self.trail) - 1
+            while not self.propagate(head):
+                self.conflicts += 1
+                # backtrack to the last decision not flipped yet
+                while levels and levels[-1][2]:
+                    levels.pop()
+                if not levels:
+                    return None
+                start, l, flipped = levels.pop()
+                for u in self.trail[start:]:
+                    self.value[abs(u)] = 0
+                del self.trail[start:]
+                levels.append((start, -l, True))
+                self.assign(-l)
+                head = start
+                next_var = 0
+
+
+def writeResult(model, out):
+    """Write the result in the format of the SAT competitions."""
+    if model is None:
+        out.write("s UNSATISFIABLE\n")
+        return
+    out.write("s SATISFIABLE\n")
+    for i in xrange(0, len(model), 10):
+        out.write("v %s\n" % " ".join(str(l) for l in model[i:i + 10]))
+    out.write("v 0\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            num_vars, clauses = readDimacs(f)
+    else:
+        num_vars, clauses = readDimacs(sys.stdin)
+    solver = DPLLSolver(num_vars, clauses)
+    model = solver.solve()
+    print "c decisions %d, propagations %d, conflicts %d" % (solver.decisions, solver.propagations, solver.conflicts)
+    writeResult(model, sys.stdout)
+    sys.exit(UNSATISFIABLE if model is None else SATISFIABLE)
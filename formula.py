@@ -4,6 +4,8 @@ Module for representing SAT formulas and their transformation to CNF.
 @author: Keznikl
 """
 
+import weakref
+
 class Visitor:
     """Interface for the visitor class over Formula sub-classes."""
     def acceptConjunction(self, f):
@@ -19,24 +21,55 @@ class Visitor:
     def acceptVariable(self, f):
         pass
 
-class Formula:
+class Statistics:
+    """Counters of the work done by the module, read by metrics.RunMetrics.
+    
+    Fields:
+    nodes_created       -- number of the parse tree nodes created
+    duplicates_filtered -- number of the duplicate clauses filtered during the conversion to CNF
+    cnf_reused          -- number of subformulas whose CNF was reused instead of converting them again
+    
+    """
+
+    def __init__(self):
+        self.nodes_created = 0
+        self.duplicates_filtered = 0
+        self.cnf_reused = 0
+
+statistics = Statistics()
+
+
+class Formula(object):
     """Base class for all logical operators in a proposition formula. 
     Instances represent the parse tree of a propositional formula.
+    
+    The nodes use __slots__ instead of a per-instance dictionary, 
+    sub-classes declare the slots of their own fields.
     """
+
+    __slots__ = ("is_cnf", "_hash", "_str", "__weakref__")
     
     def __init__(self, is_cnf = False):
         """A formula can be initialized as already in CNF.
         Checking is_cnf optimizes the runtime of the translation to CNF.        
         """
         self.is_cnf = is_cnf
+        self._hash = None
+        self._str = None
+        statistics.nodes_created += 1
         
-    def toCNF(self):
-        """Convert the formula represented by this node to CNF using De-Morgan laws."""
-        pass
+    def toCNF(self, cache = None):
+        """Convert the formula represented by this node to CNF using De-Morgan laws.
+        
+        cache -- the CNFCache shared by several conversions (a private one if None)
+        
+        """
+        return convertToCNF(self, cache)
     
     def visit(self, visitor):
         """Aplly the visitor on the current parse-tree node of the formula and pass it to children.""" 
-        pass
+        for f in preorder(self):
+            f.acceptVisitor(visitor)
     
     def equals(self, f):
         """True iff this formula parse tree equals the parse tree of f."""
@@ -44,10 +77,36 @@ class Formula:
     
     def clone(self):
         """Deep clone the parse tree represented by this node. Maintains the is_cnf attribute."""
-        pass
+        return transform(self, lambda f, children: f.cloneNode(children))
     
     def derivationTree(self):
         """Simplify the parse tree into a derivation tree."""
+        return transform(self, lambda f, children: f.derivationNode(children))
+
+    def cnfDependencies(self):
+        """Return the formulas to be converted to CNF before cnfStep is called (see convertToCNF)."""
+        return []
+
+    def cnfStep(self, converted):
+        """Perform a single step of the conversion of this node to CNF (see convertToCNF).
+        
+        converted -- the CNF of the formulas returned by cnfDependencies
+        returns   -- the pair (f, done); f is the CNF of this node if done, 
+                     otherwise the CNF of this node is the CNF of f
+        
+        """
+        pass
+
+    def acceptVisitor(self, visitor):
+        """Call the accept method of the visitor corresponding to this node (not recursive)."""
+        pass
+
+    def cloneNode(self, children):
+        """Return a copy of this node with the given (already cloned) children."""
+        pass
+
+    def derivationNode(self, children):
+        """Return the derivation tree of this node given the derivation trees of its children."""
         pass
     
     def getChildren(self):
@@ -63,6 +122,438 @@ class Formula:
         """
         pass
 
+    def formatNode(self, children):
+        """Return the string of this node given the strings of its children (see formatFormula)."""
+        pass
+
+    def __str__(self):
+        return formatFormula(self)
+
+    def key(self):
+        """Return the structural key of the parse tree represented by this node.
+        
+        Two formulas have equal keys iff their parse trees are identical 
+        (unlike equals(), which only compares the common prefix of children).
+        
+        """
+        return (self.__class__,) + tuple(self.getChildren())
+
+    def __eq__(self, f):
+        if self is f:
+            return True
+        if not isinstance(f, Formula):
+            return False
+        return structurallyEqual(self, f)
+
+    def __ne__(self, f):
+        return not self.__eq__(f)
+
+    def __hash__(self):
+        """Structural hash (the hash of the key). Cached for nodes in CNF, as those are never modified."""
+        if self._hash is not None:
+            return self._hash
+        return structuralHash(self)
+
+    def sortKey(self):
+        """Return the canonical ordering key of the formula (its string representation).
+        Cached for nodes in CNF, as those are never modified.
+        """
+        if self._str is not None:
+            return self._str
+        return formatFormula(self)
+
+
+###############################################################################
+# Hash-consing
+###############################################################################
+
+# canonical instances of the CNF nodes created by toCNF, indexed by their structural key
+_consed = weakref.WeakValueDictionary()
+
+def hashcons(f):
+    """Return the canonical instance of the given CNF node.
+    
+    Structurally identical nodes produced by the translation to CNF are shared, 
+    therefore the resulting parse trees are DAGs and must not be modified in-place 
+    (use clone() first, as the RenameVisitor in main.py does).
+    
+    """
+    k = f.key()
+    canonical = _consed.get(k)
+    if canonical is None:
+        _consed[k] = f
+        canonical = f
+    return canonical
+
+def literal(name, positive = True):
+    """Return the shared (flyweight) CNF node of the literal with the given variable name and sign.
+    
+    All occurrences of a literal in the converted formulas are a single node, 
+    which is looked up before allocating a new one.
+    
+    """
+    v = _consed.get((Variable, name))
+    if v is None:
+        v = hashcons(Variable(name, is_cnf=True))
+    if positive:
+        return v
+    n = _consed.get((Negation, v))
+    if n is None:
+        n = hashcons(Negation(v, is_cnf=True))
+    return n
+
+def unique(formulas):
+    """Filter duplicates (w.r.t. the structural equality) from the list of formulas, keeping the order."""
+    seen = set()
+    filtered = []
+    for f in formulas:
+        if f not in seen:
+            seen.add(f)
+            filtered.append(f)
+    return filtered
+
+
+###############################################################################
+# Traversal
+###############################################################################
+# The traversals use an explicit stack instead of recursion, so that 
+# arbitrarily deep formulas can be processed without hitting the recursion limit.
+
+def preorder(root):
+    """Iterate over the nodes of the parse tree in pre-order (children from left to right)."""
+    stack = [root]
+    while stack:
+        f = stack.pop()
+        yield f
+        stack.extend(reversed(f.getChildren()))
+
+def postorder(root):
+    """Iterate over the nodes of the parse tree in post-order (children from left to right)."""
+    stack = [(root, False)]
+    while stack:
+        f, expanded = stack.pop()
+        if expanded:
+            yield f
+        else:
+            stack.append((f, True))
+            stack.extend([(c, False) for c in reversed(f.getChildren())])
+
+def transform(root, fn):
+    """Rebuild the parse tree bottom-up.
+    
+    fn      -- function (node, transformed children) -> transformed node
+    returns -- the transformed root
+    
+    """
+    results = []
+    for f in postorder(root):
+        n = len(f.getChildren())
+        if n:
+            children = results[-n:]
+            del results[-n:]
+        else:
+            children = []
+        results.append(fn(f, children))
+    return results[0]
+
+def _bottomUp(root, cached, fn):
+    """Compute a value of the parse tree bottom-up, the subtrees with a known value are not traversed.
+    
+    cached  -- function node -> its known value (None if not known)
+    fn      -- function (node, values of children) -> value of the node
+    returns -- the value of the root
+    
+    """
+    value = cached(root)
+    if value is not None:
+        return value
+    # the common case, the values of all the children are known
+    values = [cached(c) for c in root.getChildren()]
+    if None not in values:
+        return fn(root, values)
+    results = []
+    stack = [(root, False)]
+    while stack:
+        f, expanded = stack.pop()
+        if expanded:
+            n = len(f.getChildren())
+            if n:
+                children = results[-n:]
+                del results[-n:]
+            else:
+                children = []
+            results.append(fn(f, children))
+            continue
+        value = cached(f)
+        if value is not None:
+            results.append(value)
+        else:
+            stack.append((f, True))
+            stack.extend([(c, False) for c in reversed(f.getChildren())])
+    return results[0]
+
+def _cachedString(f):
+    if isinstance(f, Variable):
+        return f.name
+    return f._str
+
+def _formatStep(f, children):
+    s = f.formatNode(children)
+    if f.is_cnf:
+        f._str = s
+    return s
+
+def formatFormula(root):
+    """Return the string representation of the formula (see Formula.formatNode).
+    
+    The strings of the nodes in CNF are cached (see Formula.sortKey), their subtrees are not traversed.
+    
+    """
+    return _bottomUp(root, _cachedString, _formatStep)
+
+def _cachedHash(f):
+    h = f._hash
+    if h is None and isinstance(f, Variable):
+        h = hash((Variable, f.name))
+        if f.is_cnf:
+            f._hash = h
+    return h
+
+def _hashStep(f, children):
+    # the same as the hash of the key, the hash of a node is the hash of the node in the key tuple
+    h = hash((f.__class__,) + tuple(children))
+    if f.is_cnf:
+        f._hash = h
+    return h
+
+def structuralHash(root):
+    """Return the structural hash of the formula, i.e. hash(root.key()) (cached for the nodes in CNF)."""
+    return _bottomUp(root, _cachedHash, _hashStep)
+
+def structurallyEqual(f, g):
+    """True iff the parse trees of f and g are identical (their keys are equal, see Formula.key)."""
+    stack = [(f, g)]
+    while stack:
+        f, g = stack.pop()
+        if f is g:
+            continue
+        if f.__class__ is not g.__class__:
+            return False
+        if isinstance(f, Variable):
+            if f.name != g.name:
+                return False
+            continue
+        if f._hash is not None and g._hash is not None and f._hash != g._hash:
+            return False
+        children = f.getChildren()
+        other = g.getChildren()
+        if len(children) != len(other):
+            return False
+        stack.extend(zip(children, other))
+    return True
+
+def convertToCNF(root, cache = None):
+    """Convert the formula to CNF using De-Morgan laws.
+    
+    Each node contributes by cnfDependencies (the formulas it needs converted first) 
+    and cnfStep (combines their CNF into its own CNF, or delegates to another formula), 
+    the conversion itself uses an explicit stack of frames 
+    [formula, dependencies, converted, memo key, original formula of the frame].
+    
+    The CNF of the subformulas needed more than once (see sharedSubformulas), e.g. both 
+    sides of an equivalence, which occur in both implications, is memoized in the cache 
+    (see cnfMemoKey), hence they are converted only once for each polarity.
+    
+    cache -- the CNFCache to be used (a private one if None)
+    
+    """
+    if cache is None:
+        cache = CNFCache()
+    shared = sharedSubformulas(root)
+    key = cnfMemoKey(root, shared)
+    result = cache.get(key)
+    if result is not None:
+        return result
+    frames = [(root, root.cnfDependencies(), [], key, root)]
+    while True:
+        f, deps, converted, key, original = frames[-1]
+        if len(converted) < len(deps):
+            dep = deps[len(converted)]
+            if dep.is_cnf:
+                # the CNF of a node in CNF is the node itself
+                converted.append(dep)
+                continue
+            depKey = cnfMemoKey(dep, shared) if shared else None
+            result = cache.get(depKey)
+            if result is not None:
+                converted.append(result)
+            else:
+                frames.append((dep, dep.cnfDependencies(), [], depKey, dep))
+            continue
+        result, done = f.cnfStep(converted)
+        if not done:
+            # tail call, the result of the frame is the CNF of result
+            frames[-1] = (result, result.cnfDependencies(), [], key, original)
+            continue
+        frames.pop()
+        if key is not None:
+            # the negation created for the negative polarity is stored with its child
+            cache.put(key, original.subf if not key[1] else original, result)
+        if not frames:
+            return result
+        frames[-1][2].append(result)
+
+
+###############################################################################
+# Memoization of the conversion to CNF
+###############################################################################
+
+def sharedSubformulas(root):
+    """Return the set of ids of the subformulas whose CNF is needed more than once.
+    
+    Those are the nodes with several parents (the formula is a DAG) and both sides 
+    of the equivalences, which are converted in both polarities. A negation is 
+    memoized with its child (see cnfMemoKey), hence the child of a shared negation 
+    is shared too. The subformulas already in CNF are not traversed.
+    
+    """
+    seen = set()
+    shared = set()
+    def share(f):
+        shared.add(id(f))
+        while isinstance(f, Negation):
+            f = f.subf
+            shared.add(id(f))
+    stack = [root]
+    while stack:
+        f = stack.pop()
+        if id(f) in seen:
+            share(f)
+            continue
+        seen.add(id(f))
+        if f.is_cnf:
+            continue
+        if isinstance(f, Equivalence):
+            share(f.left)
+            share(f.right)
+        stack.extend(f.getChildren())
+    return shared
+
+def cnfMemoKey(f, shared):
+    """Return the key of the CNF of the formula in a CNFCache, None if it is not memoized.
+    
+    The key is the pair (id of the subformula, polarity), a negation stands for 
+    the negative polarity of its child, so that the negations created during 
+    the conversion share the CNF of the original subformulas. Only the subformulas 
+    in shared (see sharedSubformulas) are memoized.
+    
+    """
+    if isinstance(f, Negation):
+        if id(f.subf) in shared and not f.is_cnf and not isinstance(f.subf, Variable):
+            return (id(f.subf), False)
+        return None
+    if id(f) in shared and not f.is_cnf and not isinstance(f, Variable):
+        return (id(f), True)
+    return None
+
+class CNFCache:
+    """Bounded memo of the CNF of the subformulas converted by convertToCNF.
+    
+    The keys contain the identities of the subformulas (see cnfMemoKey), therefore 
+    each entry keeps its subformula alive and the converted formulas must not be modified 
+    in place while the cache is used. When the cache is full, it is cleared (it can 
+    be also cleared explicitly, e.g. between instances).
+    
+    Fields:
+    entries     -- dictionary mapping the keys to the pairs (formula, its CNF)
+    max_entries -- the maximal number of entries
+    hits        -- number of reused CNF
+    misses      -- number of lookups of formulas not converted yet
+    
+    """
+    
+    def __init__(self, max_entries = 1 << 16):
+        self.entries = {}
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Return the memoized CNF for the key, None if not converted yet (or key is None)."""
+        if key is None:
+            return None
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        statistics.cnf_reused += 1
+        return entry[1]
+    
+    def put(self, key, f, cnf):
+        if len(self.entries) >= self.max_entries:
+            self.entries.clear()
+        self.entries[key] = (f, cnf)
+    
+    def clear(self):
+        self.entries = {}
+
+
+###############################################################################
+# Size estimation
+###############################################################################
+
+def cnfSizes(root):
+    """Estimate the size of the CNF (by De-Morgan laws) of all subformulas without building it.
+    
+    The estimates are exact for the conversion without filtering duplicates 
+    (clauses.toClauseSet), hence upper bounds for Formula.toCNF. Distributing 
+    a disjunction over conjunctions multiplies the numbers of clauses.
+    
+    returns -- dictionary mapping id() of each node to the pair of (clauses, literals) 
+               pairs, the first for the node itself, the second for its negation
+    
+    """
+    sizes = {}
+    for f in postorder(root):
+        if id(f) in sizes:
+            continue
+        sub = [sizes[id(c)] for c in f.getChildren()]
+        if isinstance(f, Variable):
+            sizes[id(f)] = ((1, 1), (1, 1))
+        elif isinstance(f, Negation):
+            sizes[id(f)] = (sub[0][1], sub[0][0])
+        elif isinstance(f, Conjunction):
+            sizes[id(f)] = (_sumSizes([s[0] for s in sub]), _productSizes([s[1] for s in sub]))
+        elif isinstance(f, Disjunction):
+            sizes[id(f)] = (_productSizes([s[0] for s in sub]), _sumSizes([s[1] for s in sub]))
+        elif isinstance(f, Implication):
+            p, c = sub
+            sizes[id(f)] = (_productSizes([p[1], c[0]]), _sumSizes([p[0], c[1]]))
+        elif isinstance(f, Equivalence):
+            l, r = sub
+            sizes[id(f)] = (_sumSizes([_productSizes([l[1], r[0]]), _productSizes([l[0], r[1]])]),
+                            _sumSizes([_productSizes([l[0], r[0]]), _productSizes([l[1], r[1]])]))
+    return sizes
+
+def estimateCNFSize(formula):
+    """Return the estimated (clauses, literals) of the CNF of the formula, see cnfSizes."""
+    return cnfSizes(formula)[id(formula)][0]
+
+def _sumSizes(sizes):
+    """Size of the conjunction of CNF formulas of the given sizes."""
+    return (sum(c for (c, l) in sizes), sum(l for (c, l) in sizes))
+
+def _productSizes(sizes):
+    """Size of the disjunction of CNF formulas of the given sizes (distributed into CNF)."""
+    clauses = 1
+    literals = 0
+    for (c, l) in sizes:
+        # each of the c clauses is combined with each of the clauses so far
+        literals = literals * c + l * clauses
+        clauses *= c
+    return (clauses, literals)
+
 
 class Conjunction(Formula):
     """Represents a conjunction in a parse tree of a propositional formula.
@@ -72,33 +563,34 @@ class Conjunction(Formula):
     subf   -- list of sub-formulas in conjunction (childern in the parse tree)
     
     """
+
+    __slots__ = ("subf",)
     
     def __init__(self, subformulas, is_cnf=False):
         Formula.__init__(self, is_cnf)
         self.subf = subformulas    
         
-    def __str__(self):
+    def formatNode(self, children):
         """Convert to string so that elements of the conjunction are in parentheses and separated by '&'."""
-        return "(%s)" % " & ".join([f.__str__() for f in self.subf])
+        return "(%s)" % " & ".join(children)
        
-    def toCNF(self):        
+    def cnfDependencies(self):
         if self.is_cnf:
-            return self
+            return []
+        return self.subf
+
+    def cnfStep(self, converted):        
+        if self.is_cnf:
+            return (self, True)
         clauses = []
-        if all(isinstance(c, Conjunction) for c in self.subf):
-            [clauses.extend(c.toCNF().subf) for c in self.subf]
-        else:
-            for f in [f1.toCNF() for f1 in self.subf]:
-                if isinstance(f, Conjunction):
-                    clauses.extend(f.subf)
-                else:
-                    clauses.append(f)
-        #filter duplicates
-        filtered = []
-        for c in clauses:
-            if not [f for f in filtered if f.equals(c)]:
-                filtered.append(c)
-        return Conjunction(sorted(filtered, key=lambda x: x.__str__()), is_cnf=True)
+        for f in converted:
+            if isinstance(f, Conjunction):
+                clauses.extend(f.subf)
+            else:
+                clauses.append(f)
+        filtered = unique(clauses)
+        statistics.duplicates_filtered += len(clauses) - len(filtered)
+        return (hashcons(Conjunction(sorted(filtered, key=Formula.sortKey), is_cnf=True)), True)
     
     def encodeTseitin(self, newVar, subf):
         return Equivalence(newVar, Conjunction(subf)).toCNF()
@@ -107,13 +599,13 @@ class Conjunction(Formula):
         """ Return the childern of self in the parse tree."""
         return self.subf
     
-    def derivationTree(self):
-        if len(self.subf) < 1:
+    def derivationNode(self, children):
+        if len(children) < 1:
             raise Exception("Too few subformulas in a conjunction")
-        elif len(self.subf) == 1:
-            return self.subf[0].derivationTree()        
+        elif len(children) == 1:
+            return children[0]
         else:
-            return Conjunction([e.derivationTree() for e in self.subf])
+            return Conjunction(children)
         
     def equals(self, f):
         if not isinstance(f, Conjunction):
@@ -121,14 +613,11 @@ class Conjunction(Formula):
         zipped = zip(self.subf, f.subf)
         return all(c1.equals(c2) for (c1, c2) in zipped)
 
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptConjunction(self)
-        for f in self.subf:
-            f.visit(visitor)
 
-    def clone(self):
-        """ Deep clone the parse subtree represetned by self."""
-        return Conjunction([f.clone() for f in self.subf], is_cnf=self.is_cnf)
+    def cloneNode(self, children):
+        return Conjunction(children, is_cnf=self.is_cnf)
 
 
 class Disjunction(Formula):
@@ -139,21 +628,28 @@ class Disjunction(Formula):
     subf   -- list of sub-formulas in disjunction (childern in the parse tree)
     
     """
+
+    __slots__ = ("subf",)
     
     def __init__(self, subformulas=[], is_cnf=False):
         Formula.__init__(self, is_cnf)
         self.subf = subformulas
         
-    def __str__(self):
+    def formatNode(self, children):
         """Convert to string so that elements of the disjunction are in parentheses and separated by '|'."""
-        return "(%s)" % " | ".join([f.__str__() for f in self.subf])
+        return "(%s)" % " | ".join(children)
     
-    def toCNF(self):
+    def cnfDependencies(self):
         if self.is_cnf:
-            return self
+            return []
+        return self.subf
+
+    def cnfStep(self, converted):
+        if self.is_cnf:
+            return (self, True)
         terms = []
         conjunctions = []
-        for f in [f1.toCNF() for f1 in self.subf]:
+        for f in converted:
             if isinstance(f, Disjunction):
                 terms.extend(f.subf)
             elif isinstance(f, Conjunction):
@@ -162,29 +658,24 @@ class Disjunction(Formula):
                 terms.append(f)
             # propagate conjuncitons
         clauses = []
-        for c in conjunctions:
-            rest = [cl for cl in conjunctions if cl != c]
+        for i, c in enumerate(conjunctions):
+            # the other conjunctions (by position, equal conjunctions may be shared)
+            rest = conjunctions[:i] + conjunctions[i + 1:]
             clauses.extend([Disjunction([cl] + terms + rest) for cl in c.subf])
 
         if clauses:
-            cnfClauses = Conjunction(clauses).toCNF().subf
-            #filter duplicates
-            filtered = []
-            for c in cnfClauses:
-                if not [f for f in filtered if f.equals(c)]:
-                    filtered.append(c)
-
-            return Conjunction(sorted(filtered, key=lambda x: x.__str__()), is_cnf=True)
+            # the CNF of the clauses is already without duplicates and sorted
+            return (Conjunction(clauses), False)
         else:
-            return Disjunction(sorted(terms, key=lambda x: x.__str__()), is_cnf=True)
+            return (hashcons(Disjunction(sorted(terms, key=Formula.sortKey), is_cnf=True)), True)
     
-    def derivationTree(self):
-        if len(self.subf) < 2:
+    def derivationNode(self, children):
+        if len(children) < 2:
             raise Exception("To few subformulas in a conjunction") 
-        elif len(self.subf) == 1:
-            return self.subf[0].derivationTree()       
+        elif len(children) == 1:
+            return children[0]
         else:
-            return Disjunction([e.derivationTree() for e in self.subf])
+            return Disjunction(children)
         
     def getChildren(self):
         """ Return the childern of self in the parse tree."""
@@ -199,14 +690,11 @@ class Disjunction(Formula):
         zipped = zip(self.subf, f.subf)
         return all(c1.equals(c2) for (c1, c2) in zipped)
 
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptDisjunction(self)
-        for f in self.subf:
-            f.visit(visitor)
 
-    def clone(self):
-        """ Deep clone the parse subtree represetned by self."""
-        return Disjunction([f.clone() for f in self.subf], is_cnf=self.is_cnf)
+    def cloneNode(self, children):
+        return Disjunction(children, is_cnf=self.is_cnf)
     
 
 class Negation(Formula):
@@ -217,31 +705,45 @@ class Negation(Formula):
     subf   -- a sub-formula to be negated (a child in the parse tree)
     
     """
+
+    __slots__ = ("subf",)
     
     def __init__(self, subformula=None, is_cnf=False):
         Formula.__init__(self, is_cnf)
         self.subf = subformula
         
-    def __str__(self):
+    def formatNode(self, children):
         """Convert to string so that the child is prepended by '!'."""
-        return "!%s" % self.subf.__str__()
+        return "!%s" % children[0]
     
-    def toCNF(self):
+    def cnfDependencies(self):
+        if self.is_cnf or isinstance(self.subf, (Variable, Negation, Disjunction, Conjunction, Implication, Equivalence)):
+            return []
+        return [self.subf]
+
+    def cnfStep(self, converted):
         if self.is_cnf:
-            return self
+            return (self, True)
         if isinstance(self.subf, Variable):
-            return Negation(self.subf.toCNF(), is_cnf=True)
+            return (literal(self.subf.name, False), True)
         if isinstance(self.subf, Negation):
-            return self.subf.subf.toCNF()
+            return (self.subf.subf, False)
         elif isinstance(self.subf, Disjunction):
-            return Conjunction([Negation(f) for f in self.subf.subf]).toCNF()
+            return (Conjunction([Negation(f) for f in self.subf.subf]), False)
         elif isinstance(self.subf, Conjunction):
-            return Disjunction([Negation(f) for f in self.subf.subf]).toCNF()
+            return (Disjunction([Negation(f) for f in self.subf.subf]), False)
+        elif isinstance(self.subf, Implication):
+            # !(p => c) == (p & !c), the negation is pushed inwards instead of negating the CNF
+            return (Conjunction([self.subf.premise, Negation(self.subf.conclusion)]), False)
+        elif isinstance(self.subf, Equivalence):
+            # !(l <=> r) == (l | r) & (!l | !r)
+            l, r = self.subf.left, self.subf.right
+            return (Conjunction([Disjunction([l, r]), Disjunction([Negation(l), Negation(r)])]), False)
         else:
-            return Negation(self.subf.toCNF()).toCNF()
+            return (Negation(converted[0]), False)
         
-    def derivationTree(self):    
-        return Negation(self.subf.derivationTree())
+    def derivationNode(self, children):    
+        return Negation(children[0])
     
     def getChildren(self):
         """ Return the list containing the sole child of self in the parse tree."""
@@ -256,13 +758,11 @@ class Negation(Formula):
             return False
         return self.subf.equals(f.subf)
 
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptNegation(self)
-        self.subf.visit(visitor)
 
-    def clone(self):
-        """ Deep clone the parse subtree represetned by self."""
-        return Negation(self.subf.clone(), is_cnf=self.is_cnf)
+    def cloneNode(self, children):
+        return Negation(children[0], is_cnf=self.is_cnf)
 
 
 class Variable(Formula):
@@ -275,6 +775,8 @@ class Variable(Formula):
     name   -- name of the variable
     
     """
+
+    __slots__ = ("name",)
     
     def __init__(self, name, is_cnf=False):
         Formula.__init__(self, is_cnf)
@@ -283,17 +785,26 @@ class Variable(Formula):
     def __str__(self):
         """Return the variable name."""
         return self.name
+
+    def formatNode(self, children):
+        return self.name
     
-    def toCNF(self):
+    def toCNF(self, cache = None):
         if self.is_cnf:
             return self
-        return Variable(self.name, is_cnf=True)
+        return literal(self.name)
+
+    def cnfStep(self, converted):
+        return (self.toCNF(), True)
     
-    def derivationTree(self):    
+    def derivationNode(self, children):    
         return self.clone()
     
     def getChildren(self):
         return []
+
+    def key(self):
+        return (Variable, self.name)
     
     def encodeTseitin(self, newVar, subf):
         assert False, "encodeTseitin shouldn't be called on variable nodes"   
@@ -303,12 +814,15 @@ class Variable(Formula):
             return False
         return self.name == c.name
     
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptVariable(self)
         
     def clone(self):
         """Clone the variable."""
         return Variable(self.name, is_cnf=self.is_cnf)
+
+    def cloneNode(self, children):
+        return self.clone()
   
 
 class Implication(Formula):
@@ -320,21 +834,23 @@ class Implication(Formula):
     conclusion -- the conclusion (right part) of the implication
     
     """
+
+    __slots__ = ("premise", "conclusion")
     
     def __init__(self, premise, conclusion, is_cnf=False):
         Formula.__init__(self, is_cnf)
         self.premise = premise
         self.conclusion = conclusion
 
-    def __str__(self):
+    def formatNode(self, children):
         """Convert to string in the form (premise => conclusion)."""
-        return "(%s => %s)" % (self.premise.__str__(), self.conclusion.__str__())
+        return "(%s => %s)" % tuple(children)
 
-    def toCNF(self):
-        return Disjunction([Negation(self.premise), self.conclusion]).toCNF()
+    def cnfStep(self, converted):
+        return (Disjunction([Negation(self.premise), self.conclusion]), False)
     
-    def derivationTree(self):    
-        return Implication(self.premise.derivationTree(), self.conclusion.derivationTree())
+    def derivationNode(self, children):    
+        return Implication(children[0], children[1])
     
     def getChildren(self):
         return [self.premise, self.conclusion]
@@ -348,14 +864,11 @@ class Implication(Formula):
             return False
         return self.premise.equals(f.premise) and self.conclusion.equals(f.conclusion)
 
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptImplication(self)
-        self.premise.visit(visitor)
-        self.conclusion.visit(visitor)
 
-    def clone(self):
-        """ Deep clone the parse subtree represetned by self."""
-        return Implication(self.premise.clone(), self.conclusion.clone())
+    def cloneNode(self, children):
+        return Implication(children[0], children[1])
 
 
 class Equivalence(Formula):
@@ -367,21 +880,23 @@ class Equivalence(Formula):
     right  -- the right part of the equivalence
     
     """
+
+    __slots__ = ("left", "right")
     
     def __init__(self, left, right, is_cnf=False):
         Formula.__init__(self, is_cnf)
         self.left = left
         self.right = right
 
-    def __str__(self):
+    def formatNode(self, children):
         """Convert to string in the form (left <=> right)."""
-        return "(%s <=> %s)" % (self.left.__str__(), self.right.__str__())
+        return "(%s <=> %s)" % tuple(children)
 
-    def toCNF(self):
-        return Conjunction([Implication(self.left, self.right), Implication(self.right, self.left)]).toCNF()
+    def cnfStep(self, converted):
+        return (Conjunction([Implication(self.left, self.right), Implication(self.right, self.left)]), False)
     
-    def derivationTree(self):    
-        return Equivalence(self.left.derivationTree(), self.right.derivationTree())
+    def derivationNode(self, children):    
+        return Equivalence(children[0], children[1])
     
     def getChildren(self):
         return [self.left, self.right]
@@ -395,13 +910,10 @@ class Equivalence(Formula):
             return False
         return self.left.equals(f.left) and self.right.equals(f.right)
 
-    def visit(self, visitor):
+    def acceptVisitor(self, visitor):
         visitor.acceptEquivalence(self)
-        self.left.visit(visitor)
-        self.right.visit(visitor)
 
-    def clone(self):
-        """ Deep clone the parse subtree represetned by self."""
-        return Equivalence(self.left.clone(), self.right.clone())
+    def cloneNode(self, children):
+        return Equivalence(children[0], children[1])
 
 
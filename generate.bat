@@ -1,16 +1,11 @@
 @echo off
-set /a i = 30
-set /a n = 3000
 set python = "c:\Runtime_x86\Python\python.exe"
 
-:while 
-if %i% leq 100  (
-	echo *************************
-	echo %n%
-	echo *************************
-        %python% main.py %n% 10 > "out\\%i%.cnf"
-        set /a n = n+100
-        set /a i = i+1
-	goto :while
-)
+rem instances with min_vars = 3000, 3100, ..., 10000 and min_clauses = 10
+rem generated in parallel by a pool of worker processes (one per core);
+rem the number of variables of the resulting CNF is within one percent of min_vars
+rem (the clauses are reached first, their number is not bounded by the tolerance)
+%python% batch.py out --vars 3000:10100:100 --clauses 10 --tolerance 0.01
 
+rem to run the instances through a SAT solver instead (results in a CSV table, see campaign.py):
+rem %python% campaign.py --vars 3000:10100:100 --clauses 10 --tolerance 0.01 -j 4 --solver "minisat -verb=0" --timeout 60 -o results.csv
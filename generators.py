@@ -5,6 +5,8 @@ Module containing factory methods for generating SPL-specific propositional form
 """
 
 from formula import *
+from clauses import SymbolTable, ClauseSet, ClauseTemplate
+from itertools import product
 
 def several_perf_posibilites_unknown_cause(method = "", possibilities = [], cnf = False):
     """Return propositional skeleton of a SPL formula expressing that performance of the 
@@ -79,3 +81,79 @@ def several_perf_posibilites_use_fastest(method = "", possibilities = [], cnf =
     else:
         return ret
 
+
+###############################################################################
+# Direct clause generators
+###############################################################################
+# The following functions create the CNF of the formulas above directly as integer 
+# clauses (clauses.ClauseTemplate), computing the variable ids and clauses by index 
+# arithmetic instead of building and converting the parse trees. The result is the 
+# same (including the numbering of variables and the order of clauses) as 
+# clauses.toTemplate applied on the corresponding formula.
+
+def several_perf_posibilites_unknown_cause_clauses(method = "", possibilities = []):
+    """Return the CNF of several_perf_posibilites_unknown_cause(method, possibilities) as a ClauseTemplate.
+    
+    The variables Pmp1, Pmp2 of the i-th possibility p have the ids 2i+1, 2i+2; 
+    the clauses are all the combinations of choosing one of them for each possibility.
+    
+    """
+    if not possibilities:
+        return
+    assert len(set(possibilities)) == len(possibilities), "possibilities have to be unique"
+    symbols = SymbolTable()
+    for p in possibilities:
+        symbols.getId("P" + method + p + "1")
+        symbols.getId("P" + method + p + "2")
+    cls = ClauseSet()
+    k = len(possibilities)
+    base = [2 * i + 1 for i in xrange(k)]
+    for choices in product((0, 1), repeat=k):
+        cls.add([b + c for (b, c) in zip(base, choices)])
+    return ClauseTemplate(symbols, cls, 1)
+
+def several_perf_posibilites_use_fastest_clauses(method = "", possibilities = []):
+    """Return the CNF of the formulas of several_perf_posibilites_use_fastest(method, possibilities) as a ClauseTemplate.
+    
+    For k possibilities, the i-th possibility p owns the block of ids i*k+1 .. i*k+k: 
+    the variables Pp<r (for r != p, in the order of possibilities) followed by Sp. 
+    The variables Pmp1, Pmp2 have the ids k*k+2i+1, k*k+2i+2.
+    
+    """
+    if not possibilities:
+        return
+    assert len(set(possibilities)) == len(possibilities), "possibilities have to be unique"
+    k = len(possibilities)
+    symbols = SymbolTable()
+    for p in possibilities:
+        for r in possibilities:
+            if r != p:
+                symbols.getId("P" + p + "<" + r)
+        symbols.getId("S" + p)
+    for p in possibilities:
+        symbols.getId("P" + method + p + "1")
+        symbols.getId("P" + method + p + "2")
+    
+    def less(i, j):
+        # id of Pi<j
+        return i * k + 1 + (j if j < i else j - 1)
+    
+    cls = ClauseSet()
+    # Pa<b & Pa<c <=> Sa
+    for i in xrange(k):
+        s = i * k + k
+        lesses = [less(i, j) for j in xrange(k) if j != i]
+        cls.add([-l for l in lesses] + [s])
+        for l in lesses:
+            cls.add([l, -s])
+    # (Pa<b <=> !Pb<a), the clauses for (b, a) are the same as for (a, b)
+    for i in xrange(k):
+        for j in xrange(i + 1, k):
+            cls.add([-less(i, j), -less(j, i)])
+            cls.add([less(i, j), less(j, i)])
+    # (Sa => (Pma1&Pma2))
+    for i in xrange(k):
+        s = i * k + k
+        cls.add([-s, k * k + 2 * i + 1])
+        cls.add([-s, k * k + 2 * i + 2])
+    return ClauseTemplate(symbols, cls, 3)
@@ -2,28 +2,109 @@
 Module for generating a single SPL-specific benchmark formula in the DIMACS format.
 
 Usage:
-main.py min_vars min_clauses [random seed]
+main.py [--backend {formula,int,tseitin}] [-j jobs] [--max-clauses N] [--simplify] [--tolerance T] [-q] [--metrics file] [--profile dir]
+        [--cache dir [--cache-size MB]] [--format {dimacs,binary}] [--compress {none,gz,xz}]
+        [--stream] [--write-queue chunks] [-o output] min_vars min_clauses [random seed]
 
-All information is printed on the sys.stderr output. 
-The formula itself is printed on the standard output.
+All information is printed on the sys.stderr output.
+The formula itself is printed on the standard output (or written in the given output file).
 
 The script proceeds as follows:
-    - random SPL-formula skeleton is generated using the generators module 
+    - random SPL-formula skeleton is generated using the generators module
       (with the required number of variables and clauses)
-    - the formula is converted to CNF using De-Morgan laws 
-      (we prefer equivalent formulas rather than equisatisfiable ones; 
+    - the formula is converted to CNF using De-Morgan laws
+      (we prefer equivalent formulas rather than equisatisfiable ones;
       however, Tseitin's algorighm implementation is available)
     - The CNF formula is converted in the DIMACS format
-    
+
+With "-j jobs", the skeletons are converted to CNF by a pool of worker processes,
+the sorted clauses of the workers are merged, hence the output is the same as of
+the serial conversion (see parallel_to_clauses).
+
+With "--backend int", the formula is converted directly to integer clauses
+(clauses.ClauseSet) without building the CNF parse tree; each skeleton is converted
+only once and its variants are instantiated by offsetting the variable ids.
+The resulting formula is the same up to the numbering of variables (numbered in
+the order of conversion) and the order of clauses.
+
+With "--backend tseitin", the skeletons are encoded to integer clauses by the
+polarity-aware Tseitin's encoding (tseitin.toClauseSet), which is linear in the size
+of the skeletons, but the result is only equisatisfiable (with auxiliary variables).
+
+With "--max-clauses N", the size of the CNF of each skeleton is estimated first
+(formula.cnfSizes) and the subformulas whose CNF would have more than N clauses
+are encoded by the Tseitin's encoding instead of being distributed (clauses.SizeGuard);
+the encoded subformulas are reported on the sys.stderr output.
+
+With "--simplify", tautologies, duplicate literals and subsumed clauses are removed 
+from the resulting CNF (clauses.simplify); the formula stays equivalent.
+
+By default, min_clauses is compared with the number of subformulas of the skeletons 
+(before the conversion to CNF). With "--tolerance T", min_vars and min_clauses are the numbers 
+of variables and clauses of the resulting CNF, counted from the cached CNF of each skeleton 
+while generating; the formula reaches both, but only the size which is reached last 
+(by the variant finishing the formula) is held within T (relative). The other size is 
+reached earlier and keeps growing, it is reported if it exceeds its minimum by more than T, 
+see SizeTarget.
+
+With "--metrics file", the timings of the phases and the counters of the run (formula
+nodes created, duplicate clauses filtered, clauses emitted, ...) are written as JSON
+(see metrics.RunMetrics); "--profile dir" profiles each phase by cProfile and
+"-q" suppresses the diagnostic output, including the dumps of the skeletons.
+
+With "--format binary", the formula is written in the packed binary format (see the binary
+module), which can be memory-mapped. The output is compressed on the fly by gzip or xz
+according to "--compress" or the extension (.gz/.xz) of the output file.
+
+With "--stream", the pipeline is lazy end to end: the variants of the skeletons are generated 
+one by one (iter_variants), each converted to CNF once per skeleton and written out right away 
+with the variables numbered incrementally (stream_formula); only the last max_stream_templates 
+templates of the skeletons are kept, so the memory stays bounded regardless of min_clauses. 
+The header is written last, hence a compressed or non-seekable output (e.g. a pipe) is spooled 
+to a temporary file and gets nothing until the whole formula is generated (the disk space is 
+not bounded). The formula is the same up to the order of clauses and the 
+numbering of variables; the clauses are sorted only within each skeleton, the global sort 
+(the default) needs the whole formula in memory.
+
+With "--write-queue N", the formatted chunks of the output are handed through a queue of at 
+most N chunks to a background thread (dimacs.BackgroundOutput), which writes and compresses them 
+while the formatting (and with "--stream" the conversion) continues. With "--stream" and a compressed 
+or non-seekable output, the thread writes the temporary file, the formula is then copied and compressed 
+by another thread only after it is generated (the compression does not overlap the conversion). The depth of the queue 
+and the time the generator waited for the thread (stalls) are included in the metrics.
+
+With "--cache dir", the seeded instances are stored in the given directory under the hash
+of the parameters and of the source code of the generator (cache.InstanceCache); a cached 
+instance is copied to the output without generating it. "--cache-size MB" bounds the size 
+of the cache, the least recently used instances are evicted.
+
+The module can be also used as a library, see generate_formula and write_dimacs:
+
+    clauses, symbols = generate_formula(3000, 10, rng=Random(42))
+    write_dimacs(clauses, symbols, sys.stdout)
+
 @author: Keznikl
 """
 
-from random import seed, randint, choice, random
-from formula import Conjunction, Visitor
+from random import Random
+from formula import Conjunction, Disjunction, Negation, Visitor, estimateCNFSize
 from generators import several_perf_posibilites_unknown_cause, several_perf_posibilites_use_fastest
-from dimacs import DimacsFormatVisitor
+from generators import several_perf_posibilites_unknown_cause_clauses, several_perf_posibilites_use_fastest_clauses
+from dimacs import DimacsWriter
+from metrics import RunMetrics
+from cache import InstanceCache, readCounts
+from dimacs import compressionOf, checkCompression, compressedOutput, BackgroundOutput
+from binary import writeBinary
+from clauses import SymbolTable, ClauseSet, ClauseTemplate, TemplateCache, toClauseSet, fromCNF, simplify
+from multiprocessing import Pool
+import tseitin
+import tempfile
+import shutil
+import heapq
+import os
 import sys
-import datetime 
+import datetime
+import argparse
 
 
 
@@ -49,38 +130,27 @@ prob_of_unknown_cause_subformula = 0.3
 #maximum number of variants on which the main function might depend
 max_perf_param_variants= 5
 
+#maximum number of skeleton templates kept in memory while streaming (see iter_variants)
+max_stream_templates = 64
 
-#parse the cmd line args
-if len(sys.argv) >= 3:    
-    min_vars = int(sys.argv[1])
-    min_clauses = int(sys.argv[2])
-    print >> sys.stderr, "min_vars: " + str(min_vars)
-    print >> sys.stderr, "min_clauses: " + str(min_clauses)
-    
-if len(sys.argv) >= 4:
-    print >> sys.stderr, "setting seed to " + sys.argv[3]
-    seed(int(sys.argv[3]))
-else:
-    seed()
-    
 
 
 ###############################################################################
 # Helper code
 ###############################################################################
 
-def random_sublist(list = [], min_length = 1, max_length = None):
-    """Select a random sublist of the given list within the given bounds."""
-    
+def random_sublist(rng, list = [], min_length = 1, max_length = None):
+    """Select a random sublist of the given list within the given bounds using the random generator rng."""
+
     if not list:
         return []
 
     if max_length is None:
         max_length = len(list)
-    length = randint(min(min_length, len(list)), min(max_length, len(list)))
+    length = rng.randint(min(min_length, len(list)), min(max_length, len(list)))
     selected = []
     while len(selected) < min(length, len(list)):
-        rnd = choice(list)
+        rnd = rng.choice(list)
         if rnd not in selected:
             selected.append(rnd)
             list = [i for i in list if i!=rnd]
@@ -88,132 +158,877 @@ def random_sublist(list = [], min_length = 1, max_length = None):
 
 class RenameVisitor(Visitor):
     """Formula visitor that renames all variables in the formula with the given unique rpefix.
-    
+
+    The renamed variables are numbered in the order of the visit by a symbol table,
+    which may be shared by several visitors (and reused for the whole instance).
+
     Fields:
     unique_prefix -- the prefix that is added to all variable names in the formula
-    vars          -- the list of renamed variables in the formula (should contain all variables at the end)
-    
+    symbols       -- the clauses.SymbolTable numbering the renamed variables
+    first_id      -- the id of the first variable renamed with the current prefix
+
     """
-    def __init__(self, unique_prefix):
+    def __init__(self, unique_prefix, symbols = None):
+        if symbols is None:
+            symbols = SymbolTable()
+        self.symbols = symbols
+        self.setPrefix(unique_prefix)
+
+    def setPrefix(self, unique_prefix):
+        """Start renaming with a new unique prefix (numVars then counts only the newly renamed variables)."""
         self.unique_prefix  = unique_prefix
-        self.vars = []
-        
+        self.first_id = self.symbols.numVars() + 1
+
     def acceptVariable(self, f):
-        f.name = self.unique_prefix + f.name
-        if not f.name in self.vars:
-            self.vars.append(f.name)
-    
+        # all occurrences of the variable share the name stored in the symbol table
+        symbols = self.symbols
+        f.name = symbols.getName(symbols.getId(self.unique_prefix + f.name))
+
     def numVars(self):
-        return len(self.vars)
+        """Number of distinct variables renamed with the current prefix."""
+        return self.symbols.numVars() + 1 - self.first_id
+
+
+
+class SizeTarget:
+    """The required size of the generated formula, tracked while the variants of skeletons are added.
 
+    Without a tolerance, the sizes are just lower bounds (the callers count the clauses 
+    before the conversion to CNF). With a tolerance, the sizes are the numbers of variables 
+    and clauses of the resulting CNF (counted by the clauses.ClauseTemplate of each skeleton) 
+    and a variant which would finish the formula is accepted only if no size reached by it 
+    exceeds the required one by more than the tolerance. After max_attempts rejected variants 
+    in a row, the target is given up and the next variant is accepted. A negative tolerance 
+    could never be hit, an Exception is raised for it.
+
+    Only the size reached by the finishing variant is bounded; a size reached by an earlier 
+    variant is not limited afterwards and may exceed the required one by more than the 
+    tolerance (see overshoots), e.g. the number of variables with a small min_clauses.
+
+    Fields:
+    num_vars     -- the required number of variables
+    num_clauses  -- the required number of clauses
+    tolerance    -- the allowed relative overshoot (None for lower bounds only)
+    max_attempts -- the number of rejected variants in a row before the target is given up
+    cur_vars     -- the current number of variables
+    cur_clauses  -- the current number of clauses
+    rejected     -- the total number of rejected variants
+    given_up     -- True iff the target could not be hit within the tolerance
+
+    """
+    def __init__(self, num_vars, num_clauses, tolerance = None, max_attempts = 1000):
+        if tolerance is not None and tolerance < 0:
+            raise Exception("The tolerance has to be non-negative: %g" % tolerance)
+        self.num_vars = num_vars
+        self.num_clauses = num_clauses
+        self.tolerance = tolerance
+        self.max_attempts = max_attempts
+        self.cur_vars = 0
+        self.cur_clauses = 0
+        self.rejected = 0
+        self.given_up = False
+        self._attempts = 0
+
+    def reached(self):
+        return self.cur_vars >= self.num_vars and self.cur_clauses >= self.num_clauses
+
+    def accepts(self, num_vars, num_clauses):
+        """True iff a variant with the given size may be added (counts the rejected variants)."""
+        if self.tolerance is None or self.given_up:
+            return True
+        new_vars = self.cur_vars + num_vars
+        new_clauses = self.cur_clauses + num_clauses
+        if new_vars < self.num_vars or new_clauses < self.num_clauses:
+            # the formula is not finished by the variant
+            return True
+        if ((self.cur_vars >= self.num_vars or new_vars <= self.num_vars * (1 + self.tolerance)) and
+            (self.cur_clauses >= self.num_clauses or new_clauses <= self.num_clauses * (1 + self.tolerance))):
+            return True
+        self.rejected += 1
+        self._attempts += 1
+        if self._attempts >= self.max_attempts:
+            self.given_up = True
+        return False
+
+    def add(self, num_vars, num_clauses):
+        self.cur_vars += num_vars
+        self.cur_clauses += num_clauses
+        self._attempts = 0
+
+    def finished(self):
+        """True iff no more variants should be added (with a tolerance, right after the size is reached)."""
+        return self.tolerance is not None and self.reached()
+
+    def overshoots(self):
+        """Return the names ("vars", "clauses") of the current sizes exceeding the required ones by more than the tolerance."""
+        if self.tolerance is None:
+            return []
+        names = []
+        if self.cur_vars > self.num_vars * (1 + self.tolerance):
+            names.append("vars")
+        if self.cur_clauses > self.num_clauses * (1 + self.tolerance):
+            names.append("clauses")
+        return names
 
 
 ###############################################################################
-# Generator Script
+# Generator API
 ###############################################################################
 
+def random_skeletons(rng, max_variants = None):
+    """Infinite generator of random choices of SPL-formula skeletons.
 
-#current number of generated clauses
-cur_clauses = 0
-#current number of generated variables
-cur_vars = 0
+    rng          -- the random.Random instance used for all random choices
+    max_variants -- maximum number of variants of perf. params (max_perf_param_variants if None)
 
-print >> sys.stderr, """
-=====================================
-GENERATING FORMULAS:
-=====================================
-"""
-total = []
-iteration = 1;
+    yields       -- tuples (generator, method, params, param_variants), see build_skeleton
+
+    """
+    if max_variants is None:
+        max_variants = max_perf_param_variants
+    while True:
+        m = rng.choice(methods)
+        params = random_sublist(rng, parameters, 2)
+
+        use_unknown_cause = rng.random() < prob_of_unknown_cause_subformula
+
+        if use_unknown_cause:
+            generator = several_perf_posibilites_unknown_cause
+        else:
+            generator = several_perf_posibilites_use_fastest
+
+        # several iterations correspond to perf. parameter variants n = {10, 100, ...}
+        param_variants = rng.randint(1, max_variants)
+        yield (generator, m, params, param_variants)
+
+# direct clause generators (producing the same CNF as clauses.toTemplate on the skeleton)
+clause_generators = {
+    several_perf_posibilites_unknown_cause: several_perf_posibilites_unknown_cause_clauses,
+    several_perf_posibilites_use_fastest: several_perf_posibilites_use_fastest_clauses
+}
+
+def build_skeleton(generator, method, params):
+    """Return the skeleton (a conjunction) created by the given generator."""
+    if generator is several_perf_posibilites_unknown_cause:
+        return Conjunction([generator(method, params, False)])
+    else:
+        return Conjunction(generator(method, params, False))
+
+def build_template(generator, method, params, backend = "int", max_clauses = None, report = None):
+    """Return the clauses.ClauseTemplate of the skeleton created by the given generator.
+
+    backend     -- "int" for the CNF by De-Morgan laws (see clause_generators), 
+                   "formula" for the same CNF via the parse tree (Formula.toCNF, the clauses sorted),
+                   "tseitin" for the polarity-aware Tseitin's encoding (tseitin.toClauseSet)
+    max_clauses -- for "int", the subformulas with larger CNF are encoded by Tseitin's encoding (see clauses.SizeGuard)
+    report      -- list extended by the (subformula, estimated clauses) pairs of the encoded subformulas
+
+    """
+    if backend == "tseitin":
+        skeleton = build_skeleton(generator, method, params)
+        symbols = SymbolTable()
+        # number the variables of the skeleton before the auxiliary ones
+        skeleton.visit(RenameVisitor("", symbols))
+        num_formula_vars = symbols.numVars()
+        clauses = tseitin.toClauseSet(skeleton, symbols)
+        return ClauseTemplate(symbols, clauses, len(skeleton.subf), num_formula_vars)
+    if backend == "formula":
+        skeleton = build_skeleton(generator, method, params)
+        if max_clauses is None or estimateCNFSize(skeleton)[0] <= max_clauses:
+            symbols = SymbolTable()
+            clauses = fromCNF(skeleton.toCNF().subf, symbols)
+            return ClauseTemplate(symbols, clauses, len(skeleton.subf))
+    if max_clauses is not None:
+        skeleton = build_skeleton(generator, method, params)
+        if estimateCNFSize(skeleton)[0] > max_clauses:
+            symbols = SymbolTable()
+            skeleton.visit(RenameVisitor("", symbols))
+            num_formula_vars = symbols.numVars()
+            clauses = toClauseSet(skeleton, symbols, None, max_clauses, report)
+            return ClauseTemplate(symbols, clauses, len(skeleton.subf), num_formula_vars)
+    return clause_generators[generator](method, params)
+
+def generate_skeletons(min_vars, min_clauses, rng, max_variants = None, log = None, symbols = None,
+                       tolerance = None, templates = None, max_clauses = None):
+    """Generate the renamed SPL-formula skeletons with the required number of variables and clauses.
+
+    Keyword arguments:
+    min_vars     -- minimum number of variables generated
+    min_clauses  -- minimum number of clauses generated (counted before the conversion to CNF)
+    rng          -- the random.Random instance used for all random choices
+    max_variants -- maximum number of variants of perf. params (max_perf_param_variants if None)
+    log          -- file for the diagnostic output (no output if None)
+    symbols      -- clauses.SymbolTable numbering the variables while renaming (a private one if None)
+    tolerance    -- if given, min_vars and min_clauses are the sizes of the resulting CNF 
+                    to be hit within the tolerance (see SizeTarget)
+    templates    -- the clauses.TemplateCache of the "int" templates used for counting the 
+                    clauses of the CNF with tolerance (a new one if None)
+    max_clauses  -- the threshold of the fallback to Tseitin's encoding used for the conversion 
+                    (see skeletons_to_clauses), needed for counting the clauses with tolerance
+
+    returns      -- the list of skeletons (conjunctions), each with unique variable names
+
+    """
+    if templates is None and tolerance is not None:
+        templates = TemplateCache()
+    target = SizeTarget(min_vars, min_clauses, tolerance)
+
+    total = []
+    iteration = 1
+
+    visitor = RenameVisitor("", symbols)
+
+    skeletons = random_skeletons(rng, max_variants)
+    while not target.reached():
+        generator, m, params, param_variants = skeletons.next()
+        current = build_skeleton(generator, m, params)
+        if tolerance is not None:
+            template = templates.get(("int", max_clauses, generator.__name__, m, tuple(params)),
+                                     lambda: build_template(generator, m, params, "int", max_clauses))
+
+        if log:
+            print >> log, "\n".join([f.__str__() for f in current.subf])
+
+        if log:
+            print >> log, "generating %d variants of perf. params" % param_variants
+        for variant in xrange(param_variants):
+            if tolerance is not None and not target.accepts(template.numVars(), template.numClauses()):
+                break
+            clone = current.clone()
+
+            prefix = "%d_%d" % (iteration, variant)
+            visitor.setPrefix(prefix)
+            clone.visit(visitor)
+
+
+            total.append(clone)
+            if tolerance is not None:
+                target.add(template.numVars(), template.numClauses())
+            else:
+                target.add(visitor.numVars(), len(clone.subf))
+            if target.finished():
+                break
+
+        iteration+=1
+
+    _log_target(target, log)
+    return total
+
+def iter_variants(min_vars, min_clauses, rng, max_variants = None, log = None, templates = None, backend = "int",
+                  max_clauses = None, tolerance = None):
+    """Lazily generate the variants of the skeletons as clauses.ClauseTemplate instances.
+
+    The skeletons are chosen and counted the same way as by generate_clauses, but nothing
+    is instantiated; each variant is yielded as soon as it is chosen.
+
+    Keyword arguments:
+    templates   -- the clauses.TemplateCache to be used (a new one keeping at most 
+                   max_stream_templates templates if None, so that the memory is bounded)
+    backend     -- "int", "formula" or "tseitin", see build_template
+    other       -- see generate_clauses
+
+    yields      -- the pairs (template, unique prefix of the variant)
+
+    """
+    if templates is None:
+        templates = TemplateCache(max_stream_templates)
+
+    target = SizeTarget(min_vars, min_clauses, tolerance)
+
+    iteration = 1
+
+    skeletons = random_skeletons(rng, max_variants)
+    while not target.reached():
+        generator, m, params, param_variants = skeletons.next()
+        report = []
+        template = templates.get((backend, max_clauses, generator.__name__, m, tuple(params)),
+                                 lambda: build_template(generator, m, params, backend, max_clauses, report))
+
+        if log:
+            _log_guard_report(report, log)
+            print >> log, "%s(%s, %s): %d vars, %d clauses, %d variants" % (generator.__name__, m, ", ".join(params),
+                template.numVars(), template.numClauses(), param_variants)
 
-start = datetime.datetime.now()
-totalTime = datetime.timedelta(0)
+        for variant in xrange(param_variants):
+            if tolerance is not None and not target.accepts(template.numVars(), template.numClauses()):
+                break
+            yield (template, "%d_%d" % (iteration, variant))
+            if tolerance is not None:
+                target.add(template.numVars(), template.numClauses())
+            else:
+                target.add(template.numFormulaVars(), template.num_subformulas)
+            if target.finished():
+                break
 
-while cur_clauses < min_clauses or cur_vars < min_vars:
-    m = choice(methods)    
-    params = random_sublist(parameters, 2)
+        iteration += 1
 
-    use_unknown_cause = random() < prob_of_unknown_cause_subformula
-        
-    if use_unknown_cause:        
-        current = Conjunction([several_perf_posibilites_unknown_cause(m, params, False)])
-    else:        
-        current = Conjunction(several_perf_posibilites_use_fastest(m, params, False))
+    _log_target(target, log)
 
-    print >> sys.stderr, "\n".join([f.__str__() for f in current.subf])
+def generate_clauses(min_vars, min_clauses, rng, max_variants = None, log = None, templates = None, backend = "int",
+                     max_clauses = None, tolerance = None):
+    """Generate the same formula as generate_skeletons, directly as integer clauses.
 
-    cnf = current #toCNF(current)
+    Each skeleton is converted to CNF only once (clauses.ClauseTemplate, see build_template)
+    and its variants are created by offsetting the variable ids. The result is the same as
+    the result of skeletons_to_clauses(generate_skeletons(...), backend) (up to the naming
+    and numbering of the auxiliary variables for "tseitin").
 
-    # several iterations correspond to perf. parameter variants n = {10, 100, ...}
-    param_variants = randint(1, max_perf_param_variants)
-    print >> sys.stderr, "generating %d variants of perf. params" % param_variants 
-    for variant in xrange(param_variants):
-        clone = cnf.clone()
+    Keyword arguments:
+    templates   -- the clauses.TemplateCache to be used (may be shared by several calls; a new one if None)
+    backend     -- "int" or "tseitin", see build_template
+    max_clauses -- threshold of the fallback to Tseitin's encoding, see build_template
+    tolerance   -- if given, min_vars and min_clauses are the sizes of the resulting CNF (including 
+                   the auxiliary variables) to be hit within the tolerance (see SizeTarget)
+    other       -- see generate_skeletons
 
-        prefix = "%d_%d" % (iteration, variant)
-        visitor = RenameVisitor(prefix)    
-        clone.visit(visitor)
-        
+    returns     -- the pair (clauses.ClauseSet, clauses.SymbolTable)
 
-        total.append(clone)
-        cur_clauses += len(clone.subf)
-        cur_vars += visitor.numVars()
+    """
+    symbols = SymbolTable()
+    clauses = ClauseSet()
+    for template, prefix in iter_variants(min_vars, min_clauses, rng, max_variants, log, templates, backend,
+                                          max_clauses, tolerance):
+        template.instantiate(prefix, symbols, clauses)
+    return (clauses, symbols)
+
+def stream_dimacs(variants, out):
+    """Write the variants (see iter_variants) in the DIMACS format as they are generated.
+
+    The variables of each variant are numbered right after the previous variant (no symbol
+    table is kept), so the memory does not grow with the size of the formula. The header 
+    is reserved and filled in at the end (dimacs.DimacsWriter.reserveHeader), hence out 
+    has to be seekable.
+
+    returns -- the pair (number of variables, number of clauses)
+
+    """
+    writer = DimacsWriter(out)
+    writer.reserveHeader()
+    num_vars = 0
+    for template, prefix in variants:
+        block = ClauseSet()
+        block.extendShifted(template.clauses, num_vars)
+        for cl in block:
+            writer.writeClause(cl)
+        num_vars += template.numVars()
+    writer.close(num_vars)
+    return (num_vars, writer.num_clauses)
+
+def stream_formula(variants, out, compression = None, write_queue = None, writer_stats = None):
+    """Stream the variants to the file-like object out (see stream_dimacs).
+
+    A compressed or non-seekable output (e.g. a pipe) gets the formula through a temporary 
+    file, as its header can be written only after all the clauses. With write_queue, both 
+    the spooling and the copying to the output (with the compression) are done by background 
+    threads, but the compression can start only when the whole formula is generated.
+
+    write_queue, writer_stats -- the background writing of the clauses, see write_formula; 
+                                 the statistics of the spooling are under the key "spool"
+
+    """
+    stream = compressedOutput(out, compression)
+    if stream is out and _seekable(out):
+        background = background_output(out, write_queue)
+        counts = stream_dimacs(variants, background)
+        close_background_output(background, out, writer_stats)
+        return counts
+    spool = tempfile.TemporaryFile()
+    try:
+        background = background_output(spool, write_queue)
+        counts = stream_dimacs(variants, background)
+        spool_stats = {}
+        close_background_output(background, spool, spool_stats)
+        spool.seek(0)
+        background = background_output(stream, write_queue)
+        shutil.copyfileobj(spool, background, 1 << 16)
+        close_background_output(background, stream, writer_stats)
+        if writer_stats is not None and spool_stats:
+            writer_stats["spool"] = spool_stats
+    finally:
+        spool.close()
+    if stream is not out:
+        stream.close()
+    return counts
+
+def _seekable(f):
+    try:
+        f.seek(0, os.SEEK_CUR)
+        return True
+    except (IOError, AttributeError):
+        return False
+
+def _clause_literals(clause):
+    """Return the literals of the CNF clause as (variable name, positive) pairs."""
+    literals = clause.subf if isinstance(clause, Disjunction) else [clause]
+    return [(l.subf.name, False) if isinstance(l, Negation) else (l.name, True) for l in literals]
+
+def _convert_chunk(skeletons):
+    """Convert a chunk of skeletons to CNF in a worker process (see parallel_to_clauses).
+
+    returns -- the list of (sort key, literals) of the sorted clauses of the CNF, see _clause_literals
+
+    """
+    return [(cl.sortKey(), _clause_literals(cl)) for cl in Conjunction(skeletons).toCNF().subf]
+
+def parallel_to_clauses(skeletons, jobs, symbols, clauses, chunks_per_job = 4):
+    """Convert the skeletons to CNF (Formula.toCNF) by a pool of jobs worker processes.
+
+    The skeletons are split into chunks converted independently, the sorted clauses of 
+    the chunks are merged (and the duplicates among the chunks filtered), hence the result 
+    is the same as the result of the serial conversion of Conjunction(skeletons).
+
+    symbols -- the clauses.SymbolTable numbering the variables in the order of the sorted clauses
+    clauses -- the clauses.ClauseSet to be extended
+
+    """
+    num_chunks = max(1, min(len(skeletons), jobs * chunks_per_job))
+    chunks = [skeletons[i::num_chunks] for i in xrange(num_chunks)]
+    pool = Pool(jobs)
+    try:
+        converted = pool.map(_convert_chunk, chunks)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    previous = None
+    for key, literals in heapq.merge(*converted):
+        if key == previous:
+            continue
+        previous = key
+        clauses.add([symbols.getId(name) if positive else -symbols.getId(name) for (name, positive) in literals])
+
+def skeletons_to_clauses(skeletons, backend = "formula", symbols = None, max_clauses = None, report = None, jobs = None):
+    """Convert the skeletons to CNF.
+
+    backend     -- "formula" for the conversion via parse trees (Formula.toCNF),
+                   "int" for the direct conversion to integer clauses,
+                   "tseitin" for the polarity-aware Tseitin's encoding (equisatisfiable only)
+    symbols     -- the clauses.SymbolTable for the "int" and "tseitin" backends; may already 
+                   number the variables (e.g. filled by generate_skeletons) 
+    max_clauses -- if given, the subformulas whose CNF would have more clauses are encoded 
+                   by Tseitin's encoding (clauses.SizeGuard); for "formula", the skeletons 
+                   containing such subformulas are converted directly to integer clauses
+    report      -- list extended by the (subformula, estimated clauses) pairs of the encoded subformulas
+    jobs        -- for "formula", the number of worker processes converting the skeletons 
+                   (see parallel_to_clauses; serial conversion if None or 1)
+    returns     -- the pair (clauses.ClauseSet, clauses.SymbolTable)
+
+    """
+    clauses = ClauseSet()
+    if symbols is None or backend == "formula":
+        symbols = SymbolTable()
+    if backend == "int":
+        for f in skeletons:
+            toClauseSet(f, symbols, clauses, max_clauses, report)
+    elif backend == "tseitin":
+        for i, f in enumerate(skeletons):
+            tseitin.toClauseSet(f, symbols, clauses, "_t%d_" % i)
+    else:
+        large = []
+        if max_clauses is not None:
+            sizes = [(f, estimateCNFSize(f)[0]) for f in skeletons]
+            large = [f for (f, size) in sizes if size > max_clauses]
+            skeletons = [f for (f, size) in sizes if size <= max_clauses]
+        # variables are numbered in the order of the sorted clauses as in dimacs.DimacsFormatVisitor
+        if jobs and jobs > 1:
+            parallel_to_clauses(skeletons, jobs, symbols, clauses)
+        else:
+            fromCNF(Conjunction(skeletons).toCNF().subf, symbols, clauses)
+        for f in large:
+            toClauseSet(f, symbols, clauses, max_clauses, report)
+    return (clauses, symbols)
+
+def generate_formula(min_vars = min_vars, min_clauses = min_clauses, seed = None, rng = None, backend = "formula", templates = None,
+                     max_clauses = None, tolerance = None, jobs = None):
+    """Generate a single SPL-specific benchmark formula in CNF.
+
+    Keyword arguments:
+    min_vars    -- minimum number of variables generated
+    min_clauses -- minimum number of clauses generated
+    seed        -- seed of a new random generator (ignored if rng is given)
+    rng         -- the random.Random instance to be used
+    backend     -- see skeletons_to_clauses
+    templates   -- the clauses.TemplateCache used by the "int" and "tseitin" backends (see generate_clauses)
+    max_clauses -- threshold of the fallback to Tseitin's encoding (see skeletons_to_clauses)
+    tolerance   -- if given, the formula has at least min_vars variables and min_clauses clauses, 
+                   the size reached last within the tolerance (see SizeTarget)
+    jobs        -- number of worker processes of the "formula" backend (see skeletons_to_clauses)
+
+    returns     -- the pair (clauses.ClauseSet, clauses.SymbolTable)
+
+    """
+    if rng is None:
+        rng = Random(seed)
+    if backend != "formula":
+        return generate_clauses(min_vars, min_clauses, rng, templates=templates, backend=backend, max_clauses=max_clauses,
+                                tolerance=tolerance)
+    skeletons = generate_skeletons(min_vars, min_clauses, rng, tolerance=tolerance, templates=templates, max_clauses=max_clauses)
+    return skeletons_to_clauses(skeletons, backend, max_clauses=max_clauses, jobs=jobs)
+
+def _log_guard_report(report, log):
+    for f, size in report:
+        print >> log, "estimated %d clauses, using Tseitin's encoding for: %s" % (size, f)
+
+def _log_target(target, log):
+    if log and target.tolerance is not None:
+        print >> log, "size: %d vars, %d clauses (%d variants rejected)" % (target.cur_vars, target.cur_clauses, target.rejected)
+        if target.given_up:
+            print >> log, "WARNING: the size could not be hit within the tolerance %g" % target.tolerance
+        for name in target.overshoots():
+            required = target.num_vars if name == "vars" else target.num_clauses
+            print >> log, "WARNING: %s exceed the required %d by more than the tolerance %g (reached before the other size)" % (
+                name, required, target.tolerance)
+
+def write_dimacs(clauses, symbols, out):
+    """Write the clauses (clauses.ClauseSet) in the DIMACS format to the file-like object out."""
+    writer = DimacsWriter(out)
+    writer.writeHeader(symbols.numVars(), len(clauses))
+    for cl in clauses:
+        writer.writeClause(cl)
+    writer.close()
+
+def write_formula(clauses, symbols, out, format = "dimacs", compression = None, write_queue = None, writer_stats = None):
+    """Write the clauses (clauses.ClauseSet) to the file-like object out.
+
+    format       -- "dimacs" or "binary" (the packed binary format, see the binary module)
+    compression  -- "gz", "xz" or None, the output is compressed while it is written
+    write_queue  -- if given, the formatted chunks are written (and compressed) by a background 
+                    thread through a queue of at most write_queue chunks (see background_output)
+    writer_stats -- dictionary updated with the queue statistics of the background thread
+
+    """
+    stream = compressedOutput(out, compression)
+    background = background_output(stream, write_queue)
+    if format == "binary":
+        writeBinary(clauses, symbols.numVars(), background)
+    else:
+        write_dimacs(clauses, symbols, background)
+    close_background_output(background, stream, writer_stats)
+    if stream is not out:
+        stream.close()
 
-    iteration+=1
+def background_output(out, write_queue = None):
+    """Return a dimacs.BackgroundOutput writing to out by a thread (out itself if write_queue is None)."""
+    if write_queue is None:
+        return out
+    return BackgroundOutput(out, write_queue)
 
-end = datetime.datetime.now()
+def close_background_output(background, out, writer_stats = None):
+    """Wait for the background thread writing to out (see background_output), collect its statistics."""
+    if background is out:
+        return
+    background.close()
+    if writer_stats is not None:
+        writer_stats.update(background.stats())
 
-print >> sys.stderr, """DONE
+def _write_output(write, output, cache = None, key = None):
+    """Call write(f) on the output file (the standard output if None), return its result.
+
+    If key is given, the instance is written to the cache first and then copied to the output.
+
+    """
+    out = open(output, "wb") if output else sys.stdout
+    if key is not None:
+        temp_path = cache.tempPath(key)
+        try:
+            with open(temp_path, "wb") as f:
+                result = write(f)
+        except:
+            # no partial instance is left in the cache
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        cache.copyTo(temp_path, out)
+        cache.store(key, temp_path)
+    else:
+        result = write(out)
+    if output:
+        out.close()
+    return result
+
+
+###############################################################################
+# Generator Script
+###############################################################################
+
+def run(min_vars = min_vars, min_clauses = min_clauses, random_seed = None, backend = "formula", output = None, max_clauses = None,
+        simplify_clauses = False, metrics = None, quiet = False, tolerance = None, cache = None,
+        format = "dimacs", compression = None, jobs = None, stream = False, write_queue = None):
+    """Generate a single formula and write it in the DIMACS format, print diagnostics on sys.stderr.
+
+    Keyword arguments:
+    min_vars         -- minimum number of variables generated
+    min_clauses      -- minimum number of clauses generated
+    random_seed      -- seed of the random generator (system time/randomness if None)
+    backend          -- "formula" for CNF conversion via parse trees, "int" for integer clauses,
+                        "tseitin" for the polarity-aware Tseitin's encoding
+    output           -- name of the output file (the standard output if None)
+    max_clauses      -- threshold of the fallback to Tseitin's encoding (see skeletons_to_clauses)
+    simplify_clauses -- remove tautologies, duplicate literals and subsumed clauses (see clauses.simplify)
+    metrics          -- the metrics.RunMetrics collecting the phases ("generate", "cnf", "dimacs") 
+                        and the counters of the run (a private one if None)
+    quiet            -- no diagnostics on sys.stderr, the formulas are not converted to strings at all
+    tolerance        -- if given, the formula has at least min_vars variables and min_clauses clauses, 
+                        the size reached last within the tolerance (see SizeTarget)
+    cache            -- the cache.InstanceCache of the generated instances; used only for seeded 
+                        runs, a cached instance is copied to the output without generating it
+    format           -- the output format, "dimacs" or "binary" (see write_formula)
+    compression      -- the compression of the output, "gz", "xz" or None (see write_formula)
+    jobs             -- number of worker processes converting the skeletons to CNF for the "formula" 
+                        backend (see parallel_to_clauses; the result is the same as of the serial conversion)
+    stream           -- generate, convert and write the variants of the skeletons one by one (see iter_variants 
+                        and stream_formula) in a single phase "stream"; the memory is bounded regardless of the size 
+                        of the formula, but the clauses are not sorted globally and the variables are numbered 
+                        variant by variant (DIMACS only, without simplification); a compressed or non-seekable 
+                        output is spooled to a temporary file first
+    write_queue      -- if given, the output is formatted while a background thread writes (and compresses) 
+                        it through a queue of at most write_queue chunks, see write_formula; the queue depth 
+                        and stall statistics are collected as the "writer" counter of the metrics
+
+    returns          -- the pair (number of variables, number of clauses) of the generated formula
+
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    log = None if quiet else sys.stderr
+    metrics.set("min_vars", min_vars)
+    metrics.set("min_clauses", min_clauses)
+    metrics.set("seed", random_seed)
+    metrics.set("backend", backend)
+    if stream and (format != "dimacs" or simplify_clauses):
+        raise Exception("Streaming supports only the DIMACS format without simplification")
+    # fails before the output file is opened
+    checkCompression(compression)
+
+    if random_seed is not None and log:
+        print >> log, "setting seed to " + str(random_seed)
+    rng = Random(random_seed)
+
+    key = None
+    if cache is not None and random_seed is not None:
+        key = cache.key(min_vars=min_vars, min_clauses=min_clauses, seed=random_seed, backend=backend, 
+                        max_clauses=max_clauses, simplify=simplify_clauses, tolerance=tolerance,
+                        format=format, compression=compression, stream=stream,
+                        settings=[parameters, methods, prob_of_unknown_cause_subformula, max_perf_param_variants])
+        path = cache.lookup(key)
+        metrics.set("cache", "hit" if path else "miss")
+        if path:
+            metrics.startPhase("cache")
+            out = open(output, "wb") if output else sys.stdout
+            cache.copyTo(path, out)
+            if output:
+                out.close()
+            num_vars, num_clauses = readCounts(path, format, compression)
+            phase = metrics.endPhase()
+            metrics.set("vars", num_vars)
+            metrics.set("clauses", num_clauses)
+            if log:
+                print >> log, "cached instance %s: %d vars, %d clauses" % (path, num_vars, num_clauses)
+                print >> log, "Completed in ", datetime.timedelta(seconds=phase["seconds"])
+            return (num_vars, num_clauses)
+
+    if stream:
+        if log:
+            print >> log, """
+=====================================
+GENERATING AND WRITING FORMULAS:
 =====================================
 """
-print >> sys.stderr, "Completed in ", end - start
-totalTime += end - start
+        metrics.startPhase("stream")
+        templates = TemplateCache(max_stream_templates)
+        variants = iter_variants(min_vars, min_clauses, rng, log=log, templates=templates, backend=backend,
+                                 max_clauses=max_clauses, tolerance=tolerance)
+        writer_stats = {}
+        num_vars, num_clauses = _write_output(lambda f: stream_formula(variants, f, compression, write_queue, writer_stats),
+                                              output, cache, key)
+        phase = metrics.endPhase()
+        metrics.set("template_hits", templates.hits)
+        metrics.set("template_misses", templates.misses)
+        metrics.set("template_evictions", templates.evictions)
+        metrics.set("vars", num_vars)
+        metrics.set("clauses", num_clauses)
+        if writer_stats:
+            metrics.set("writer", writer_stats)
+        if log:
+            print >> log, """
+=====================================
+DONE.
+vars:    %d
+clauses: %d
+=====================================
+""" % (num_vars, num_clauses)
+            print >> log, "Completed in ", datetime.timedelta(seconds=phase["seconds"])
+        return (num_vars, num_clauses)
+
+    if log:
+        print >> log, """
+=====================================
+GENERATING FORMULAS:
+=====================================
+"""
+    metrics.startPhase("generate")
+
+    if backend != "formula":
+        # the skeletons are converted to CNF templates and instantiated right away
+        templates = TemplateCache()
+        clauses, symbols = generate_clauses(min_vars, min_clauses, rng, log=log, templates=templates,
+                                            backend=backend, max_clauses=max_clauses, tolerance=tolerance)
+        metrics.set("template_hits", templates.hits)
+        metrics.set("template_misses", templates.misses)
+    else:
+        total = generate_skeletons(min_vars, min_clauses, rng, log=log, tolerance=tolerance, max_clauses=max_clauses)
+        metrics.set("skeletons", len(total))
 
-print >> sys.stderr, """
+    phase = metrics.endPhase()
+    if log:
+        print >> log, """DONE
+=====================================
+"""
+        print >> log, "Completed in ", datetime.timedelta(seconds=phase["seconds"])
+
+        print >> log, """
 =====================================
 CONVERTING TO CNF
 =====================================
 """
-# Use De-Morgan laws for converting to CNF. 
-# Tseitin's algorithm as we want an equivalent formula, not just equisatisfiable.
-# Producing equisatisfiable formulas might introduce different shortest impliciant of the resulting formulas.
+    # Use De-Morgan laws for converting to CNF.
+    # Tseitin's algorithm as we want an equivalent formula, not just equisatisfiable.
+    # Producing equisatisfiable formulas might introduce different shortest impliciant of the resulting formulas.
 
-start = datetime.datetime.now()
+    metrics.startPhase("cnf")
 
-whole = Conjunction(total)
-clauses = Conjunction(total).toCNF().subf
+    if backend == "formula":
+        clauses_estimate, literals_estimate = estimateCNFSize(Conjunction(total))
+        metrics.set("estimated_clauses", clauses_estimate)
+        metrics.set("estimated_literals", literals_estimate)
+        if log:
+            print >> log, "Estimated CNF size: %d clauses, %d literals" % (clauses_estimate, literals_estimate)
+        report = []
+        clauses, symbols = skeletons_to_clauses(total, backend, max_clauses=max_clauses, report=report, jobs=jobs)
+        metrics.set("tseitin_fallbacks", len(report))
+        if log:
+            _log_guard_report(report, log)
 
-end = datetime.datetime.now()
-print >> sys.stderr, """DONE
+    stats = None
+    if simplify_clauses:
+        clauses, stats = simplify(clauses)
+        metrics.set("simplification", dict(stats.__dict__))
+
+    phase = metrics.endPhase()
+    if log:
+        print >> log, """DONE
 =====================================
 """
-print >> sys.stderr, "Completed in ", end - start
-totalTime += end - start
+        print >> log, "Completed in ", datetime.timedelta(seconds=phase["seconds"])
 
 
-print >> sys.stderr, """
+        print >> log, """
 =====================================
 DIMACS:
 =====================================
 """
-start = datetime.datetime.now()
-
-formatter = DimacsFormatVisitor()
-formatter.processClauses(clauses)
+    metrics.startPhase("dimacs")
 
-print formatter.getDimacsString()
+    # the clauses are streamed to the output, the header is written upfront
+    if log:
+        print >> log, "Writing %d clauses" % len(clauses)
+    writer_stats = {}
+    _write_output(lambda f: write_formula(clauses, symbols, f, format, compression, write_queue, writer_stats),
+                  output, cache, key)
 
-end = datetime.datetime.now()
-print >> sys.stderr, """
+    phase = metrics.endPhase()
+    metrics.set("vars", symbols.numVars())
+    metrics.set("clauses", len(clauses))
+    metrics.set("literals", clauses.numLiterals())
+    if writer_stats:
+        metrics.set("writer", writer_stats)
+    if log:
+        print >> log, """
 =====================================
 DONE.
 vars:    %d
 clauses: %d
 =====================================
-""" % (formatter.numVars(), formatter.numClauses())
-end = datetime.datetime.now()
-print >> sys.stderr, "Completed in ", end - start  
+""" % (symbols.numVars(), len(clauses))
+        if stats:
+            print >> log, stats
+            print >> log, "clauses before simplification: %d, literals: %d -> %d" % (stats.clauses, stats.literals, clauses.numLiterals())
+        print >> log, "Completed in ", datetime.timedelta(seconds=phase["seconds"])
+
+        print >> log, "Total: ", datetime.timedelta(seconds=metrics.totalSeconds())
+
+    return (symbols.numVars(), len(clauses))
+
+
+if __name__ == "__main__":
+    #parse the cmd line args
+    argparser = argparse.ArgumentParser(description="Generates a single SPL-specific benchmark formula in the DIMACS format.")
+    argparser.add_argument("min_vars", type=int, nargs="?", help="minimum number of variables generated")
+    argparser.add_argument("min_clauses", type=int, nargs="?", help="minimum number of clauses generated")
+    argparser.add_argument("seed", type=int, nargs="?", help="random seed")
+    argparser.add_argument("--backend", choices=["formula", "int", "tseitin"], default="formula",
+                           help="convert to CNF via parse trees (default), directly to integer clauses, "
+                                "or by the polarity-aware Tseitin's encoding")
+    argparser.add_argument("-j", "--jobs", type=int,
+                           help="convert the skeletons to CNF by the given number of worker processes")
+    argparser.add_argument("--max-clauses", type=int,
+                           help="encode the subformulas whose CNF would have more clauses by Tseitin's encoding")
+    argparser.add_argument("--simplify", action="store_true",
+                           help="remove tautologies, duplicate literals and subsumed clauses from the CNF")
+    argparser.add_argument("--tolerance", type=float,
+                           help="count the variables and clauses of the resulting CNF and reach min_vars and min_clauses; "
+                                "the size reached last exceeds its minimum by at most the given relative overshoot (e.g. 0.01)")
+    argparser.add_argument("-q", "--quiet", action="store_true",
+                           help="no diagnostic output (the formulas are not printed on sys.stderr)")
+    argparser.add_argument("--metrics", help="write the metrics of the run as JSON to the given file ('-' for sys.stderr)")
+    argparser.add_argument("--profile", metavar="DIR", help="profile each phase by cProfile, write DIR/<phase>.prof")
+    argparser.add_argument("--cache", metavar="DIR", help="cache the seeded instances in the given directory")
+    argparser.add_argument("--cache-size", type=int, metavar="MB", help="maximal size of the cache (unlimited by default)")
+    argparser.add_argument("--format", choices=["dimacs", "binary"], default="dimacs",
+                           help="write the formula in the DIMACS format (default) or in the packed binary format")
+    argparser.add_argument("--compress", choices=["none", "gz", "xz"],
+                           help="compress the output (by default, according to the extension .gz/.xz of the output file)")
+    argparser.add_argument("--stream", action="store_true",
+                           help="write the variants of the skeletons as they are generated, in bounded memory "
+                                "(the clauses are not sorted globally); a compressed or non-seekable output "
+                                "(e.g. a pipe) is spooled to a temporary file and written only at the end, "
+                                "as the header comes last")
+    argparser.add_argument("--write-queue", type=int, metavar="CHUNKS",
+                           help="write (and compress) the output by a background thread through a queue "
+                                "of at most CHUNKS formatted chunks")
+    argparser.add_argument("-o", "--output", help="write the formula to the given file instead of the standard output")
+    args = argparser.parse_args()
+    if args.jobs is not None and args.jobs < 1:
+        argparser.error("the number of jobs has to be at least 1")
 
-totalTime += end - start
-print >> sys.stderr, "Total: ", totalTime
+    if args.min_clauses is not None:
+        min_vars = args.min_vars
+        min_clauses = args.min_clauses
+        if not args.quiet:
+            print >> sys.stderr, "min_vars: " + str(min_vars)
+            print >> sys.stderr, "min_clauses: " + str(min_clauses)
 
+    cache = None
+    if args.cache:
+        cache = InstanceCache(args.cache, args.cache_size and args.cache_size << 20)
+    metrics = RunMetrics(profile_dir=args.profile)
+    if args.stream and (args.format != "dimacs" or args.simplify):
+        argparser.error("--stream supports only the DIMACS format without --simplify")
+    compression = args.compress
+    if compression is None:
+        compression = compressionOf(args.output) if args.output else None
+    elif compression == "none":
+        compression = None
+    try:
+        checkCompression(compression)
+    except Exception as e:
+        argparser.error(str(e))
+    run(min_vars, min_clauses, args.seed, args.backend, args.output, args.max_clauses, args.simplify, metrics, args.quiet,
+        args.tolerance, cache, args.format, compression, args.jobs, args.stream, args.write_queue)
+    if args.metrics == "-":
+        print >> sys.stderr, metrics.toJSON()
+    elif args.metrics:
+        with open(args.metrics, "w") as f:
+            f.write(metrics.toJSON())
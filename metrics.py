@@ -0,0 +1,85 @@
+"""
+Module for collecting structured (machine-readable) metrics of a run of the generator.
+
+A run is divided into phases (see main.run); for each phase the wall time,
+the peak RSS of the process and the numbers of formula nodes created,
+duplicates filtered and subformulas whose CNF was reused during the phase 
+(see formula.statistics) are recorded.
+Each phase can be optionally profiled by cProfile.
+
+@author: Keznikl
+"""
+
+from formula import statistics
+import cProfile
+import resource
+import timeit
+import json
+import os
+
+
+class RunMetrics:
+    """Collects the metrics of the phases and the counters of a run.
+
+    Fields:
+    phases      -- list of the finished phases, each a dictionary with the keys name, seconds,
+                   peak_rss_kb, nodes_created, duplicates_filtered and cnf_reused
+    counters    -- dictionary of the other metrics of the run (e.g. vars, clauses)
+    callback    -- function called with the dictionary of each finished phase (None if not needed)
+    profile_dir -- directory for the cProfile statistics of the phases,
+                   written to <profile_dir>/<phase>.prof (no profiling if None)
+
+    """
+
+    def __init__(self, callback = None, profile_dir = None):
+        self.phases = []
+        self.counters = {}
+        self.callback = callback
+        self.profile_dir = profile_dir
+        self._current = None
+
+    def startPhase(self, name):
+        """Start measuring a phase (the previous phase has to be finished)."""
+        assert self._current is None, "phase %s is not finished" % self._current[0]
+        profiler = None
+        if self.profile_dir is not None:
+            profiler = cProfile.Profile()
+        self._current = (name, timeit.default_timer(), statistics.nodes_created, statistics.duplicates_filtered,
+                         statistics.cnf_reused, profiler)
+        if profiler is not None:
+            profiler.enable()
+
+    def endPhase(self):
+        """Finish the current phase, return its dictionary."""
+        name, start, nodes, duplicates, reused, profiler = self._current
+        if profiler is not None:
+            profiler.disable()
+            if not os.path.isdir(self.profile_dir):
+                os.makedirs(self.profile_dir)
+            profiler.dump_stats(os.path.join(self.profile_dir, name + ".prof"))
+        self._current = None
+        phase = {"name": name,
+                 "seconds": timeit.default_timer() - start,
+                 "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                 "nodes_created": statistics.nodes_created - nodes,
+                 "duplicates_filtered": statistics.duplicates_filtered - duplicates,
+                 "cnf_reused": statistics.cnf_reused - reused}
+        self.phases.append(phase)
+        if self.callback is not None:
+            self.callback(phase)
+        return phase
+
+    def set(self, name, value):
+        self.counters[name] = value
+
+    def totalSeconds(self):
+        return sum(p["seconds"] for p in self.phases)
+
+    def toDict(self):
+        result = dict(self.counters)
+        result["phases"] = self.phases
+        result["seconds"] = self.totalSeconds()
+        return result
+
+    def toJSON(self):
+        return json.dumps(self.toDict(), indent=1, sort_keys=True)
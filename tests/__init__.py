@@ -0,0 +1,7 @@
+"""
+Unit tests of the generator, run from the root of the repository by
+
+    python -m unittest discover
+
+@author: Keznikl
+"""
@@ -0,0 +1,74 @@
+"""
+Tests of the parallel generation of a suite of instances (the batch module).
+
+@author: Keznikl
+"""
+
+from batch import parse_range, read_specs, range_specs, instance_name, run_batch
+from metrics import RunMetrics
+import main
+import cStringIO
+import tempfile
+import shutil
+import json
+import sys
+import os
+import unittest
+
+
+class SpecsTest(unittest.TestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("300"), [300])
+        self.assertEqual(parse_range("10:13"), [10, 11, 12])
+        self.assertEqual(parse_range("100:400:100"), [100, 200, 300])
+
+    def test_read_specs(self):
+        f = cStringIO.StringIO("# min_vars min_clauses [seed]\n100 10\n\n200 20 7\n  # indented comment\n300 30\n")
+        # the instances without a seed get the base seed plus their index
+        self.assertEqual(read_specs(f, 5), [(100, 10, 5), (200, 20, 7), (300, 30, 7)])
+
+    def test_range_specs(self):
+        # the shorter range is extended by its last value
+        self.assertEqual(range_specs([100, 200, 300], [10], 3), [(100, 10, 3), (200, 10, 4), (300, 10, 5)])
+        self.assertEqual(range_specs([100], [10, 20]), [(100, 10, 0), (100, 20, 1)])
+
+    def test_instance_name(self):
+        self.assertEqual(instance_name((100, 10, 3)), "v100_c10_s3")
+
+
+class RunBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_same_instances_as_single_runs(self):
+        specs = [(40, 10, 1), (60, 10, 2)]
+        out_dir = os.path.join(self.dir, "suite")
+        stderr = sys.stderr
+        sys.stderr = cStringIO.StringIO()
+        try:
+            results = run_batch(specs, out_dir, jobs=2, quiet=True)
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(sorted(r[0] for r in results), specs)
+        for spec, num_vars, num_clauses, seconds in results:
+            path = os.path.join(out_dir, instance_name(spec))
+            single = os.path.join(self.dir, "single.cnf")
+            min_vars, min_clauses, seed = spec
+            counts = main.run(min_vars, min_clauses, seed, output=single, quiet=True, metrics=RunMetrics())
+            self.assertEqual((num_vars, num_clauses), counts)
+            with open(path + ".cnf", "rb") as f:
+                data = f.read()
+            with open(single, "rb") as f:
+                self.assertEqual(data, f.read(), instance_name(spec))
+            with open(path + ".json") as f:
+                self.assertEqual(json.load(f)["seed"], seed)
+            self.assertEqual(os.path.getsize(path + ".log"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+"""
+Tests of the comparison of the benchmark results with a baseline (the benchmark module).
+
+@author: Keznikl
+"""
+
+from benchmark import compare, result_key, MIN_SECONDS, MIN_PEAK_KB
+import unittest
+
+
+def result(stage = "int", min_vars = 100, seconds = 1.0, peak_kb = 10000, clauses = 500):
+    return {"stage": stage, "min_vars": min_vars, "min_clauses": 10, "max_variants": 3,
+            "seconds": seconds, "peak_kb": peak_kb, "clauses": clauses,
+            "clauses_per_sec": clauses / seconds}
+
+
+class CompareTest(unittest.TestCase):
+
+    def test_result_key(self):
+        self.assertEqual(result_key(result()), ("int", 100, 10, 3))
+        self.assertNotEqual(result_key(result()), result_key(result(stage="dimacs")))
+        self.assertNotEqual(result_key(result()), result_key(result(min_vars=300)))
+
+    def test_pass(self):
+        baseline = [result(), result(stage="dimacs")]
+        self.assertEqual(compare([result(), result(stage="dimacs")], baseline), [])
+        # within the tolerance
+        self.assertEqual(compare([result(seconds=1.19, peak_kb=11900)], baseline, 0.2), [])
+        # faster and smaller is not a regression
+        self.assertEqual(compare([result(seconds=0.5, peak_kb=5000)], baseline), [])
+
+    def test_regress(self):
+        baseline = [result()]
+        regressions = compare([result(seconds=1.3)], baseline, 0.2)
+        self.assertEqual([d for (r, b, d) in regressions], ["time 1.000s -> 1.300s"])
+        self.assertEqual(regressions[0][1], baseline[0])
+        self.assertEqual(compare([result(seconds=1.3)], baseline, 0.5), [])
+        regressions = compare([result(peak_kb=13000, clauses=501)], baseline, 0.2)
+        self.assertEqual([d for (r, b, d) in regressions],
+                         ["peak memory 10000 KB -> 13000 KB", "clauses 500 -> 501"])
+
+    def test_noise_ignored(self):
+        # above the tolerance but below the absolute thresholds
+        baseline = [result(seconds=0.001, peak_kb=100)]
+        current = [result(seconds=0.001 + MIN_SECONDS / 2, peak_kb=100 + MIN_PEAK_KB / 2)]
+        self.assertEqual(compare(current, baseline, 0.2), [])
+
+    def test_missing_baseline_key(self):
+        baseline = [result()]
+        self.assertEqual(compare([result(stage="tseitin", seconds=100.0), result(min_vars=300, clauses=1)],
+                                 baseline), [])
+        self.assertEqual(compare([result(seconds=2.0)], []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests of the packed binary CNF format (the binary module).
+
+@author: Keznikl
+"""
+
+from binary import BinaryCNF, writeBinary, readHeader, HEADER
+from clauses import ClauseSet
+from metrics import RunMetrics
+import main
+import tempfile
+import shutil
+import os
+import unittest
+
+CLAUSES = [[1, -2], [3], [-1, 2, -3], [], [2, 4]]
+
+
+class BinaryCNFTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "f.cnfb")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, clauses, num_vars):
+        clauseSet = ClauseSet()
+        clauseSet.extend(clauses)
+        with open(self.path, "wb") as f:
+            writeBinary(clauseSet, num_vars, f)
+
+    def test_round_trip(self):
+        self.write(CLAUSES, 4)
+        with open(self.path, "rb") as f:
+            self.assertEqual(readHeader(f), (4, 5, 8))
+        cnf = BinaryCNF(self.path)
+        try:
+            self.assertEqual((cnf.num_vars, len(cnf), cnf.num_literals), (4, 5, 8))
+            self.assertEqual([list(c) for c in cnf], CLAUSES)
+            self.assertEqual(list(cnf.clause(2)), [-1, 2, -3])
+            clauseSet = cnf.toClauseSet()
+            self.assertEqual([list(c) for c in clauseSet], CLAUSES)
+            self.assertEqual(clauseSet.numLiterals(), 8)
+        finally:
+            cnf.close()
+
+    def test_empty_formula(self):
+        self.write([], 0)
+        cnf = BinaryCNF(self.path)
+        try:
+            self.assertEqual(list(cnf), [])
+            self.assertEqual(len(cnf.toClauseSet()), 0)
+        finally:
+            cnf.close()
+
+    def test_not_binary(self):
+        with open(self.path, "wb") as f:
+            f.write("p cnf 1 1\n1 0\n" + " " * HEADER.size)
+        self.assertRaises(IOError, BinaryCNF, self.path)
+
+    def test_truncated(self):
+        self.write(CLAUSES, 4)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        with open(self.path, "wb") as f:
+            f.write(data[:-4])
+        self.assertRaises(IOError, BinaryCNF, self.path)
+
+    def test_same_formula_as_generated(self):
+        clauses, symbols = main.generate_formula(40, 10, 1)
+        self.assertEqual(main.run(40, 10, 1, output=self.path, quiet=True, format="binary", metrics=RunMetrics()),
+                         (symbols.numVars(), len(clauses)))
+        cnf = BinaryCNF(self.path)
+        try:
+            self.assertEqual(cnf.num_vars, symbols.numVars())
+            self.assertEqual([list(c) for c in cnf], [list(c) for c in clauses])
+        finally:
+            cnf.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests of the on-disk cache of the generated instances (the cache module).
+
+@author: Keznikl
+"""
+
+from cache import InstanceCache, readCounts, fileExtension
+from metrics import RunMetrics
+import main
+import cStringIO
+import tempfile
+import shutil
+import os
+import unittest
+
+
+class InstanceCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def put(self, cache, key, data, mtime):
+        temp_path = cache.tempPath(key)
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        path = cache.store(key, temp_path)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_key_depends_on_parameters(self):
+        cache = InstanceCache(self.dir)
+        self.assertEqual(cache.key(seed=1, backend="int"), cache.key(backend="int", seed=1))
+        self.assertNotEqual(cache.key(seed=1, backend="int"), cache.key(seed=2, backend="int"))
+
+    def test_lookup_store_copy(self):
+        cache = InstanceCache(self.dir)
+        key = cache.key(seed=1)
+        self.assertEqual(cache.lookup(key), None)
+        self.put(cache, key, "p cnf 2 1\n1 -2 0\n", 1000)
+        path = cache.lookup(key)
+        self.assertEqual(path, cache.path(key))
+        self.assertTrue(os.path.getmtime(path) > 1000)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        out = cStringIO.StringIO()
+        cache.copyTo(path, out)
+        self.assertEqual(out.getvalue(), "p cnf 2 1\n1 -2 0\n")
+        self.assertEqual(readCounts(path), (2, 1))
+
+    def test_file_extensions(self):
+        self.assertEqual(fileExtension(), ".cnf")
+        self.assertEqual(fileExtension("dimacs", "gz"), ".cnf.gz")
+        self.assertEqual(fileExtension("binary", "xz"), ".cnfb.xz")
+        cache = InstanceCache(self.dir)
+        self.assertTrue(cache.key(seed=1).endswith(".cnf"))
+        self.assertTrue(cache.key(seed=1, format="binary", compression="gz").endswith(".cnfb.gz"))
+        self.assertTrue(cache.path(cache.key(seed=1, compression="gz")).endswith(".cnf.gz"))
+
+    def test_least_recently_used_evicted(self):
+        cache = InstanceCache(self.dir, max_bytes=25)
+        a, b, c = cache.key(seed=1), cache.key(seed=2, format="binary"), cache.key(seed=3, compression="gz")
+        self.put(cache, a, "x" * 10, 1000)
+        self.put(cache, b, "x" * 10, 2000)
+        # a is used, b becomes the least recently used one
+        os.utime(cache.path(a), (3000, 3000))
+        self.put(cache, c, "x" * 10, 4000)
+        self.assertEqual(cache.lookup(b), None)
+        self.assertTrue(cache.lookup(a) and cache.lookup(c))
+
+    def test_max_entries_keeps_last_stored(self):
+        cache = InstanceCache(self.dir, max_entries=1)
+        a, b = cache.key(seed=1), cache.key(seed=2, format="binary", compression="gz")
+        self.put(cache, a, "x", 1000)
+        self.put(cache, b, "xx", 2000)
+        self.assertEqual([os.path.basename(path) for (mtime, size, path) in cache.entries()], [b])
+
+    def test_other_files_ignored(self):
+        cache = InstanceCache(self.dir, max_entries=1)
+        for name in ["notes.txt", cache.tempPath(cache.key(seed=1))]:
+            with open(os.path.join(self.dir, name), "w") as f:
+                f.write("x")
+        self.put(cache, cache.key(seed=2), "x", 1000)
+        self.put(cache, cache.key(seed=3), "x", 2000)
+        self.assertEqual(len(cache.entries()), 1)
+        self.assertEqual(len(os.listdir(self.dir)), 3)
+
+
+class CachedRunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_cached_instance_same_as_generated(self):
+        cache = InstanceCache(os.path.join(self.dir, "cache"))
+        outputs = []
+        for i in xrange(2):
+            output = os.path.join(self.dir, "out%d.cnf" % i)
+            metrics = RunMetrics()
+            counts = main.run(40, 10, 3, output=output, metrics=metrics, quiet=True, cache=cache)
+            outputs.append((counts, metrics.counters["cache"], open(output, "rb").read()))
+        self.assertEqual([o[1] for o in outputs], ["miss", "hit"])
+        self.assertEqual(outputs[0][0], outputs[1][0])
+        self.assertEqual(outputs[0][2], outputs[1][2])
+
+    def test_failed_write_not_cached(self):
+        cache = InstanceCache(os.path.join(self.dir, "cache"))
+        key = cache.key(seed=1)
+        def write(f):
+            f.write("p cnf")
+            raise IOError("No space left on device")
+        self.assertRaises(IOError, main._write_output, write, os.path.join(self.dir, "out.cnf"), cache, key)
+        self.assertEqual(os.listdir(cache.directory), [])
+        self.assertEqual(cache.lookup(key), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
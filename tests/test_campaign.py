@@ -0,0 +1,79 @@
+"""
+Tests of the solver campaign (the campaign module), with the bundled DPLL solver.
+
+@author: Keznikl
+"""
+
+from dpll import writeResult, SATISFIABLE, UNSATISFIABLE
+import campaign
+import main
+import cStringIO
+import sys
+import unittest
+
+
+class CampaignTest(unittest.TestCase):
+
+    def test_result_round_trip(self):
+        model = [l if l % 3 else -l for l in xrange(1, 24)]
+        out = cStringIO.StringIO()
+        writeResult(model, out)
+        self.assertEqual(campaign.parse_status(out.getvalue(), SATISFIABLE), "SAT")
+        self.assertEqual(campaign.parse_model(out.getvalue()), set(model))
+        out = cStringIO.StringIO()
+        writeResult(None, out)
+        self.assertEqual(campaign.parse_status(out.getvalue(), UNSATISFIABLE), "UNSAT")
+        self.assertEqual(campaign.parse_model(out.getvalue()), None)
+
+    def test_parse_status(self):
+        self.assertEqual(campaign.parse_status("c x\ns SATISFIABLE\nv 1 0\n", 0), "SAT")
+        self.assertEqual(campaign.parse_status("s UNSATISFIABLE\n", 0), "UNSAT")
+        self.assertEqual(campaign.parse_status("s UNKNOWN\n", 10), "UNKNOWN")
+        # the exit status is used without the "s" line
+        self.assertEqual(campaign.parse_status("", 10), "SAT")
+        self.assertEqual(campaign.parse_status("", 20), "UNSAT")
+        self.assertEqual(campaign.parse_status("", 1), "ERROR")
+        self.assertEqual(campaign.parse_status("", 0), "UNKNOWN")
+
+    def test_parse_model(self):
+        self.assertEqual(campaign.parse_model("s SATISFIABLE\nv 1 -2\nv 3 0\n"), set([1, -2, 3]))
+        self.assertEqual(campaign.parse_model("s UNSATISFIABLE\n"), None)
+
+    def test_verify_model(self):
+        data = "c x\np cnf 3 2\n1 -2 0\n2 3 0\n"
+        self.assertTrue(campaign.verify_model(data, set([1, 2, -3])))
+        self.assertFalse(campaign.verify_model(data, set([-1, 2, -3])))
+        self.assertFalse(campaign.verify_model(data, set([1, -2, -3])))
+
+    def test_run_solver_exit_status(self):
+        command = [sys.executable, "-c", "import sys; sys.stdin.read(); sys.exit(20)"]
+        status, exit_code, seconds, output = campaign.run_solver(command, "p cnf 1 1\n1 0\n")
+        self.assertEqual((status, exit_code, output), ("UNSAT", 20, ""))
+
+    def test_run_solver_timeout(self):
+        command = [sys.executable, "-c", "import time; time.sleep(30)"]
+        status, exit_code, seconds, output = campaign.run_solver(command, "", timeout=0.5)
+        self.assertEqual(status, "TIMEOUT")
+        self.assertTrue(seconds < 30)
+
+    def test_campaign_with_dpll(self):
+        stderr = sys.stderr
+        sys.stderr = cStringIO.StringIO()
+        try:
+            rows = campaign.run_campaign([(40, 10, 1)], [campaign.DPLL], jobs=1, timeout=60)
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row["status"], "SAT")
+        self.assertEqual(row["exit_code"], SATISFIABLE)
+        self.assertTrue(row["verified"])
+        clauses, symbols = main.generate_formula(40, 10, 1)
+        self.assertEqual((row["vars"], row["clauses"]), (symbols.numVars(), len(clauses)))
+        out = cStringIO.StringIO()
+        campaign.write_table(rows, out)
+        self.assertEqual(out.getvalue().splitlines()[0], ",".join(campaign.COLUMNS))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""
+Tests of the integer-literal clauses (the clauses module).
+
+@author: Keznikl
+"""
+
+from random import Random
+from formula import Conjunction, Disjunction, Negation, Variable, estimateCNFSize
+from clauses import SymbolTable, ClauseSet, TemplateCache, toClauseSet, toTemplate, simplify
+from tests.util import randomFormula, formulaModels, clauseModels, cnfClauses, namedClauses, assignments, satisfies
+import main
+import unittest
+
+NAMES = ["a", "b", "c", "d"]
+
+
+class SymbolTableTest(unittest.TestCase):
+
+    def test_ids_in_order_of_first_occurrence(self):
+        symbols = SymbolTable()
+        self.assertEqual([symbols.getId(n) for n in ["x", "y", "x", "z"]], [1, 2, 1, 3])
+        self.assertEqual(symbols.getName(2), "y")
+        self.assertEqual(symbols.numVars(), 3)
+
+    def test_fresh_name(self):
+        symbols = SymbolTable()
+        symbols.getId("_t0")
+        symbols.getId("_t2")
+        self.assertEqual(symbols.freshName("_t"), ("_t1", 1))
+        self.assertEqual(symbols.freshName("_t", 2), ("_t3", 3))
+        self.assertEqual(symbols.freshName("_t", 0, ["_t1", "_t3"]), ("_t4", 4))
+        # freshName does not number the name
+        self.assertEqual(symbols.numVars(), 2)
+
+
+class ClauseTemplateTest(unittest.TestCase):
+
+    def template(self):
+        return toTemplate(Conjunction([Disjunction([Variable("a"), Negation(Variable("b"))]), Variable("c")]))
+
+    def test_instances_renamed_apart(self):
+        template = self.template()
+        symbols = SymbolTable()
+        clauses = ClauseSet()
+        template.instantiate("x_", symbols, clauses)
+        template.instantiate("y_", symbols, clauses)
+        self.assertEqual(symbols.names, ["x_a", "x_b", "x_c", "y_a", "y_b", "y_c"])
+        self.assertEqual([list(c) for c in clauses], [[1, -2], [3], [4, -5], [6]])
+
+    def test_duplicate_prefix_rejected(self):
+        template = self.template()
+        symbols = SymbolTable()
+        clauses = ClauseSet()
+        template.instantiate("x_", symbols, clauses)
+        self.assertRaises(AssertionError, template.instantiate, "x_", symbols, clauses)
+
+
+class ClauseSetTest(unittest.TestCase):
+
+    def test_add_and_iterate(self):
+        clauses = ClauseSet()
+        clauses.extend([[1, -2], [3], [-1, 2, -3]])
+        self.assertEqual(len(clauses), 3)
+        self.assertEqual(clauses.numLiterals(), 6)
+        self.assertEqual([list(c) for c in clauses], [[1, -2], [3], [-1, 2, -3]])
+        self.assertEqual(list(clauses.clause(1)), [3])
+
+    def test_extend_shifted(self):
+        template = ClauseSet()
+        template.extend([[1, -2], [2]])
+        clauses = ClauseSet()
+        clauses.add([1])
+        clauses.extendShifted(template, 5)
+        self.assertEqual([list(c) for c in clauses], [[1], [6, -7], [7]])
+
+    def test_empty_clause(self):
+        clauses = ClauseSet()
+        clauses.add([])
+        clauses.add([4])
+        self.assertEqual([list(c) for c in clauses], [[], [4]])
+
+
+class TemplateCacheTest(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = TemplateCache(2)
+        built = []
+        def get(key):
+            return cache.get(key, lambda: built.append(key) or key.upper())
+        self.assertEqual([get(k) for k in ["a", "b", "a", "c", "a", "b"]], ["A", "B", "A", "C", "A", "B"])
+        # b was evicted by c, then c by b
+        self.assertEqual(built, ["a", "b", "c", "b"])
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 4, 2))
+        self.assertEqual(list(cache.templates), ["a", "b"])
+
+    def test_unbounded(self):
+        cache = TemplateCache()
+        for k in xrange(100):
+            cache.get(k, lambda: k)
+        self.assertEqual((len(cache.templates), cache.evictions), (100, 0))
+
+
+class ToClauseSetTest(unittest.TestCase):
+
+    def test_equivalent_to_formula(self):
+        rng = Random(1)
+        for i in xrange(300):
+            f = randomFormula(rng, 4, NAMES, [] if i % 2 else None)
+            if estimateCNFSize(f)[0] > 2000:
+                continue
+            symbols = SymbolTable()
+            clauses = toClauseSet(f, symbols)
+            self.assertEqual(clauseModels(clauses, symbols, NAMES), formulaModels(f, NAMES), str(f))
+
+    def test_duplicate_clauses_filtered(self):
+        f = Conjunction([Disjunction([Variable("a"), Variable("b")]), Disjunction([Variable("b"), Variable("a")]),
+                         Negation(Negation(Variable("c")))])
+        symbols = SymbolTable()
+        clauses = toClauseSet(f, symbols)
+        self.assertEqual(sorted(sorted(c) for c in namedClauses(clauses, symbols)),
+                         [[("a", True), ("b", True)], [("c", True)]])
+
+    def test_same_clauses_as_formula_backend(self):
+        rng = Random(2)
+        for i in xrange(100):
+            f = randomFormula(rng, 4, NAMES)
+            if estimateCNFSize(f)[0] > 2000:
+                continue
+            symbols = SymbolTable()
+            clauses = toClauseSet(f, symbols)
+            self.assertEqual(set(namedClauses(clauses, symbols)), set(cnfClauses(f.toCNF())), str(f))
+
+
+class SimplifyTest(unittest.TestCase):
+
+    def simplified(self, clauses):
+        clauseSet = ClauseSet()
+        clauseSet.extend(clauses)
+        result, stats = simplify(clauseSet)
+        return ([list(c) for c in result], stats)
+
+    def test_removed_clauses_and_stats(self):
+        result, stats = self.simplified([[1, 2], [1, -1, 3], [2, 1], [3, 3, -2], [1, 2, 4], [4], [-2, 3]])
+        self.assertEqual(result, [[1, 2], [3, -2], [4]])
+        self.assertEqual((stats.clauses, stats.literals), (7, 16))
+        self.assertEqual((stats.tautologies, stats.duplicate_literals, stats.duplicate_clauses, stats.subsumed),
+                         (1, 1, 2, 1))
+        self.assertEqual(stats.removed(), 4)
+
+    def test_input_not_modified(self):
+        clauseSet = ClauseSet()
+        clauseSet.extend([[1], [1, 2]])
+        simplify(clauseSet)
+        self.assertEqual([list(c) for c in clauseSet], [[1], [1, 2]])
+
+    def test_equivalent(self):
+        rng = Random(7)
+        for i in xrange(100):
+            clauses = [[rng.choice([-1, 1]) * rng.randint(1, 5) for k in xrange(rng.randint(1, 4))]
+                       for j in xrange(rng.randint(1, 12))]
+            result, stats = self.simplified(clauses)
+            symbols = SymbolTable()
+            names = [symbols.getName(symbols.getId(n)) for n in "abcde"]
+            for a in assignments(names):
+                self.assertEqual(satisfies(result, a, symbols), satisfies(clauses, a, symbols), str(clauses))
+            self.assertEqual(len(result), len(clauses) - stats.removed())
+
+
+class BackendTest(unittest.TestCase):
+
+    def test_int_backend_same_formula_up_to_numbering(self):
+        for seed in xrange(3):
+            formula_clauses, formula_symbols = main.generate_formula(40, 10, seed)
+            int_clauses, int_symbols = main.generate_formula(40, 10, seed, backend="int")
+            self.assertEqual(sorted(sorted(c) for c in namedClauses(int_clauses, int_symbols)),
+                             sorted(sorted(c) for c in namedClauses(formula_clauses, formula_symbols)))
+            self.assertEqual(int_symbols.numVars(), formula_symbols.numVars())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+Tests of the DIMACS output (dimacs.DimacsWriter) and input (dimacs.DimacsReader).
+
+@author: Keznikl
+"""
+
+from random import Random
+from formula import Conjunction, Disjunction, Negation, Variable
+from dimacs import DimacsWriter, DimacsFormatVisitor, DimacsReader, HEADER_COMMENT, compressedOutput, readFormula
+from tests.util import randomFormula, dimacsHeader
+from tests.test_output import NonSeekable
+import main
+import cStringIO
+import tempfile
+import shutil
+import sys
+import os
+import unittest
+
+
+def literals(clause):
+    """Return the literals of the CNF clause as (variable name, positive) pairs."""
+    subf = clause.subf if isinstance(clause, Disjunction) else [clause]
+    return [(l.subf.name, False) if isinstance(l, Negation) else (l.name, True) for l in subf]
+
+
+class DimacsWriterTest(unittest.TestCase):
+
+    CLAUSES = [[1, -2], [3], [-1, 2, -3], [2]]
+
+    def test_header_upfront(self):
+        out = cStringIO.StringIO()
+        writer = DimacsWriter(out, buffer_size=2)
+        writer.writeHeader(3, 4)
+        for c in self.CLAUSES:
+            writer.writeClause(c)
+        writer.close()
+        self.assertEqual(out.getvalue(), HEADER_COMMENT + "p cnf 3 4\n1 -2 0\n3 0\n-1 2 -3 0\n2 0\n")
+
+    def test_close_writes_the_last_chunk(self):
+        out = cStringIO.StringIO()
+        writer = DimacsWriter(out, buffer_size=3)
+        writer.writeHeader(3, 4)
+        for c in self.CLAUSES:
+            writer.writeClause(c)
+        self.assertEqual(out.getvalue().count(" 0\n"), 3)
+        writer.close()
+        self.assertEqual(out.getvalue().count(" 0\n"), 4)
+
+    def test_reserved_header(self):
+        out = cStringIO.StringIO()
+        writer = DimacsWriter(out, buffer_size=2)
+        for c in self.CLAUSES:
+            writer.writeClause(c)
+        writer.close()
+        lines = out.getvalue().splitlines()
+        self.assertEqual(dimacsHeader(out.getvalue()), (3, 4))
+        # the padding is in the comment line before the header
+        self.assertEqual(lines[0] + "\n", HEADER_COMMENT)
+        self.assertEqual(lines[1].strip(), "c")
+        self.assertEqual(lines[2], "p cnf 3 4")
+        self.assertEqual(lines[3:], ["1 -2 0", "3 0", "-1 2 -3 0", "2 0"])
+        self.assertEqual((writer.num_vars, writer.num_clauses), (3, 4))
+
+    def test_reserved_header_with_given_number_of_variables(self):
+        out = cStringIO.StringIO()
+        writer = DimacsWriter(out)
+        writer.writeClause([1])
+        writer.close(5)
+        self.assertEqual(dimacsHeader(out.getvalue()), (5, 1))
+
+    def test_reserved_header_same_length(self):
+        writer = DimacsWriter(cStringIO.StringIO())
+        lengths = set()
+        for counts in [(0, 0), (5, 1), (10 ** 19, 10 ** 19)]:
+            padded = writer._paddedHeader(*counts)
+            self.assertEqual(dimacsHeader(padded), counts)
+            lengths.add(len(padded))
+        self.assertEqual(len(lengths), 1)
+
+    def test_reserved_header_requires_seekable_output(self):
+        writer = DimacsWriter(NonSeekable())
+        self.assertRaises(IOError, writer.writeClause, [1])
+
+    def test_streamed_clauses_as_formatted_in_memory(self):
+        # processClauses reports the numbers of clauses on sys.stderr, writeClauses does not
+        stderr = sys.stderr
+        sys.stderr = cStringIO.StringIO()
+        try:
+            self.checkStreamedClauses()
+            sys.stderr.truncate(0)
+            DimacsFormatVisitor().writeClauses(Conjunction([Variable("a"), Variable("b")]).subf,
+                                               DimacsWriter(cStringIO.StringIO()))
+            self.assertEqual(sys.stderr.getvalue(), "")
+        finally:
+            sys.stderr = stderr
+
+    def checkStreamedClauses(self):
+        rng = Random(3)
+        for i in xrange(20):
+            cnf = Conjunction([randomFormula(rng, 3, ["a", "b", "c"]) for j in xrange(3)]).toCNF()
+            expected = DimacsFormatVisitor()
+            expected.processClauses(cnf.subf)
+            out = cStringIO.StringIO()
+            writer = DimacsWriter(out, buffer_size=2)
+            DimacsFormatVisitor().writeClauses(cnf.subf, writer)
+            writer.close()
+            self.assertEqual(out.getvalue(), expected.getDimacsString() + ("\n" if cnf.subf else ""))
+
+
+class DimacsReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, clauses, compression = None):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            out = compressedOutput(f, compression)
+            writer = DimacsWriter(out, buffer_size=3)
+            writer.writeHeader(max(abs(l) for c in clauses for l in c), len(clauses))
+            for c in clauses:
+                writer.writeClause(c)
+            writer.close()
+            if out is not f:
+                out.close()
+        return path
+
+    def random_clauses(self, seed):
+        rng = Random(seed)
+        return [[rng.choice([-1, 1]) * rng.randint(1, 30) for k in xrange(rng.randint(1, 5))] for j in xrange(500)]
+
+    def test_round_trip(self):
+        for compression, name in [(None, "f.cnf"), ("gz", "f.cnf.gz")]:
+            clauses = self.random_clauses(1)
+            path = self.write(name, clauses, compression)
+            # small chunks, the clauses span several chunks
+            reader = DimacsReader(path, chunk_size=64)
+            self.assertEqual(reader.compression, compression)
+            self.assertEqual(reader.num_clauses, len(clauses))
+            self.assertEqual(reader.comments, [HEADER_COMMENT[1:].strip()])
+            self.assertEqual(list(reader), clauses)
+            clauseSet, symbols = reader.readClauseSet()
+            self.assertEqual([list(c) for c in clauseSet], clauses)
+            self.assertEqual(symbols.numVars(), reader.num_vars)
+            self.assertEqual(symbols.getName(7), "7")
+
+    def test_comments_end_marker_and_unterminated_clause(self):
+        path = os.path.join(self.dir, "f.cnf")
+        with open(path, "wb") as f:
+            f.write("c first\nc second\np cnf 4 3\n1 -2 0\nc inside\n3\n 4 0 -1\n%\n0\n")
+        reader = DimacsReader(path)
+        self.assertEqual(reader.comments, ["first", "second"])
+        self.assertEqual((reader.num_vars, reader.num_clauses), (4, 3))
+        self.assertEqual(list(reader), [[1, -2], [3, 4], [-1]])
+        self.assertEqual([list(c) for c in reader.readClauseSet()[0]], [[1, -2], [3, 4], [-1]])
+
+    def test_empty_file(self):
+        path = os.path.join(self.dir, "f.cnf")
+        open(path, "wb").close()
+        reader = DimacsReader(path)
+        self.assertEqual((reader.num_vars, list(reader)), (None, []))
+
+    def test_invalid_header(self):
+        path = os.path.join(self.dir, "f.cnf")
+        with open(path, "wb") as f:
+            f.write("p dnf 1 1\n1 0\n")
+        self.assertRaises(IOError, DimacsReader, path)
+
+    def test_generated_formula_read_back(self):
+        path = os.path.join(self.dir, "f.cnf")
+        clauses, symbols = main.generate_formula(40, 10, 2)
+        with open(path, "wb") as f:
+            main.write_dimacs(clauses, symbols, f)
+        formula = readFormula(path)
+        self.assertEqual([literals(c) for c in formula.subf], [[(str(abs(l)), l > 0) for l in c] for c in clauses])
+        self.assertEqual(DimacsReader(path).num_vars, symbols.numVars())
+
+
+if __name__ == "__main__":
+    unittest.main()
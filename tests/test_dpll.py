@@ -0,0 +1,68 @@
+"""
+Tests of the bundled DPLL solver (the dpll module).
+
+@author: Keznikl
+"""
+
+from random import Random
+from dpll import DPLLSolver, readDimacs, writeResult
+import itertools
+import cStringIO
+import unittest
+
+
+def random_cnf(rng, num_vars, num_clauses):
+    return [[rng.choice([-1, 1]) * rng.randint(1, num_vars) for k in xrange(rng.randint(1, 3))]
+            for i in xrange(num_clauses)]
+
+def brute_force(num_vars, clauses):
+    """True iff the clauses are satisfiable, by enumerating all assignments."""
+    for values in itertools.product([False, True], repeat=num_vars):
+        if all(any(values[abs(l) - 1] == (l > 0) for l in c) for c in clauses):
+            return True
+    return False
+
+def satisfies(model, clauses):
+    return all(any(l in model for l in c) for c in clauses)
+
+
+class DPLLSolverTest(unittest.TestCase):
+
+    def test_agrees_with_brute_force(self):
+        rng = Random(1)
+        results = set()
+        for i in xrange(300):
+            num_vars = rng.randint(1, 8)
+            clauses = random_cnf(rng, num_vars, rng.randint(1, 40))
+            model = DPLLSolver(num_vars, clauses).solve()
+            self.assertEqual(model is not None, brute_force(num_vars, clauses), str(clauses))
+            if model is not None:
+                self.assertEqual(sorted(abs(l) for l in model), range(1, num_vars + 1))
+                self.assertTrue(satisfies(set(model), clauses), str(clauses))
+            results.add(model is not None)
+        # both satisfiable and unsatisfiable formulas were generated
+        self.assertEqual(results, set([True, False]))
+
+    def test_trivial_formulas(self):
+        self.assertEqual(DPLLSolver(0, []).solve(), [])
+        self.assertEqual(DPLLSolver(1, [[]]).solve(), None)
+        self.assertEqual(DPLLSolver(1, [[1], [-1]]).solve(), None)
+        self.assertEqual(DPLLSolver(2, [[1, -1], [-2]]).solve(), [-1, -2])
+
+    def test_read_dimacs(self):
+        f = cStringIO.StringIO("c comment\np cnf 5 3\n1 -2 0\n3\n4 0 -1 0\n%\n0\n")
+        self.assertEqual(readDimacs(f), (5, [[1, -2], [3, 4], [-1]]))
+        # the number of variables is taken from the literals without a header, the last clause may be unterminated
+        self.assertEqual(readDimacs(cStringIO.StringIO("1 -7 0\n2")), (7, [[1, -7], [2]]))
+
+    def test_write_result(self):
+        out = cStringIO.StringIO()
+        writeResult(range(1, 13), out)
+        self.assertEqual(out.getvalue(), "s SATISFIABLE\nv 1 2 3 4 5 6 7 8 9 10\nv 11 12\nv 0\n")
+        out = cStringIO.StringIO()
+        writeResult(None, out)
+        self.assertEqual(out.getvalue(), "s UNSATISFIABLE\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+Tests of the parse trees of formulas (the formula module).
+
+@author: Keznikl
+"""
+
+from random import Random
+from formula import Variable, Negation, Implication, Conjunction, Disjunction, CNFCache, estimateCNFSize
+from formula import statistics, sharedSubformulas, literal, preorder
+from clauses import SymbolTable, toClauseSet, _clauses
+from tests.util import namedClauses, randomFormula, formulaModels, clauseModels
+import formula
+import main
+import tseitin
+import gc
+import sys
+import unittest
+
+# deep enough to exceed the recursion limit many times
+DEPTH = 20000
+# the conversion via parse trees builds all the intermediate clauses (quadratic in the depth)
+CNF_DEPTH = 2 * sys.getrecursionlimit()
+
+
+def implicationChain(depth):
+    """x1 => (x2 => ... (x(depth-1) => x0)), i.e. the single clause !x1 | ... | !x(depth-1) | x0."""
+    f = Variable("x0")
+    for i in xrange(depth - 1, 0, -1):
+        f = Implication(Variable("x%d" % i), f)
+    return f
+
+def negationChain(depth):
+    """!!...!y with depth negations."""
+    f = Variable("y")
+    for i in xrange(depth):
+        f = Negation(f)
+    return f
+
+def chainClause(depth):
+    return frozenset([("x0", True)] + [("x%d" % i, False) for i in xrange(1, depth)])
+
+
+class DeepFormulaTest(unittest.TestCase):
+    """The formulas nested deeper than the recursion limit are processed without recursion."""
+
+    def test_string_hash_and_equality(self):
+        for f in [implicationChain(DEPTH), negationChain(DEPTH)]:
+            clone = f.clone()
+            self.assertEqual(str(f), str(clone))
+            self.assertEqual(hash(f), hash(clone))
+            self.assertTrue(f == clone)
+            self.assertFalse(f != clone)
+        self.assertFalse(implicationChain(DEPTH) == implicationChain(DEPTH - 1))
+        self.assertFalse(negationChain(DEPTH) == negationChain(DEPTH + 1))
+
+    def test_traversals(self):
+        f = implicationChain(DEPTH)
+        self.assertEqual(len(str(f.derivationTree())), len(str(f)))
+        self.assertEqual(len(list(f.clone().getChildren())), 2)
+
+    def test_formula_backend(self):
+        clauses, symbols = main.skeletons_to_clauses([implicationChain(CNF_DEPTH)], "formula")
+        self.assertEqual(namedClauses(clauses, symbols), [chainClause(CNF_DEPTH)])
+        clauses, symbols = main.skeletons_to_clauses([negationChain(DEPTH)], "formula")
+        self.assertEqual(namedClauses(clauses, symbols), [frozenset([("y", True)])])
+
+    def test_int_backend(self):
+        clauses, symbols = main.skeletons_to_clauses([implicationChain(DEPTH)], "int")
+        self.assertEqual(namedClauses(clauses, symbols), [chainClause(DEPTH)])
+        clauses, symbols = main.skeletons_to_clauses([negationChain(DEPTH + 1)], "int")
+        self.assertEqual(namedClauses(clauses, symbols), [frozenset([("y", False)])])
+
+    def test_int_backend_with_size_guard(self):
+        # the clause of the chain is too large, it is encoded by Tseitin's encoding
+        f = Conjunction([implicationChain(DEPTH), Disjunction([negationChain(DEPTH), Variable("z")])])
+        report = []
+        clauses = toClauseSet(f, SymbolTable(), None, 0, report)
+        self.assertTrue(report)
+        self.assertTrue(len(clauses) > 0)
+
+    def test_tseitin_backend(self):
+        clauses, symbols = main.skeletons_to_clauses([implicationChain(DEPTH), negationChain(DEPTH)], "tseitin")
+        # one definition clause per implication and the two asserted roots
+        self.assertEqual(len(clauses), DEPTH + 1)
+        cnf = tseitin.toCNF(implicationChain(CNF_DEPTH))
+        self.assertTrue(len(cnf.subf) > CNF_DEPTH)
+
+
+class SharedSubformulasTest(unittest.TestCase):
+    """The shared subformulas are converted once per polarity, the other ones are not memoized."""
+
+    NAMES = ["a", "b", "c", "d"]
+
+    def test_shared_formulas_equivalent(self):
+        rng = Random(4)
+        for i in xrange(300):
+            f = randomFormula(rng, 5, self.NAMES, [])
+            if estimateCNFSize(f)[0] > 2000 or estimateCNFSize(Negation(f))[0] > 2000:
+                continue
+            models = formulaModels(f, self.NAMES)
+            symbols = SymbolTable()
+            self.assertEqual(clauseModels(toClauseSet(f, symbols), symbols, self.NAMES), models, str(f))
+
+    def test_shared_subformula_reused(self):
+        shared = Disjunction([Variable("a"), Conjunction([Variable("b"), Variable("c")])])
+        f = Conjunction([Disjunction([shared, Variable("d")]), Implication(Variable("d"), shared)])
+        reused = statistics.cnf_reused
+        toClauseSet(f, SymbolTable())
+        self.assertTrue(statistics.cnf_reused > reused)
+
+    def test_cache_bounded(self):
+        cache = CNFCache(max_entries=2)
+        for i in xrange(5):
+            cache.put((i, True), None, Variable("x%d" % i))
+            self.assertTrue(len(cache.entries) <= 2)
+        self.assertEqual(cache.get((0, True)), None)
+        self.assertEqual(str(cache.get((4, True))), "x4")
+
+    def test_unshared_chain_not_memoized(self):
+        # the memo used to keep the clauses of all the levels of the chain (quadratic memory)
+        f = Variable("z0")
+        for i in xrange(1, 400):
+            f = Conjunction([Variable("z%d" % i), Disjunction([Variable("w%d" % i), f])])
+        memo = {}
+        result = _clauses(f, True, SymbolTable(), None, memo, sharedSubformulas(f))
+        self.assertEqual(memo, {})
+        self.assertEqual(len(result), 400)
+        self.assertEqual(sum(len(c) for c in result), 400 * 401 / 2)
+
+
+class SharedNodesTest(unittest.TestCase):
+    """The literals and the CNF nodes are shared (flyweight, hash-consing)."""
+
+    def test_literals_shared(self):
+        self.assertTrue(literal("a") is literal("a"))
+        self.assertTrue(literal("a", False) is literal("a", False))
+        self.assertTrue(literal("a", False).subf is literal("a"))
+        self.assertTrue(literal("a").is_cnf)
+
+    def test_no_instance_dictionary(self):
+        self.assertRaises(AttributeError, setattr, Variable("a"), "color", "red")
+        self.assertFalse(hasattr(Conjunction([Variable("a")]), "__dict__"))
+
+    def test_cnf_nodes_shared(self):
+        first = Conjunction([Disjunction([Variable("a"), Negation(Variable("b"))]), Variable("c")]).toCNF()
+        second = Conjunction([Variable("c"), Disjunction([Negation(Variable("b")), Variable("a")])]).toCNF()
+        self.assertTrue(first is second)
+        self.assertTrue(first.subf[1] is literal("c"))
+
+    def test_cnf_nodes_released(self):
+        cnf = Disjunction([Variable("released_a"), Variable("released_b")]).toCNF()
+        self.assertTrue(formula._consed.get(cnf.key()) is cnf)
+        key = cnf.key()
+        del cnf
+        gc.collect()
+        self.assertEqual(formula._consed.get(key), None)
+        # the key refers to the children, they stay alive as long as the key
+        del key
+        gc.collect()
+        self.assertEqual(formula._consed.get((Variable, "released_a")), None)
+        self.assertEqual(formula._consed.get((Variable, "released_b")), None)
+
+    def test_clone_independent(self):
+        cnf = Conjunction([Disjunction([Variable("a"), Negation(Variable("b"))]), Variable("c")]).toCNF()
+        copy = cnf.clone()
+        self.assertTrue(copy.is_cnf)
+        self.assertEqual(copy, cnf)
+        shared = set(id(f) for f in preorder(cnf))
+        self.assertFalse([f for f in preorder(copy) if id(f) in shared])
+        copy.visit(main.RenameVisitor("p_"))
+        self.assertEqual(str(copy), "((!p_b | p_a) & p_c)")
+        self.assertEqual(str(cnf), "((!b | a) & c)")
+        self.assertEqual(literal("a").name, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+Tests of the metrics of a run of the generator (the metrics module, main.run with metrics).
+
+@author: Keznikl
+"""
+
+from metrics import RunMetrics
+import main
+import tempfile
+import shutil
+import json
+import os
+import unittest
+
+
+class RunMetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def header(self, path):
+        with open(path) as f:
+            for line in f:
+                if line.startswith("p cnf"):
+                    fields = line.split()
+                    return (int(fields[2]), int(fields[3]))
+
+    def test_phases(self):
+        phases = []
+        metrics = RunMetrics(callback=phases.append)
+        metrics.startPhase("first")
+        metrics.endPhase()
+        metrics.startPhase("second")
+        self.assertRaises(AssertionError, metrics.startPhase, "third")
+        metrics.endPhase()
+        self.assertEqual([p["name"] for p in metrics.phases], ["first", "second"])
+        self.assertEqual(phases, metrics.phases)
+        self.assertEqual(metrics.totalSeconds(), sum(p["seconds"] for p in phases))
+
+    def test_run_metrics_json(self):
+        for options in [{}, {"backend": "int"}, {"backend": "tseitin"}, {"stream": True}]:
+            path = os.path.join(self.dir, "out.cnf")
+            metrics = RunMetrics()
+            counts = main.run(60, 10, 2, output=path, quiet=True, metrics=metrics, **options)
+            result = json.loads(metrics.toJSON())
+            for key in ["min_vars", "min_clauses", "seed", "backend", "vars", "clauses", "phases", "seconds"]:
+                self.assertTrue(key in result, "%s %s" % (key, options))
+            self.assertEqual((result["min_vars"], result["min_clauses"], result["seed"]), (60, 10, 2))
+            self.assertEqual((result["vars"], result["clauses"]), counts)
+            self.assertEqual((result["vars"], result["clauses"]), self.header(path), str(options))
+            self.assertTrue(result["phases"])
+            for phase in result["phases"]:
+                self.assertEqual(sorted(phase.keys()), ["cnf_reused", "duplicates_filtered", "name",
+                                                        "nodes_created", "peak_rss_kb", "seconds"])
+
+
+if __name__ == "__main__":
+    unittest.main()
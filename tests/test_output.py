@@ -0,0 +1,111 @@
+"""
+Tests of the output paths of the generator: the streamed output (main.stream_formula)
+and the background writing (main.write_formula with a write queue).
+
+@author: Keznikl
+"""
+
+from random import Random
+from metrics import RunMetrics
+from clauses import TemplateCache
+from tests.util import dimacsHeader
+import main
+import cStringIO
+import tempfile
+import shutil
+import gzip
+import os
+import unittest
+
+
+class NonSeekable:
+    """Output which cannot be seeked (e.g. a pipe)."""
+
+    def __init__(self):
+        self.data = []
+
+    def write(self, data):
+        self.data.append(data)
+
+    def flush(self):
+        pass
+
+    def tell(self):
+        raise IOError("Illegal seek")
+
+
+class StreamTest(unittest.TestCase):
+
+    def stream(self, out, compression = None, write_queue = None, writer_stats = None, seed = 3):
+        variants = main.iter_variants(60, 10, Random(seed))
+        return main.stream_formula(variants, out, compression, write_queue, writer_stats)
+
+    def seekable(self):
+        out = tempfile.TemporaryFile()
+        counts = self.stream(out)
+        out.seek(0)
+        return (counts, out.read())
+
+    def test_non_seekable_output_spooled(self):
+        counts, expected = self.seekable()
+        out = NonSeekable()
+        self.assertEqual(self.stream(out), counts)
+        self.assertEqual("".join(out.data), expected)
+        self.assertEqual(dimacsHeader(expected), counts)
+
+    def test_strict_header(self):
+        counts, data = self.seekable()
+        self.assertEqual(dimacsHeader(data), counts)
+        lines = data.splitlines()
+        # the padding of the reserved header is a comment line before it
+        self.assertEqual(lines[1].strip(), "c")
+        self.assertEqual(lines[2], "p cnf %d %d" % counts)
+
+    def test_compressed_output_spooled(self):
+        counts, expected = self.seekable()
+        out = cStringIO.StringIO()
+        writer_stats = {}
+        self.assertEqual(self.stream(out, "gz", 2, writer_stats), counts)
+        self.assertEqual(gzip.GzipFile(fileobj=cStringIO.StringIO(out.getvalue())).read(), expected)
+        self.assertTrue(writer_stats["chunks"] > 0 and writer_stats["spool"]["chunks"] > 0)
+
+    def test_bounded_templates_same_output(self):
+        expected = list(main.iter_variants(1000, 10, Random(4)))
+        templates = TemplateCache(1)
+        variants = list(main.iter_variants(1000, 10, Random(4), templates=templates))
+        self.assertTrue(templates.evictions > 0)
+        self.assertEqual([(list(t.clauses), prefix) for (t, prefix) in variants],
+                         [(list(t.clauses), prefix) for (t, prefix) in expected])
+
+
+class WriteQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def generate(self, name, **options):
+        path = os.path.join(self.dir, name)
+        metrics = RunMetrics()
+        main.run(60, 10, 2, output=path, quiet=True, metrics=metrics, **options)
+        with open(path, "rb") as f:
+            return (f.read(), metrics)
+
+    def test_same_output_with_write_queue(self):
+        for options in [{}, {"backend": "int"}, {"format": "binary"}, {"stream": True}]:
+            expected, metrics = self.generate("plain", **options)
+            data, metrics = self.generate("queued", write_queue=1, **options)
+            self.assertEqual(data, expected, str(options))
+            self.assertTrue(metrics.counters["writer"]["chunks"] > 0)
+
+    def test_same_compressed_output_with_write_queue(self):
+        for options in [{}, {"stream": True}]:
+            expected, metrics = self.generate("plain", **options)
+            data, metrics = self.generate("queued.gz", compression="gz", write_queue=2, **options)
+            self.assertEqual(gzip.GzipFile(fileobj=cStringIO.StringIO(data)).read(), expected, str(options))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""
+Tests of the parallel conversion of the skeletons (main.parallel_to_clauses).
+
+@author: Keznikl
+"""
+
+from random import Random
+from clauses import SymbolTable, ClauseSet
+from metrics import RunMetrics
+import main
+import tempfile
+import shutil
+import os
+import unittest
+
+
+class ParallelTest(unittest.TestCase):
+    """The merge of the chunks converted by the worker processes equals the serial conversion."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def generate(self, name, spec, **options):
+        path = os.path.join(self.dir, name)
+        min_vars, min_clauses, seed = spec
+        main.run(min_vars, min_clauses, seed, output=path, quiet=True, metrics=RunMetrics(), **options)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def test_parallel_output_same_as_serial(self):
+        for spec in [(40, 10, 1), (80, 20, 5)]:
+            self.assertEqual(self.generate("parallel.cnf", spec, jobs=2), self.generate("serial.cnf", spec),
+                             "instance %s" % (spec,))
+
+    def test_duplicates_among_chunks_filtered(self):
+        skeletons = main.generate_skeletons(60, 10, Random(7))
+        # each skeleton twice, the copies in different chunks
+        serial, serial_symbols = main.skeletons_to_clauses(skeletons)
+        symbols = SymbolTable()
+        clauses = ClauseSet()
+        main.parallel_to_clauses(skeletons + skeletons, 2, symbols, clauses, chunks_per_job=3)
+        self.assertEqual([list(c) for c in clauses], [list(c) for c in serial])
+        self.assertEqual(symbols.names, serial_symbols.names)
+
+
+if __name__ == "__main__":
+    unittest.main()
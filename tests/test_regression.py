@@ -0,0 +1,50 @@
+"""
+Regression tests of the generated instances: the default output is byte-identical 
+to the output of the original generator (the SHA-1 digests of its DIMACS files).
+
+@author: Keznikl
+"""
+
+import main
+import hashlib
+import tempfile
+import shutil
+import os
+import unittest
+
+# (min_vars, min_clauses, seed) -> SHA-1 of the DIMACS output of the original generator
+EXPECTED = {
+    (40, 10, 1): "8f7a1dcaab32528f00d6a69b61942f0b81148291",
+    (40, 10, 2): "81eb32f483790e96c5b71e93fb8bb5945fa357fe",
+    (80, 20, 4): "a8206550d901beb0c4bcaae915df07b05ff32082",
+    (80, 20, 5): "f41d4cee4736a069ffe5b34e35b02a89f4dc2631",
+    (150, 30, 6): "9af0a632dd03852ef33a820153c117dcc457929e",
+}
+
+
+def digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+class RegressionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def generate(self, spec, **options):
+        path = os.path.join(self.dir, "v%d_c%d_s%d.cnf" % spec)
+        min_vars, min_clauses, seed = spec
+        main.run(min_vars, min_clauses, seed, output=path, quiet=True, **options)
+        return path
+
+    def test_default_output_unchanged(self):
+        for spec, expected in sorted(EXPECTED.items()):
+            self.assertEqual(digest(self.generate(spec)), expected, "instance %s" % (spec,))
+
+
+if __name__ == "__main__":
+    unittest.main()
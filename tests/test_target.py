@@ -0,0 +1,89 @@
+"""
+Tests of the generation of formulas of the required CNF size within a tolerance (main.SizeTarget).
+
+@author: Keznikl
+"""
+
+from random import Random
+from clauses import TemplateCache
+import main
+import cStringIO
+import unittest
+
+
+class SizeTargetTest(unittest.TestCase):
+
+    def test_lower_bounds_without_tolerance(self):
+        target = main.SizeTarget(10, 10)
+        self.assertTrue(target.accepts(100, 100))
+        target.add(100, 5)
+        self.assertFalse(target.reached() or target.finished())
+        target.add(0, 5)
+        self.assertTrue(target.reached())
+        self.assertFalse(target.finished())
+        self.assertEqual(target.overshoots(), [])
+
+    def test_finishing_variant_within_tolerance(self):
+        target = main.SizeTarget(10, 10, 0.1)
+        self.assertTrue(target.accepts(9, 9))
+        target.add(9, 9)
+        self.assertFalse(target.accepts(3, 1))
+        self.assertTrue(target.accepts(2, 1))
+        target.add(2, 1)
+        self.assertTrue(target.finished())
+        self.assertEqual((target.rejected, target.given_up), (1, False))
+
+    def test_given_up_after_max_attempts(self):
+        target = main.SizeTarget(10, 10, 0.0, max_attempts=3)
+        for i in xrange(3):
+            self.assertFalse(target.accepts(20, 20))
+        self.assertTrue(target.given_up)
+        self.assertTrue(target.accepts(20, 20))
+        target.add(20, 20)
+        self.assertTrue(target.finished())
+        self.assertEqual(target.overshoots(), ["vars", "clauses"])
+
+    def test_negative_tolerance(self):
+        self.assertRaises(Exception, main.SizeTarget, 10, 10, -0.1)
+        self.assertRaises(Exception, main.generate_formula, 100, 100, 1, tolerance=-0.1)
+
+
+class ToleranceTest(unittest.TestCase):
+
+    def test_within_tolerance(self):
+        for backend in ["formula", "int", "tseitin"]:
+            for seed in xrange(1, 4):
+                clauses, symbols = main.generate_formula(600, 1000, seed, backend=backend, tolerance=0.1)
+                num_vars, num_clauses = symbols.numVars(), len(clauses)
+                self.assertTrue(num_vars >= 600 and num_clauses >= 1000, (backend, seed))
+                # the size reached last is within the tolerance
+                self.assertTrue(num_vars <= 660 or num_clauses <= 1100, (backend, seed))
+                if backend != "tseitin":
+                    self.assertTrue(num_vars <= 660 and num_clauses <= 1100, (backend, seed))
+
+    def test_same_seed_same_formula(self):
+        for backend in ["formula", "int"]:
+            first = main.generate_formula(200, 300, 2, backend=backend, tolerance=0.05)
+            second = main.generate_formula(200, 300, 2, backend=backend, tolerance=0.05)
+            self.assertEqual([list(c) for c in first[0]], [list(c) for c in second[0]])
+            self.assertEqual(first[1].numVars(), second[1].numVars())
+
+    def test_formula_backend_counted_by_int_templates(self):
+        templates = TemplateCache()
+        skeletons = main.generate_skeletons(200, 300, Random(2), tolerance=0.05, templates=templates)
+        self.assertTrue(templates.misses > 0)
+        self.assertEqual(set(key[0] for key in templates.templates), set(["int"]))
+        clauses, symbols = main.skeletons_to_clauses(skeletons, "formula")
+        int_clauses, int_symbols = main.generate_formula(200, 300, 2, backend="int", tolerance=0.05)
+        self.assertEqual((symbols.numVars(), len(clauses)), (int_symbols.numVars(), len(int_clauses)))
+
+    def test_unreachable_target_given_up(self):
+        # no variant finishes the formula with exactly 1000 clauses, the target is given up after max_attempts
+        log = cStringIO.StringIO()
+        clauses, symbols = main.generate_clauses(10, 1000, Random(2), log=log, tolerance=0.0)
+        self.assertTrue(len(clauses) > 1000)
+        self.assertTrue("WARNING: the size could not be hit within the tolerance 0" in log.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+Tests of the polarity-aware Tseitin's encoding (the tseitin module).
+
+@author: Keznikl
+"""
+
+from random import Random
+from formula import Conjunction, Disjunction, Variable, preorder
+from clauses import SymbolTable, toClauseSet
+from tests.util import randomFormula, formulaModels, clauseModels, namedClauses
+from dpll import DPLLSolver
+import main
+import tseitin
+import unittest
+
+NAMES = ["a", "b", "c", "d"]
+
+
+class PlaistedGreenbaumTest(unittest.TestCase):
+
+    def test_equisatisfiable(self):
+        # the models of the encoding projected to the variables of the formula are exactly its models
+        rng = Random(3)
+        for i in xrange(100):
+            f = randomFormula(rng, 3, NAMES, [] if i % 2 else None)
+            symbols = SymbolTable()
+            clauses = tseitin.toClauseSet(f, symbols)
+            self.assertEqual(clauseModels(clauses, symbols, NAMES), formulaModels(f, NAMES), str(f))
+
+    def test_linear_size(self):
+        rng = Random(5)
+        for i in xrange(100):
+            f = randomFormula(rng, 6, NAMES)
+            nodes = list(preorder(f))
+            bound = sum(2 * (len(g.getChildren()) + 1) for g in nodes)
+            self.assertTrue(len(tseitin.toClauseSet(f, SymbolTable())) <= bound, str(f))
+
+    def test_top_level_conjuncts_asserted(self):
+        f = Conjunction([Variable("a"), Disjunction([Variable("b"), Variable("c")])])
+        symbols = SymbolTable()
+        clauses = tseitin.toClauseSet(f, symbols)
+        self.assertTrue(frozenset([("a", True)]) in namedClauses(clauses, symbols))
+
+    def test_fresh_names_avoid_variables_of_formula(self):
+        # the variables named as the auxiliary ones must not be merged with them
+        names = ["_t0", "_t1", "a"]
+        f = Disjunction([Conjunction([Variable("_t0"), Variable("a")]), Conjunction([Variable("_t1"), Variable("a")])])
+        symbols = SymbolTable()
+        clauses = tseitin.toClauseSet(f, symbols)
+        self.assertEqual(clauseModels(clauses, symbols, names), formulaModels(f, names))
+        self.assertEqual(symbols.numVars(), len(names) + 3)
+
+    def test_fresh_names_avoid_numbered_names(self):
+        symbols = SymbolTable()
+        symbols.getId("_t0")
+        tseitin.toClauseSet(Disjunction([Variable("a"), Conjunction([Variable("b"), Variable("c")])]), symbols)
+        self.assertEqual(symbols.names.count("_t0"), 1)
+        self.assertEqual(len(set(symbols.names)), symbols.numVars())
+
+
+class SizeGuardTest(unittest.TestCase):
+
+    def test_guarded_conversion_equisatisfiable(self):
+        # a variable of the formula may be named as an auxiliary one
+        rng = Random(6)
+        for i in xrange(100):
+            f = Conjunction([randomFormula(rng, 3, NAMES + ["_g0"]), Disjunction([Variable("_g0"), Variable("a")])])
+            names = sorted(set(g.name for g in preorder(f) if isinstance(g, Variable)))
+            symbols = SymbolTable()
+            clauses = toClauseSet(f, symbols, max_clauses=4)
+            self.assertEqual(clauseModels(clauses, symbols, names), formulaModels(f, names), str(f))
+
+    def test_guarded_formula_backend_equisatisfiable(self):
+        # the skeletons above the threshold are converted by the guarded integer conversion
+        rng = Random(8)
+        report = []
+        for i in xrange(20):
+            skeletons = [randomFormula(rng, 3, NAMES) for j in xrange(2)]
+            clauses, symbols = main.skeletons_to_clauses(skeletons, max_clauses=2, report=report)
+            self.assertEqual(clauseModels(clauses, symbols, NAMES), formulaModels(Conjunction(skeletons), NAMES),
+                             " & ".join(str(f) for f in skeletons))
+        self.assertTrue(report)
+
+    def test_guarded_instance_equisatisfiable(self):
+        skeletons = main.generate_skeletons(80, 20, Random(5))
+        plain, plain_symbols = main.skeletons_to_clauses(skeletons)
+        report = []
+        guarded, symbols = main.skeletons_to_clauses(skeletons, max_clauses=10, report=report)
+        self.assertTrue(report)
+        self.assertTrue(symbols.numVars() > plain_symbols.numVars())
+        model = DPLLSolver(symbols.numVars(), [list(c) for c in guarded]).solve()
+        self.assertNotEqual(model, None)
+        # the model of the guarded formula restricted to the variables of the skeletons satisfies the plain one
+        values = dict((symbols.getName(abs(l)), l > 0) for l in model)
+        self.assertTrue(all(any(values[plain_symbols.getName(abs(l))] == (l > 0) for l in c) for c in plain))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+Helpers of the tests: random formulas and their models.
+
+@author: Keznikl
+"""
+
+from formula import Conjunction, Disjunction, Negation, Implication, Equivalence, Variable
+import itertools
+import re
+
+# a strictly formatted DIMACS header (without any padding)
+DIMACS_HEADER = re.compile(r"^p cnf (\d+) (\d+)$")
+
+
+def randomFormula(rng, depth, names, shared = None):
+    """Return a random formula over the variable names of at most the given depth.
+
+    shared -- list of the already created subformulas, reused at random (the formula is then a DAG); 
+              no sharing if None
+
+    """
+    if depth == 0 or rng.random() < 0.2:
+        if shared and rng.random() < 0.3:
+            return rng.choice(shared)
+        return Variable(rng.choice(names))
+    kind = rng.randint(0, 4)
+    if kind == 0:
+        f = Negation(randomFormula(rng, depth - 1, names, shared))
+    elif kind == 1:
+        f = Conjunction([randomFormula(rng, depth - 1, names, shared) for i in xrange(rng.randint(1, 3))])
+    elif kind == 2:
+        f = Disjunction([randomFormula(rng, depth - 1, names, shared) for i in xrange(rng.randint(1, 3))])
+    elif kind == 3:
+        f = Implication(randomFormula(rng, depth - 1, names, shared), randomFormula(rng, depth - 1, names, shared))
+    else:
+        f = Equivalence(randomFormula(rng, depth - 1, names, shared), randomFormula(rng, depth - 1, names, shared))
+    if shared is not None:
+        shared.append(f)
+    return f
+
+def evaluate(f, assignment):
+    """Return the value of the formula under the assignment (dictionary mapping the names to booleans)."""
+    if isinstance(f, Variable):
+        return assignment[f.name]
+    if isinstance(f, Negation):
+        return not evaluate(f.subf, assignment)
+    if isinstance(f, Conjunction):
+        return all(evaluate(g, assignment) for g in f.subf)
+    if isinstance(f, Disjunction):
+        return any(evaluate(g, assignment) for g in f.subf)
+    if isinstance(f, Implication):
+        return not evaluate(f.premise, assignment) or evaluate(f.conclusion, assignment)
+    return evaluate(f.left, assignment) == evaluate(f.right, assignment)
+
+def assignments(names):
+    """Iterate over all the assignments of the variable names."""
+    for values in itertools.product([False, True], repeat=len(names)):
+        yield dict(zip(names, values))
+
+def formulaModels(f, names):
+    """Return the set of the models of the formula (tuples of the values of the names)."""
+    return set(tuple(a[n] for n in names) for a in assignments(names) if evaluate(f, a))
+
+def satisfies(clauses, assignment, symbols):
+    """True iff the assignment of the names satisfies the integer clauses (numbered by symbols)."""
+    return all(any((l > 0) == assignment[symbols.getName(abs(l))] for l in c) for c in clauses)
+
+def clauseModels(clauses, symbols, names):
+    """Return the set of the models of the integer clauses projected to the names (see formulaModels).
+
+    The variables of symbols other than names (e.g. auxiliary variables) are existentially quantified.
+
+    """
+    models = set()
+    for a in assignments(list(names) + [n for n in symbols.names if n not in names]):
+        if satisfies(clauses, a, symbols):
+            models.add(tuple(a[n] for n in names))
+    return models
+
+def cnfClauses(cnf):
+    """Return the clauses of a CNF parse tree as frozensets of (name, positive) pairs."""
+    clauses = cnf.subf if isinstance(cnf, Conjunction) else [cnf]
+    result = []
+    for c in clauses:
+        literals = c.subf if isinstance(c, Disjunction) else [c]
+        result.append(frozenset((l.subf.name, False) if isinstance(l, Negation) else (l.name, True) for l in literals))
+    return result
+
+def namedClauses(clauses, symbols):
+    """Return the integer clauses as frozensets of (name, positive) pairs."""
+    return [frozenset((symbols.getName(abs(l)), l > 0) for l in c) for c in clauses]
+
+def dimacsHeader(data):
+    """Return the pair (number of variables, number of clauses) from the header of the DIMACS data.
+
+    The data have to contain exactly one header, formatted strictly (see DIMACS_HEADER).
+
+    """
+    lines = [line for line in data.splitlines() if line.startswith("p")]
+    assert len(lines) == 1, "not a single header: %r" % lines
+    match = DIMACS_HEADER.match(lines[0])
+    assert match, "not a strict header: %r" % lines[0]
+    return (int(match.group(1)), int(match.group(2)))
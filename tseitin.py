@@ -5,6 +5,7 @@ Module containing implementaiton of Tseitin's algorihm for conversion in CNF.
 """
 
 from formula import *
+from clauses import ClauseSet
   
 class VariableFactory:
     def __init__(self, unique_prefix=''):
@@ -46,18 +47,171 @@ def tseitin(tree, varFactory, clauses):
     returns    -- the new variable representing the root of the derivation tree
     
     """ 
-    # for a variable return only its reference, do not introduce any new clauses
-    if isinstance(tree, Variable):        
-        return tree.clone()
-    
-    # for other subformulas:
-    #    - assign a new variable to @tree
-    #    - encode the local constraints,
-    #    - add the encoded local constraints in clauses
-    #    - return the name of the new variable
-    v = varFactory.getVariable()
-    newVarsForSubf = [tseitin(e, varFactory, clauses) for e in tree.getChildren()]
-    newLit = tree.encodeTseitin(v, newVarsForSubf)
-    clauses.append(newLit)
-    return v
+    # the tree is traversed using an explicit stack of (node, new variable) pairs; 
+    # the new variable is None until the node is entered
+    stack = [(tree, None)]
+    # the variables representing the already processed subtrees
+    results = []
+    while stack:
+        node, v = stack.pop()
+        if v is None:
+            # for a variable return only its reference, do not introduce any new clauses
+            if isinstance(node, Variable):
+                results.append(node.clone())
+                continue
+            # for other subformulas:
+            #    - assign a new variable to @node
+            #    - process the children
+            stack.append((node, varFactory.getVariable()))
+            stack.extend([(e, None) for e in reversed(node.getChildren())])
+        else:
+            # when the children are processed:
+            #    - encode the local constraints,
+            #    - add the encoded local constraints in clauses
+            #    - return the name of the new variable
+            n = len(node.getChildren())
+            newVarsForSubf = results[len(results) - n:]
+            del results[len(results) - n:]
+            newLit = node.encodeTseitin(v, newVarsForSubf)
+            clauses.append(newLit)
+            results.append(v)
+    return results[0]
+
+###############################################################################
+# Polarity-aware encoding to integer clauses
+###############################################################################
+
+# polarities of the occurrences of a subformula
+POSITIVE = 1
+NEGATIVE = 2
+BOTH = POSITIVE | NEGATIVE
+
+def toClauseSet(formula, symbols, clauseSet=None, prefix="_t"):
+    """Convert the formula into an equisatisfiable CNF using the polarity-aware 
+    (Plaisted-Greenbaum) variant of Tseitin's algorithm, directly to integer clauses.
+    
+    - the conjuncts of the top-level conjunctions are asserted directly
+    - structurally identical subformulas share a single new variable
+    - negations do not introduce new variables (the literal of the child is negated)
+    - only the implications of the definitions required by the polarity 
+      of the occurrences of the subformula are encoded
+    
+    Each subformula with n children contributes at most 2 * (n + 1) clauses, 
+    hence the size of the result (and the run time) is linear in the size of the formula.
+    
+    formula   -- the formula to be converted
+    symbols   -- the clauses.SymbolTable numbering the variables, the new variables 
+                 are named prefix + number, skipping the names already numbered by symbols 
+                 and the names of the variables of the formula (see SymbolTable.freshName)
+    clauseSet -- the clauses.ClauseSet to be extended (a new one is created if None)
+    
+    returns   -- the clauseSet
+    
+    """
+    if clauseSet is None:
+        clauseSet = ClauseSet()
+    
+    # split the top-level conjunctions
+    roots = []
+    stack = [formula]
+    while stack:
+        f = stack.pop()
+        if isinstance(f, Conjunction):
+            stack.extend(reversed(f.subf))
+        else:
+            roots.append(f)
+    
+    # number the distinct subformulas (children before parents)
+    ids = {}
+    nodes = []
+    children = []
+    def number(f, subIds):
+        if isinstance(f, Variable):
+            key = (Variable, f.name)
+        else:
+            key = (f.__class__, tuple(subIds))
+        sid = ids.get(key)
+        if sid is None:
+            sid = len(nodes)
+            ids[key] = sid
+            nodes.append(f)
+            children.append(subIds)
+        return sid
+    rootIds = []
+    for r in roots:
+        sid = transform(r, number)
+        if sid not in rootIds:
+            rootIds.append(sid)
+    
+    # propagate the polarities from parents to children
+    polarity = [0] * len(nodes)
+    for sid in rootIds:
+        polarity[sid] |= POSITIVE
+    for sid in xrange(len(nodes) - 1, -1, -1):
+        f = nodes[sid]
+        p = polarity[sid]
+        flipped = ((p & POSITIVE) and NEGATIVE) | ((p & NEGATIVE) and POSITIVE)
+        if isinstance(f, Negation):
+            polarity[children[sid][0]] |= flipped
+        elif isinstance(f, Implication):
+            polarity[children[sid][0]] |= flipped
+            polarity[children[sid][1]] |= p
+        elif isinstance(f, Equivalence):
+            for c in children[sid]:
+                polarity[c] |= BOTH
+        else:
+            for c in children[sid]:
+                polarity[c] |= p
+    
+    # assign the literals and encode the definitions
+    reserved = set(f.name for f in nodes if isinstance(f, Variable))
+    literals = [0] * len(nodes)
+    counter = 0
+    for sid in xrange(len(nodes)):
+        f = nodes[sid]
+        subs = [literals[c] for c in children[sid]]
+        if isinstance(f, Variable):
+            literals[sid] = symbols.getId(f.name)
+            continue
+        if isinstance(f, Negation):
+            literals[sid] = -subs[0]
+            continue
+        name, counter = symbols.freshName(prefix, counter, reserved)
+        x = symbols.getId(name)
+        counter += 1
+        literals[sid] = x
+        pos = polarity[sid] & POSITIVE
+        neg = polarity[sid] & NEGATIVE
+        if isinstance(f, Conjunction):
+            if pos:
+                for c in subs:
+                    clauseSet.add([-x, c])
+            if neg:
+                clauseSet.add([x] + [-c for c in subs])
+        elif isinstance(f, Disjunction):
+            if pos:
+                clauseSet.add([-x] + subs)
+            if neg:
+                for c in subs:
+                    clauseSet.add([x, -c])
+        elif isinstance(f, Implication):
+            p, c = subs
+            if pos:
+                clauseSet.add([-x, -p, c])
+            if neg:
+                clauseSet.add([x, p])
+                clauseSet.add([x, -c])
+        elif isinstance(f, Equivalence):
+            a, b = subs
+            if pos:
+                clauseSet.add([-x, -a, b])
+                clauseSet.add([-x, a, -b])
+            if neg:
+                clauseSet.add([x, a, b])
+                clauseSet.add([x, -a, -b])
+        else:
+            raise Exception("Cannot encode a " + f.__class__.__name__)
     
+    for sid in rootIds:
+        clauseSet.add([literals[sid]])
+    return clauseSet